@@ -0,0 +1,447 @@
+import hashlib
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from datetime import datetime
+
+import file_lock
+
+# ------------------ Archive Layout ------------------
+# Bills are packed into one container file per day (archive/YYYY/bills_YYYYMMDD.bpk).
+# A container is an append-only list of records:
+#   R  shared resources: the font programs and skeleton of the first bill,
+#      used as a zlib preset dictionary for every stream and skeleton after it
+#   S  a content-addressed PDF stream, stored inflated and re-deflated with
+#      the shared dictionary (keyed by SHA-256 of the inflated stream)
+#   B  a bill: its PDF skeleton with the stream bodies cut out, plus refs
+#   A  an alias: a bill whose bytes are identical to an earlier one
+# Extraction recompresses each stream at its original zlib level, so the bill
+# comes back byte-for-byte as it was generated.
+#
+# Several processes may archive into the same day (the app and the API). A
+# bill is added under the container's file lock (see file_lock.py), after
+# reading whatever the others appended since, and written at the real end of
+# the file. Only a tail that is checked to be a record cut short by a crash is
+# ever cut off.
+archive_dir = "archive"
+
+MAGIC = b"BPK1"
+RECORD = struct.Struct(">cI")
+REF = struct.Struct(">IB32s")
+ZDICT_SIZE = 32 * 1024
+ZLIB_LEVELS = (6, 9, 1, 2, 3, 4, 5, 7, 8)
+
+_lock = threading.Lock()
+_shards = {}
+
+
+class Shard:
+    """One day's container file and its in-memory index."""
+
+    def __init__(self, path):
+        self.path = path
+        self.resources = None
+        self.streams = {}
+        self.bills = {}
+        self.digests = {}
+        self.end = len(MAGIC)
+        # True when the bytes after self.end are a record cut short, not damage
+        self.torn = False
+        if os.path.exists(path):
+            self._scan()
+
+    def _scan(self):
+        """Reads the record headers after self.end into the name and digest indexes."""
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                if size < len(MAGIC) and MAGIC.startswith(magic):
+                    # Created by a writer that stopped before anything was in it
+                    self.torn = size > 0
+                    return
+                raise ValueError(f"{self.path} is not a bill archive.")
+            offset = self.end
+            f.seek(offset)
+            self.torn = False
+            while True:
+                header = f.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    self.torn = len(header) > 0
+                    break
+                kind, length = RECORD.unpack(header)
+                start = offset + RECORD.size
+                # Only a record that is wholly in the file is parsed and indexed
+                if start + length > size:
+                    self.torn = True
+                    break
+                if kind == b"R":
+                    try:
+                        self.resources = zlib.decompress(f.read(length))
+                    except zlib.error:
+                        break
+                elif kind == b"S":
+                    if length < 32:
+                        break
+                    self.streams[f.read(32)] = (start, length)
+                elif kind in (b"B", b"A"):
+                    head = f.read(min(length, 2 + 0xFFFF + 32))
+                    if len(head) < 2:
+                        break
+                    name_len = struct.unpack_from(">H", head)[0]
+                    if len(head) < 2 + name_len + 32:
+                        break
+                    try:
+                        name = head[2:2 + name_len].decode("utf-8")
+                    except UnicodeDecodeError:
+                        break
+                    digest = head[2 + name_len:2 + name_len + 32]
+                    self.bills[name] = (kind, start, length, digest)
+                    if kind == b"B":
+                        self.digests.setdefault(digest, name)
+                else:
+                    break
+                f.seek(start + length)
+                offset = start + length
+            # Anything past the last complete record is a torn write.
+            self.end = offset
+
+    def refresh(self):
+        """Indexes the records other processes appended since the last look."""
+        if os.path.exists(self.path) and os.path.getsize(self.path) != self.end:
+            self._scan()
+
+    def _append(self, records):
+        """Appends already-encoded records to the container in one write; call with the file lock held."""
+        with open(self.path, "r+b" if os.path.exists(self.path) else "w+b") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > self.end and not self.torn:
+                raise ValueError(f"{self.path} has unreadable data after byte {self.end}; nothing was added.")
+            if size < len(MAGIC):
+                f.seek(0)
+                f.write(MAGIC)
+            f.seek(self.end)
+            # Only a torn record of a crashed writer is left here
+            f.truncate()
+            offset = self.end
+            for kind, payload in records:
+                f.write(RECORD.pack(kind, len(payload)))
+                f.write(payload)
+                offset += RECORD.size + len(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self.end = offset
+
+    def _read(self, start, length):
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return f.read(length)
+
+    def _compress(self, data):
+        if self.resources:
+            c = zlib.compressobj(9, zdict=self.resources)
+        else:
+            c = zlib.compressobj(9)
+        return c.compress(data) + c.flush()
+
+    def _decompress(self, data):
+        if self.resources:
+            d = zlib.decompressobj(zdict=self.resources)
+        else:
+            d = zlib.decompressobj()
+        return d.decompress(data) + d.flush()
+
+    def add(self, name, data):
+        """Packs a bill into the shard, sharing streams with earlier bills."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with file_lock.locked(self.path):
+            # Records other processes appended come first
+            self.refresh()
+            self._add(name, data)
+
+    def _add(self, name, data):
+        digest = hashlib.sha256(data).digest()
+        name_bytes = name.encode("utf-8")
+        head = struct.pack(">H", len(name_bytes)) + name_bytes + digest
+        if name in self.bills:
+            if self.bills[name][3] == digest:
+                return
+            raise ValueError(f"A different bill named {name} is already archived.")
+        if digest in self.digests:
+            self._append([(b"A", head)])
+            self.bills[name] = (b"A", None, None, digest)
+            return
+
+        skeleton, refs, inflated = split_pdf(data)
+        records = []
+        if self.resources is None:
+            self.resources = build_resources(data, skeleton)
+            records.append((b"R", zlib.compress(self.resources, 9)))
+        new_streams = {}
+        for stream_digest, raw in inflated.items():
+            if stream_digest not in self.streams:
+                new_streams[stream_digest] = stream_digest + self._compress(raw)
+        body = struct.pack(">H", len(refs)) + b"".join(REF.pack(*ref) for ref in refs)
+        body += self._compress(skeleton)
+
+        if join_pdf(skeleton, refs, inflated.__getitem__) != data:
+            # Could not reproduce the bill exactly; keep it whole instead.
+            new_streams = {}
+            body = struct.pack(">H", 0) + self._compress(data)
+
+        offset = self.end + sum(RECORD.size + len(p) for _, p in records)
+        for stream_digest, payload in new_streams.items():
+            self.streams[stream_digest] = (offset + RECORD.size, len(payload))
+            records.append((b"S", payload))
+            offset += RECORD.size + len(payload)
+        records.append((b"B", head + body))
+        self._append(records)
+        self.bills[name] = (b"B", offset + RECORD.size, len(head + body), digest)
+        self.digests[digest] = name
+
+    def _stream(self, digest):
+        start, length = self.streams[digest]
+        return self._decompress(self._read(start + 32, length - 32))
+
+    def parts(self, name, compressed=None):
+        """Yields the pieces of a bill in order, decoding streams lazily.
+
+        compressed, if given, is a dict that keeps recompressed streams for the
+        next bills, which mostly share their font streams.
+        """
+        kind, start, length, digest = self.bills[name]
+        if kind == b"A":
+            kind, start, length, _ = self.bills[self.digests[digest]]
+        payload = self._read(start, length)
+        pos = 2 + struct.unpack(">H", payload[:2])[0] + 32
+        count = struct.unpack(">H", payload[pos:pos + 2])[0]
+        pos += 2
+        refs = [REF.unpack_from(payload, pos + i * REF.size) for i in range(count)]
+        skeleton = self._decompress(payload[pos + count * REF.size:])
+        last = 0
+        for offset, level, stream_digest in refs:
+            yield skeleton[last:offset]
+            body = compressed.get((stream_digest, level)) if compressed is not None else None
+            if body is None:
+                body = zlib.compress(self._stream(stream_digest), level)
+                if compressed is not None:
+                    compressed[stream_digest, level] = body
+            yield body
+            last = offset
+        yield skeleton[last:]
+
+    def verify(self, name, compressed=None):
+        """Rebuilds a bill and checks it against the SHA-256 it was stored with."""
+        digest = hashlib.sha256()
+        for part in self.parts(name, compressed):
+            digest.update(part)
+        return digest.digest() == self.bills[name][3]
+
+    def digest(self, name):
+        return self.bills[name][3]
+
+
+# ------------------ PDF Stream Handling ------------------
+def iter_streams(data):
+    """Yields (start, end, head) for every stream body in a PDF."""
+    pos = 0
+    while True:
+        i = data.find(b"stream\n", pos)
+        if i < 0:
+            return
+        head = data[data.rfind(b" obj", pos, i) + 1:i]
+        match = re.search(rb"/Length (\d+)", head)
+        if not match or not head.rstrip().endswith(b">>"):
+            pos = i + 7
+            continue
+        start = i + 7
+        end = start + int(match.group(1))
+        yield start, end, head
+        pos = end
+
+
+def deflate_level(raw, body):
+    """Finds the zlib level that reproduces a compressed stream, or None."""
+    for level in ZLIB_LEVELS:
+        if zlib.compress(raw, level) == body:
+            return level
+    return None
+
+
+def split_pdf(data):
+    """Cuts the Flate streams out of a PDF, returning skeleton, refs and streams."""
+    skeleton = bytearray()
+    refs = []
+    inflated = {}
+    last = 0
+    for start, end, head in iter_streams(data):
+        if b"/FlateDecode" not in head:
+            continue
+        body = bytes(data[start:end])
+        try:
+            raw = zlib.decompress(body)
+        except zlib.error:
+            continue
+        level = deflate_level(raw, body)
+        if level is None:
+            continue
+        skeleton += data[last:start]
+        stream_digest = hashlib.sha256(raw).digest()
+        refs.append((len(skeleton), level, stream_digest))
+        inflated[stream_digest] = raw
+        last = end
+    skeleton += data[last:]
+    return bytes(skeleton), refs, inflated
+
+
+def join_pdf(skeleton, refs, get_stream):
+    """Reassembles a PDF from its skeleton and inflated streams."""
+    out = bytearray()
+    last = 0
+    for offset, level, stream_digest in refs:
+        out += skeleton[last:offset]
+        out += zlib.compress(get_stream(stream_digest), level)
+        last = offset
+    out += skeleton[last:]
+    return bytes(out)
+
+
+def build_resources(data, skeleton):
+    """Collects the embedded fonts and skeleton of a bill as the shard dictionary."""
+    fonts = b""
+    for start, end, head in iter_streams(data):
+        if b"/Length1" in head and b"/FlateDecode" in head:
+            try:
+                fonts += zlib.decompress(data[start:end])
+            except zlib.error:
+                pass
+    # zlib favours the end of the dictionary, so the skeleton goes last.
+    return (fonts + skeleton)[-ZDICT_SIZE:]
+
+
+# ------------------ Public Functions ------------------
+def shard_path(name, when=None):
+    """Returns the container file a bill belongs in, based on its date."""
+    match = re.search(r"(\d{8})", os.path.basename(name))
+    day = match.group(1) if match else (when or datetime.now()).strftime("%Y%m%d")
+    return os.path.join(archive_dir, day[:4], f"bills_{day}.bpk")
+
+
+def get_shard(path):
+    """Returns the cached shard for a container path."""
+    shard = _shards.get(path)
+    if shard is None:
+        shard = _shards[path] = Shard(path)
+    return shard
+
+
+def store_bill(name, data, when=None):
+    """Saves a rendered bill into the archive."""
+    name = os.path.basename(name)
+    with _lock:
+        get_shard(shard_path(name, when)).add(name, bytes(data))
+
+
+def has_bill(name):
+    """Checks whether a bill is in the archive."""
+    name = os.path.basename(name)
+    with _lock:
+        shard = get_shard(shard_path(name))
+        if name not in shard.bills:
+            shard.refresh()
+        return name in shard.bills
+
+
+def stream_bill(name, chunk_size=64 * 1024):
+    """Yields an archived bill in chunks without building it all in memory."""
+    name = os.path.basename(name)
+    with _lock:
+        shard = get_shard(shard_path(name))
+        if name not in shard.bills:
+            shard.refresh()
+        if name not in shard.bills:
+            raise FileNotFoundError(f"{name} is not in the archive.")
+    for part in shard.parts(name):
+        for i in range(0, len(part), chunk_size):
+            yield part[i:i + chunk_size]
+
+
+def read_bill(name):
+    """Returns the bytes of an archived bill."""
+    return b"".join(stream_bill(name))
+
+
+def extract_bill(name, dest_dir="."):
+    """Writes an archived bill to a folder and returns its path."""
+    name = os.path.basename(name)
+    path = os.path.join(dest_dir, name)
+    with open(path, "wb") as f:
+        for chunk in stream_bill(name):
+            f.write(chunk)
+    return path
+
+
+def list_bills(day=None):
+    """Lists archived bill names, optionally for one day (YYYYMMDD)."""
+    names = []
+    if not os.path.isdir(archive_dir):
+        return names
+    for year in sorted(os.listdir(archive_dir)):
+        folder = os.path.join(archive_dir, year)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith(".bpk") or (day and day not in filename):
+                continue
+            with _lock:
+                names.extend(sorted(get_shard(os.path.join(folder, filename)).bills))
+    return names
+
+
+def pack_loose_bills(directory=".", remove=True):
+    """Moves every bill_*.pdf in a folder into the archive."""
+    count = 0
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.startswith("bill_") and filename.endswith(".pdf")):
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, "rb") as f:
+            data = f.read()
+        store_bill(filename, data)
+        if read_bill(filename) != data:
+            raise IOError(f"Archived copy of {filename} does not match the original.")
+        if remove:
+            os.remove(path)
+        count += 1
+    return count
+
+
+def archive_stats():
+    """Returns (bills, containers, bytes on disk) for the whole archive."""
+    bills = containers = size = 0
+    for folder, _, filenames in os.walk(archive_dir):
+        for filename in filenames:
+            if filename.endswith(".bpk"):
+                path = os.path.join(folder, filename)
+                containers += 1
+                size += os.path.getsize(path)
+                with _lock:
+                    bills += len(get_shard(path).bills)
+    return bills, containers, size
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "pack":
+        print(f"Archived {pack_loose_bills(sys.argv[2] if len(sys.argv) > 2 else '.')} bills.")
+    elif command == "extract":
+        for bill_name in sys.argv[2:]:
+            print(f"Extracted {extract_bill(bill_name)}")
+    elif command == "list":
+        print("\n".join(list_bills(sys.argv[2] if len(sys.argv) > 2 else None)))
+    else:
+        total_bills, total_containers, total_size = archive_stats()
+        print(f"{total_bills} bills in {total_containers} containers, {total_size} bytes.")
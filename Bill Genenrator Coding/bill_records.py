@@ -0,0 +1,130 @@
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+# ------------------ Bill Records ------------------
+# Every checkout appends one JSON line to records/bills_YYYYMMDD.jsonl:
+#   {"bill_id": ..., "store": ..., "date": "YYYY-MM-DDTHH:MM:SS",
+#    "items": [[product, qty, price, item_total], ...], "total": ...}
+# The PDF receipt can always be rebuilt from this record.
+records_dir = "records"
+
+_lock = threading.Lock()
+_offsets = {}
+# Where each day's index stops reading, so it can catch up with other processes
+_ends = {}
+
+
+def day_of(bill_id):
+    """Returns the YYYYMMDD part of a bill ID."""
+    match = re.search(r"(\d{8})", bill_id)
+    if not match:
+        raise ValueError(f"Bill ID {bill_id} has no date in it.")
+    return match.group(1)
+
+
+def record_path(day):
+    """Returns the record file for a day (YYYYMMDD)."""
+    return os.path.join(records_dir, f"bills_{day}.jsonl")
+
+
+def _index_day(day, catch_up=False):
+    """Builds the bill ID -> file offset index for one day's records.
+
+    With catch_up, records appended since by other processes are added.
+    """
+    offsets = _offsets.get(day)
+    if offsets is not None and not catch_up:
+        return offsets
+    if offsets is None:
+        offsets = {}
+    offset = _ends.get(day, 0)
+    path = record_path(day)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offsets[json.loads(line)["bill_id"]] = offset
+                offset += len(line)
+    _offsets[day] = offsets
+    _ends[day] = offset
+    return offsets
+
+
+def append_record(record):
+    """Saves a bill record at the end of its day's file."""
+    day = day_of(record["bill_id"])
+    line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+    with _lock:
+        offsets = _index_day(day)
+        if record["bill_id"] in offsets:
+            raise ValueError(f"Bill {record['bill_id']} is already recorded.")
+        os.makedirs(records_dir, exist_ok=True)
+        with open(record_path(day), "ab") as f:
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        offsets[record["bill_id"]] = offset
+        if _ends.get(day, 0) == offset:
+            _ends[day] = offset + len(line)
+
+
+def get_record(bill_id):
+    """Returns the record of one bill, or None if it was never recorded."""
+    day = day_of(bill_id)
+    with _lock:
+        offset = _index_day(day).get(bill_id)
+        if offset is None:
+            # Another process may have recorded it since the day was indexed
+            offset = _index_day(day, catch_up=True).get(bill_id)
+    if offset is None:
+        return None
+    with open(record_path(day), "rb") as f:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+
+def record_days():
+    """Returns the days (YYYYMMDD) that have a record file, oldest first."""
+    if not os.path.isdir(records_dir):
+        return []
+    days = []
+    for filename in os.listdir(records_dir):
+        match = re.fullmatch(r"bills_(\d{8})\.jsonl", filename)
+        if match:
+            days.append(match.group(1))
+    return sorted(days)
+
+
+def iter_file(path):
+    """Yields the complete records of one record file."""
+    with open(path, "rb") as f:
+        for line in f:
+            if line.endswith(b"\n"):
+                yield json.loads(line)
+
+
+def iter_records(start=None, end=None):
+    """Yields bill records day by day, optionally limited to [start, end] dates."""
+    first = start.strftime("%Y%m%d") if start else None
+    last = end.strftime("%Y%m%d") if end else None
+    for day in record_days():
+        if (first and day < first) or (last and day > last):
+            continue
+        yield from iter_file(record_path(day))
+
+
+def new_record(bill_id, store, items, total, when=None):
+    """Builds a bill record from the cart lines."""
+    return {
+        "bill_id": bill_id,
+        "store": store,
+        "date": (when or datetime.now()).isoformat(timespec="seconds"),
+        "items": [list(item) for item in items],
+        "total": total,
+    }
@@ -0,0 +1,257 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import bill_archive
+import bill_records
+import catalog
+import customers
+import price_lists
+import promotions
+import receipt
+import receipt_cache
+import shift
+import stock_alerts
+
+# ------------------ Billing Engine ------------------
+# The headless part of the shop: carts, checkout and bill numbering. The GUI in
+# shop_app.py and any other front end drive a Lane; everything a lane needs
+# that can be shared (catalogs, receipt caches, the render pool) is shared
+# between all lanes in the process.
+numbers_file = "bill_numbers.json"
+
+render_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="render")
+_receipt_caches = {}
+_numbers_lock = threading.Lock()
+
+
+class BillingError(Exception):
+    """A billing action was refused; title and message are meant for the cashier."""
+
+    def __init__(self, title, message):
+        super().__init__(message)
+        self.title = title
+
+
+def get_receipts(layout):
+    """Returns the receipt cache shared by every lane using a layout."""
+    cache = _receipt_caches.get(layout)
+    if cache is None:
+        cache = _receipt_caches[layout] = receipt_cache.ReceiptCache(layout)
+    return cache
+
+
+def next_bill_id(prefix, now=None):
+    """Returns the next bill ID for a numbering prefix, e.g. NM1-20250909-00042."""
+    now = now or datetime.now()
+    day = now.strftime("%Y%m%d")
+    with _numbers_lock:
+        try:
+            with open(numbers_file, "r") as f:
+                numbers = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            numbers = {}
+        last_day, seq = numbers.get(prefix, [day, 0])
+        seq = seq + 1 if last_day == day else 1
+        numbers[prefix] = [day, seq]
+        tmp_path = numbers_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(numbers, f)
+        os.replace(tmp_path, numbers_file)
+    return f"{prefix}-{day}-{seq:05d}"
+
+
+class ParkedCart:
+    """A suspended bill. Its items keep their stock reserved until it expires."""
+
+    __slots__ = ("name", "items", "total", "expires", "prices", "price_versions", "customer", "on_credit")
+
+    def __init__(self, name, items, total, expires, prices=None, price_versions=None, customer=None,
+                 on_credit=False):
+        self.name = name
+        self.items = items
+        self.total = total
+        self.expires = expires
+        self.prices = prices
+        self.price_versions = price_versions
+        self.customer = customer
+        self.on_credit = on_credit
+
+
+class Lane:
+    """One checkout counter of a store: its open bill, parked bills and last receipt."""
+
+    def __init__(self, profile, terminal=1):
+        self.profile = profile
+        self.terminal = f"{profile['numbering']['prefix']}{terminal}"
+        self.catalog = catalog.get_catalog(profile["catalog"], profile["default_catalog"])
+        self.receipts = get_receipts(profile["layout"])
+        self.low_stock = stock_alerts.get_index(self.catalog, profile["reorder_level"])
+        self.shift = shift.get_shift(profile)
+        self.customers = customers.get_customers(profile)
+        self.price_book = price_lists.get_price_book(profile["price_lists"]) if profile["price_lists"] else None
+        self.promotions = promotions.get_promotions(profile["promotions"]) if profile["promotions"] else None
+        self.parked = {}
+        self.last_generated_bill = None
+        self.new_bill()
+
+    def new_bill(self):
+        """Empties the open bill without touching stock."""
+        self.bill_items = []
+        self.total = 0
+        self.cart_name = None
+        # The price list revision the bill is priced from, pinned by its first item
+        self.prices = None
+        self.price_versions = {}
+        # The customer the bill is for, and whether it goes on their credit
+        self.customer = None
+        self.on_credit = False
+
+    @property
+    def products(self):
+        return self.catalog.products
+
+    def add_item(self, product_name, qty):
+        """Adds a product to the bill, checking stock availability."""
+        if qty <= 0:
+            raise BillingError("Invalid Quantity", "Quantity must be a positive number.")
+        price = self.catalog.price(product_name) if product_name in self.catalog else None
+        if price is None or not self.catalog.take(product_name, qty):
+            in_stock = self.catalog.stock(product_name) if product_name in self.catalog else 0
+            raise BillingError("Out of Stock", f"Only {in_stock} of {product_name} in stock.")
+        if self.price_book:
+            if self.prices is None:
+                self.prices = self.price_book.current()
+            price, version = self.prices.price(product_name, price, datetime.now())
+            if version != price_lists.BASE:
+                self.price_versions[product_name] = version
+
+        item = (product_name, qty, price, price * qty)
+        self.bill_items.append(item)
+        self.total += item[3]
+        return item
+
+    def set_customer(self, customer_id, on_credit=False):
+        """Attaches the open bill to a customer (None for a walk-in)."""
+        if customer_id is not None and self.customers.get(customer_id) is None:
+            raise BillingError("No Such Customer", f"No customer {customer_id}.")
+        if on_credit and customer_id is None:
+            raise BillingError("No Customer", "Choose the customer before putting a bill on credit.")
+        self.customer = customer_id
+        self.on_credit = on_credit
+
+    def discounts(self, now=None):
+        """Returns the offers the open bill gets, as [rule id, label, amount] lists."""
+        if not (self.promotions and self.bill_items):
+            return []
+        return self.promotions.current(now).evaluate(self.bill_items)
+
+    def checkout(self, now=None):
+        """Records the bill and returns its record. The PDF is rendered later or in the background."""
+        if not self.bill_items:
+            raise BillingError("Empty Bill", "Add items before generating a bill.")
+        if self.on_credit and self.customer is None:
+            raise BillingError("No Customer", "Choose the customer before putting a bill on credit.")
+        now = now or datetime.now()
+        self.catalog.save()
+
+        bill_id = next_bill_id(self.terminal, now)
+        discounts = self.discounts(now)
+        total = promotions.money(self.total - sum(discount[2] for discount in discounts))
+        record = bill_records.new_record(bill_id, self.profile["name"], self.bill_items, total, now)
+        record["terminal"] = self.terminal
+        if discounts:
+            record["subtotal"] = self.total
+            record["discounts"] = discounts
+        if self.prices:
+            record["price_list"] = self.prices.revision
+            if self.price_versions:
+                record["price_versions"] = self.price_versions
+        if self.customer:
+            record["customer"] = self.customer
+            if self.on_credit:
+                record["credit"] = True
+        bill_records.append_record(record)
+        if self.on_credit:
+            self.customers.charge(self.customer, record)
+        self.shift.record_sale(record)
+        if not self.profile["render_on_demand"]:
+            render_pool.submit(archive_receipt, record, self.profile["layout"])
+        self.last_generated_bill = bill_id
+        # The stock is sold now, so clearing the lane must not give it back
+        self.new_bill()
+        return record
+
+    def release(self, items):
+        """Gives the stock reserved by bill items back to the catalog."""
+        for product_name, qty, price, item_total in items:
+            self.catalog.give(product_name, qty)
+
+    def clear(self):
+        """Cancels the open bill, returning its stock, and starts a new one."""
+        self.release(self.bill_items)
+        self.new_bill()
+        self.last_generated_bill = None
+
+    # ------------------ Parked Bills ------------------
+    def park(self, name=None, now=None):
+        """Suspends the open bill under a name, keeping its stock reserved. Returns the name."""
+        if not self.bill_items:
+            raise BillingError("Empty Bill", "There is no bill to park.")
+        name = name or self.cart_name
+        if not name:
+            n = 1
+            while f"Cart {n}" in self.parked:
+                n += 1
+            name = f"Cart {n}"
+        if name in self.parked:
+            raise BillingError("Name In Use", f"A bill named {name} is already parked.")
+        expires = (now or datetime.now()) + timedelta(minutes=self.profile["park_minutes"])
+        self.parked[name] = ParkedCart(name, tuple(self.bill_items), self.total, expires,
+                                       self.prices, self.price_versions, self.customer, self.on_credit)
+        self.new_bill()
+        return name
+
+    def resume(self, name, now=None):
+        """Makes a parked bill the open one; an open bill is parked in its place."""
+        self.expire_parked(now)
+        if name not in self.parked:
+            raise BillingError("No Such Bill", f"No parked bill named {name}. It may have expired.")
+        if self.bill_items:
+            self.park(now=now)
+        cart = self.parked.pop(name)
+        self.bill_items = list(cart.items)
+        self.total = cart.total
+        self.cart_name = name
+        self.prices = cart.prices
+        self.price_versions = cart.price_versions
+        self.customer = cart.customer
+        self.on_credit = cart.on_credit
+        self.last_generated_bill = None
+
+    def cancel_parked(self, name):
+        """Drops a parked bill and gives its stock back."""
+        cart = self.parked.pop(name, None)
+        if cart is not None:
+            self.release(cart.items)
+
+    def expire_parked(self, now=None):
+        """Cancels the parked bills whose time is up. Returns their names."""
+        now = now or datetime.now()
+        expired = [name for name, cart in self.parked.items() if cart.expires <= now]
+        for name in expired:
+            self.cancel_parked(name)
+        return expired
+
+    def release_all(self):
+        """Cancels the open and every parked bill; used when the lane shuts down."""
+        for name in list(self.parked):
+            self.cancel_parked(name)
+        self.clear()
+
+
+def archive_receipt(record, layout):
+    """Renders a bill and packs it into the archive."""
+    bill_archive.store_bill(receipt.bill_filename(record["bill_id"]), receipt.render_receipt(record, layout))
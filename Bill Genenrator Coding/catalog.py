@@ -0,0 +1,273 @@
+import copy
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import bill_records
+import catalog_snapshot
+
+# ------------------ Catalog ------------------
+# A catalog is the product/price/stock table of one store, backed by a JSON
+# file, or by a memory-mapped snapshot when the file name ends in .snap (see
+# catalog_snapshot.py). Lanes of the same store share one Catalog per file.
+#
+# Stock changes other than sales (edits, new products, imports, syncs) are
+# written to an adjustment journal, records/adjustments_<catalog>.jsonl, which
+# starts with a baseline of the whole stock. The baseline minus the sales in
+# the bill records plus the adjustments is what the stock should be (see
+# stock_audit.py). A JSON catalog writes its baseline when first opened. A
+# snapshot is opened without reading its products, so its baseline waits for
+# the first adjustment (or stock_audit.py --accept) and is read from the stock
+# column in one go.
+#
+# Other programs may edit a JSON catalog file too (the back office, another
+# till). Before every save, and every second while watched, the catalog looks
+# at the file and merges in what changed there since it last read or wrote it:
+# stock movements on both sides add up, other edits made there win, and new
+# products are added. The listeners hear about the products that changed,
+# once the catalog lock is released.
+_catalogs = {}
+_registry_lock = threading.Lock()
+
+
+class Catalog:
+    """Products of one store and the file they are kept in."""
+
+    def __init__(self, path, defaults=None):
+        self.path = path
+        self.products = copy.deepcopy(defaults or {})
+        self.lock = threading.RLock()
+        self.created = False
+        # Called with a list of product names after their stock or price changes
+        self.listeners = []
+        # The file as this catalog last read or wrote it, the base for merging edits made elsewhere
+        self.base_text = None
+        self.signature = None
+        self.watching = False
+
+    def load(self):
+        """Loads stock data from the catalog file. Returns False if defaults were created."""
+        with self.lock:
+            try:
+                if self.is_snapshot():
+                    self.products = catalog_snapshot.SnapshotProducts(self.path)
+                else:
+                    signature = self.file_signature()
+                    with open(self.path, "r") as f:
+                        text = f.read()
+                    self.products = json.loads(text)
+                    self.base_text, self.signature = text, signature
+                return True
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+            self.save()
+            self.created = True
+            return False
+
+    def save(self):
+        """Saves the current stock data to the catalog file."""
+        with self.lock:
+            if isinstance(self.products, catalog_snapshot.SnapshotProducts):
+                self.products.save()
+                return
+            if self.is_snapshot():
+                catalog_snapshot.write_snapshot(self.path, ((name, data["price"], data["stock"])
+                                                            for name, data in self.products.items()),
+                                                catalog_snapshot.product_extras(self.products))
+                self.products = catalog_snapshot.SnapshotProducts(self.path)
+                return
+            # Never overwrite edits made elsewhere since our last read or write
+            names = self.merge_external()
+            text = json.dumps(self.products, indent=4)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(text)
+            # Taken from our own file before it goes in place: a write made
+            # elsewhere just after the replace must still look new
+            signature = self.file_signature(tmp_path)
+            os.replace(tmp_path, self.path)
+            self.base_text, self.signature = text, signature
+        if names:
+            self.changed(names)
+
+    def file_signature(self, path=None):
+        try:
+            stat = os.stat(path or self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_external(self):
+        """Merges edits another program saved to the file since we last read or wrote it.
+
+        Returns the names of the products that changed.
+        """
+        with self.lock:
+            names = self.merge_external()
+        if names:
+            self.changed(names)
+        return names
+
+    def merge_external(self):
+        """Does the merging for reload_external without telling the listeners; call with the lock held."""
+        if self.is_snapshot() or self.base_text is None:
+            return []
+        signature = self.file_signature()
+        if signature is None or signature == self.signature:
+            return []
+        try:
+            with open(self.path, "r") as f:
+                text = f.read()
+            theirs = json.loads(text)
+        except (OSError, json.JSONDecodeError):
+            # Half written; the next look will get it
+            return []
+        names = merge_products(json.loads(self.base_text), self.products, theirs)
+        self.base_text, self.signature = text, signature
+        return names
+
+    def watch(self, interval=1.0):
+        """Starts merging in outside edits of the file every interval seconds."""
+        with self.lock:
+            if self.watching or self.is_snapshot():
+                return
+            self.watching = True
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.reload_external()
+
+        threading.Thread(target=loop, name="catalog-watch", daemon=True).start()
+
+    def journal_path(self):
+        stem = os.path.splitext(os.path.basename(self.path))[0]
+        return os.path.join(bill_records.records_dir, f"adjustments_{stem}.jsonl")
+
+    def write_journal(self, entries):
+        os.makedirs(bill_records.records_dir, exist_ok=True)
+        with self.lock, open(self.journal_path(), "ab") as f:
+            for entry in entries:
+                f.write((json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def log_adjustments(self, deltas, reason, now=None):
+        """Journals stock changes that are not sales, as {product: change in stock}, once made."""
+        when = (now or datetime.now()).isoformat(timespec="seconds")
+        entries = [{"date": when, "product": name, "delta": delta, "reason": reason}
+                   for name, delta in deltas.items() if delta]
+        if entries:
+            with self.lock:
+                if not os.path.exists(self.journal_path()):
+                    # No baseline yet (a snapshot's first adjustment): the stock from before these changes
+                    self.log_baseline(now, deltas)
+                self.write_journal(entries)
+
+    def log_baseline(self, now=None, since=None):
+        """Journals the whole stock as the new starting point for audits.
+
+        since is {product: change in stock} made after the point to take, which is left out.
+        """
+        with self.lock:
+            if isinstance(self.products, catalog_snapshot.SnapshotProducts):
+                stock = self.products.stocks()
+            else:
+                stock = {name: data["stock"] for name, data in self.products.items()}
+            for name, delta in (since or {}).items():
+                if name in stock:
+                    stock[name] -= delta
+            self.write_journal([{"date": (now or datetime.now()).isoformat(timespec="seconds"), "baseline": stock}])
+
+    def is_snapshot(self):
+        return self.path.endswith(".snap")
+
+    def __contains__(self, name):
+        return name in self.products
+
+    def price(self, name):
+        return self.products[name]["price"]
+
+    def stock(self, name):
+        return self.products[name]["stock"]
+
+    def take(self, name, qty):
+        """Removes qty from stock. Returns False if there is not enough."""
+        with self.lock:
+            product = self.products.get(name)
+            if product is None or product["stock"] < qty:
+                return False
+            product["stock"] -= qty
+        self.changed([name])
+        return True
+
+    def give(self, name, qty):
+        """Puts qty back into stock, e.g. when a bill is cancelled."""
+        with self.lock:
+            product = self.products.get(name)
+            if product is None:
+                return
+            product["stock"] += qty
+        self.changed([name])
+
+    def changed(self, names):
+        """Tells the listeners that some products were edited."""
+        for listener in list(self.listeners):
+            listener(names)
+
+
+def merge_products(base, ours, theirs):
+    """Three-way merges the products edited elsewhere (theirs) into ours, in place.
+
+    base is what both started from. Returns the names of the products that changed.
+    """
+    names = []
+    for name in sorted(set(base) | set(theirs)):
+        old, new = base.get(name), theirs.get(name)
+        if old == new:
+            continue
+        product = ours.get(name)
+        if new is None:
+            # Removed there; kept if it changed here meanwhile (e.g. was sold)
+            if product is not None and product == old:
+                del ours[name]
+                names.append(name)
+            continue
+        if product is None:
+            if old is None:
+                ours[name] = dict(new)
+                names.append(name)
+            continue
+        old = old or {}
+        for field in set(old) | set(new):
+            if old.get(field) == new.get(field):
+                continue
+            if field == "stock":
+                product["stock"] = product.get("stock", 0) + new.get("stock", 0) - old.get("stock", 0)
+            elif field in new:
+                product[field] = new[field]
+            else:
+                product.pop(field, None)
+        names.append(name)
+    return names
+
+
+def get_catalog(path, defaults=None):
+    """Returns the shared Catalog for a file, loading it on first use."""
+    key = os.path.abspath(path)
+    with _registry_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = Catalog(path, defaults)
+            catalog.load()
+            if not catalog.is_snapshot() and not os.path.exists(catalog.journal_path()):
+                catalog.log_baseline()
+        return catalog
+
+
+def all_catalogs():
+    """Returns every catalog opened in this process."""
+    with _registry_lock:
+        return list(_catalogs.values())
@@ -0,0 +1,257 @@
+import argparse
+import csv
+import json
+import os
+
+import catalog
+
+# ------------------ Bulk Catalog Import / Export ------------------
+# Catalog files are read one row at a time, so memory use does not depend on
+# the size of the file. Accepted formats are CSV with a header row and JSON
+# Lines, both with the fields: name, price, stock and optionally reorder_level,
+# hsn and gst_rate.
+#
+# Rows are upserts: a new name adds a product (price and stock required), an
+# existing name updates whichever of price/stock the row gives. Changes are
+# applied to the catalog a batch at a time and the catalog file is saved once
+# at the end. With dry_run nothing is changed and the diff is only reported.
+FIELDS = ("name", "price", "stock", "reorder_level", "hsn", "gst_rate")
+# Fields that snapshot catalogs have no column for
+EXTRA_FIELDS = ("reorder_level", "hsn", "gst_rate")
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportResult:
+    """Counts and errors of one catalog import."""
+
+    def __init__(self):
+        self.added = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rows = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Line {line_no}: {message}")
+
+    def summary(self):
+        text = (f"{self.rows} rows: {self.added} added, {self.updated} updated, "
+                f"{self.unchanged} unchanged, {self.error_count} rejected.")
+        if self.errors:
+            text += "\n" + "\n".join(self.errors[:10])
+            if self.error_count > 10:
+                text += f"\n... and {self.error_count - 10} more."
+        return text
+
+
+def file_format(path):
+    """Returns 'csv' or 'jsonl' based on the file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"Unsupported catalog file type: {path}. Use .csv or .jsonl.")
+
+
+def iter_rows(path):
+    """Yields (line number, row dict) from a CSV or JSONL catalog file."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if file_format(path) == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, ValueError(f"Invalid JSON: {e.msg}")
+                    continue
+                yield line_no, row
+
+
+def parse_row(row):
+    """Validates one row and returns (name, changes) with price and/or stock."""
+    if not isinstance(row, dict):
+        raise ValueError("Row must be an object.")
+    name = str(row.get("name") or "").strip()
+    if not name:
+        raise ValueError("Product name is required.")
+    changes = {}
+    price = row.get("price")
+    if price not in (None, ""):
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            raise ValueError(f"Price of {name} must be a number.")
+        if price <= 0:
+            raise ValueError(f"Price of {name} must be positive.")
+        changes["price"] = int(price) if price.is_integer() else price
+    stock = row.get("stock")
+    if stock not in (None, ""):
+        try:
+            stock = int(stock)
+        except (TypeError, ValueError):
+            raise ValueError(f"Stock of {name} must be an integer.")
+        if stock < 0:
+            raise ValueError(f"Stock of {name} cannot be negative.")
+        changes["stock"] = stock
+    level = row.get("reorder_level")
+    if level not in (None, ""):
+        try:
+            level = int(level)
+        except (TypeError, ValueError):
+            raise ValueError(f"Reorder level of {name} must be an integer.")
+        if level < 0:
+            raise ValueError(f"Reorder level of {name} cannot be negative.")
+        changes["reorder_level"] = level
+    hsn = row.get("hsn")
+    if hsn not in (None, ""):
+        hsn = str(hsn).strip()
+        if not hsn.isdigit():
+            raise ValueError(f"HSN code of {name} must be digits.")
+        changes["hsn"] = hsn
+    rate = row.get("gst_rate")
+    if rate not in (None, ""):
+        try:
+            rate = float(rate)
+        except (TypeError, ValueError):
+            raise ValueError(f"GST rate of {name} must be a number.")
+        if not 0 <= rate <= 100:
+            raise ValueError(f"GST rate of {name} must be between 0 and 100.")
+        changes["gst_rate"] = int(rate) if rate.is_integer() else rate
+    if not changes:
+        raise ValueError(f"Row for {name} has no price, stock, reorder level, HSN or GST rate.")
+    return name, changes
+
+
+def import_catalog(shop_catalog, path, dry_run=False, batch_size=5000, diff_file=None, on_batch=None):
+    """Upserts products from a CSV/JSONL file into a catalog.
+
+    diff_file, if given, is an open text file that receives one line per change.
+    on_batch is called with the names changed by each applied batch.
+    """
+    result = ImportResult()
+    # Changed fields waiting to be applied, and the resulting product as the
+    # rest of the batch should see it. A dry run drops both every batch too, so
+    # memory stays bounded; a name repeated more than a batch later is then
+    # compared with the catalog again and may be counted twice in the preview.
+    batch = {}
+    staged = {}
+
+    def apply():
+        with shop_catalog.lock:
+            deltas = {}
+            for name, changes in batch.items():
+                product = shop_catalog.products.setdefault(name, {})
+                if "stock" in changes:
+                    deltas[name] = changes["stock"] - product.get("stock", 0)
+                product.update(changes)
+            shop_catalog.log_adjustments(deltas, f"import {os.path.basename(path)}")
+        shop_catalog.changed(list(batch))
+        if on_batch:
+            on_batch(list(batch))
+        batch.clear()
+        staged.clear()
+
+    for line_no, row in iter_rows(path):
+        result.rows += 1
+        try:
+            if isinstance(row, Exception):
+                raise row
+            name, changes = parse_row(row)
+        except ValueError as e:
+            result.error(line_no, str(e))
+            continue
+        if shop_catalog.is_snapshot():
+            # Snapshots only have price and stock columns
+            for field in EXTRA_FIELDS:
+                changes.pop(field, None)
+            if not changes:
+                result.unchanged += 1
+                continue
+
+        current = staged.get(name) or shop_catalog.products.get(name)
+        if current is None:
+            if not {"price", "stock"} <= set(changes):
+                result.error(line_no, f"New product {name} needs both price and stock.")
+                continue
+            result.added += 1
+            if diff_file:
+                diff_file.write(f"+ {name}: price {changes['price']}, stock {changes['stock']}\n")
+        else:
+            changes = {key: value for key, value in changes.items() if current.get(key) != value}
+            if not changes:
+                result.unchanged += 1
+                continue
+            result.updated += 1
+            if diff_file:
+                details = ", ".join(f"{key} {current.get(key)} -> {value}" for key, value in changes.items())
+                diff_file.write(f"~ {name}: {details}\n")
+
+        staged[name] = dict(current or {}, **changes)
+        if dry_run:
+            if len(staged) >= batch_size:
+                staged.clear()
+        else:
+            batch.setdefault(name, {}).update(changes)
+            if len(batch) >= batch_size:
+                apply()
+
+    if batch:
+        apply()
+    if not dry_run and (result.added or result.updated):
+        shop_catalog.save()
+    return result
+
+
+def export_catalog(shop_catalog, path):
+    """Writes a catalog to a CSV or JSONL file, one product per row."""
+    fmt = file_format(path)
+    with shop_catalog.lock:
+        items = list(shop_catalog.products.items())
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for name, data in items:
+                writer.writerow((name, data["price"], data["stock"]) +
+                                tuple(data.get(field, "") for field in EXTRA_FIELDS))
+                count += 1
+        else:
+            for name, data in items:
+                row = {"name": name, "price": data["price"], "stock": data["stock"]}
+                for field in EXTRA_FIELDS:
+                    if data.get(field) is not None:
+                        row[field] = data[field]
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    import sys
+
+    parser = argparse.ArgumentParser(description="Bulk import or export a stock catalog.")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("catalog", help="catalog JSON file, e.g. stock.json")
+    parser.add_argument("file", help="CSV or JSONL file to read or write")
+    parser.add_argument("--dry-run", action="store_true", help="only show what an import would change")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    shop_catalog = catalog.get_catalog(args.catalog)
+    if args.action == "export":
+        print(f"Exported {export_catalog(shop_catalog, args.file)} products to {args.file}.")
+    else:
+        outcome = import_catalog(shop_catalog, args.file, dry_run=args.dry_run,
+                                 batch_size=args.batch_size,
+                                 diff_file=sys.stdout if args.dry_run else None)
+        print(outcome.summary())
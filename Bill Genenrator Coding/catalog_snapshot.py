@@ -0,0 +1,356 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import MutableMapping
+
+# ------------------ Binary Catalog Snapshot ------------------
+# A read-mostly catalog file that is opened with mmap instead of parsed, so
+# opening a catalog of a million products takes milliseconds and a lookup only
+# touches the pages it needs. Layout (little-endian):
+#
+#   header      magic, version, product count, hash slots, string table size,
+#               extras size
+#   prices      float64 x count
+#   stocks      int64   x count
+#   name ends   uint32  x (count + 1)   end offset of each name in the strings
+#   hash index  uint32  x slots         product number + 1, 0 = empty slot
+#   strings     the UTF-8 product names back to back
+#   extras      JSON {name: {field: value}} of the products' other fields
+#               (reorder_level, hsn, gst_rate...), read on first use
+#
+# Price and stock are updated in place. Products added after the snapshot was
+# built, and changes to the other fields, are kept in memory and written out by
+# rebuilding the file on save. Products read before a rebuild keep working:
+# they find their place in the new file by name.
+MAGIC = b"CSNP"
+VERSION = 2
+# Version 1 files have no extras; their header padding reads as size 0
+VERSIONS = (1, 2)
+HEADER = struct.Struct("<4sIIIQQ")
+HEADER_SIZE = 32
+PRICE = struct.Struct("<d")
+STOCK = struct.Struct("<q")
+UINT32 = struct.Struct("<I")
+
+
+def name_hash(name_bytes):
+    return zlib.crc32(name_bytes)
+
+
+def product_extras(products):
+    """Returns {name: {field: value}} of the fields other than price and stock of {name: product}."""
+    extras = {}
+    for name, product in products.items():
+        fields = {key: value for key, value in product.items() if key not in ("price", "stock")}
+        if fields:
+            extras[name] = fields
+    return extras
+
+
+def write_snapshot(path, items, extras=None):
+    """Writes (name, price, stock) items, and {name: {field: value}} extras, to a snapshot file."""
+    prices = array("d")
+    stocks = array("q")
+    ends = array("I", [0])
+    strings = bytearray()
+    names = []
+    for name, price, stock in items:
+        name_bytes = name.encode("utf-8")
+        names.append(name_bytes)
+        prices.append(price)
+        stocks.append(stock)
+        strings += name_bytes
+        ends.append(len(strings))
+
+    count = len(names)
+    slots = 1
+    while slots < count * 2:
+        slots *= 2
+    index = array("I", bytes(4 * slots))
+    for i, name_bytes in enumerate(names):
+        slot = name_hash(name_bytes) & (slots - 1)
+        while index[slot]:
+            slot = (slot + 1) & (slots - 1)
+        index[slot] = i + 1
+
+    for column in (prices, stocks, ends, index):
+        if sys.byteorder != "little":
+            column.byteswap()
+
+    extras_text = json.dumps(extras, ensure_ascii=False, separators=(",", ":")).encode("utf-8") if extras else b""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, count, slots, len(strings), len(extras_text)).ljust(HEADER_SIZE, b"\0"))
+        for column in (prices, stocks, ends, index):
+            column.tofile(f)
+        f.write(strings)
+        f.write(extras_text)
+    os.replace(tmp_path, path)
+    return count
+
+
+class Snapshot:
+    """An open, memory-mapped snapshot file."""
+
+    def __init__(self, path, writable=True):
+        self.path = path
+        self.file = open(path, "r+b" if writable else "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        magic, version, self.count, self.slots, self.strings_size, self.extras_size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version not in VERSIONS:
+            raise ValueError(f"{path} is not a catalog snapshot.")
+        self.prices_at = HEADER_SIZE
+        self.stocks_at = self.prices_at + 8 * self.count
+        self.ends_at = self.stocks_at + 8 * self.count
+        self.index_at = self.ends_at + 4 * (self.count + 1)
+        self.strings_at = self.index_at + 4 * self.slots
+        self.extras_at = self.strings_at + self.strings_size
+        self._extras = None
+
+    @property
+    def extras(self):
+        """{name: {field: value}} of the products' other fields, parsed on first use."""
+        if self._extras is None:
+            text = self.map[self.extras_at:self.extras_at + self.extras_size]
+            self._extras = json.loads(text) if text else {}
+        return self._extras
+
+    def name_bytes(self, i):
+        start = UINT32.unpack_from(self.map, self.ends_at + 4 * i)[0]
+        end = UINT32.unpack_from(self.map, self.ends_at + 4 * (i + 1))[0]
+        return self.map[self.strings_at + start:self.strings_at + end]
+
+    def name(self, i):
+        return self.name_bytes(i).decode("utf-8")
+
+    def find(self, name):
+        """Returns the product number of a name, or -1 if it is not in the snapshot."""
+        if not self.count:
+            return -1
+        name_bytes = name.encode("utf-8")
+        slot = name_hash(name_bytes) & (self.slots - 1)
+        while True:
+            entry = UINT32.unpack_from(self.map, self.index_at + 4 * slot)[0]
+            if not entry:
+                return -1
+            if self.name_bytes(entry - 1) == name_bytes:
+                return entry - 1
+            slot = (slot + 1) & (self.slots - 1)
+
+    def price(self, i):
+        price = PRICE.unpack_from(self.map, self.prices_at + 8 * i)[0]
+        return int(price) if price.is_integer() else price
+
+    def stock(self, i):
+        return STOCK.unpack_from(self.map, self.stocks_at + 8 * i)[0]
+
+    def set_price(self, i, price):
+        PRICE.pack_into(self.map, self.prices_at + 8 * i, price)
+
+    def set_stock(self, i, stock):
+        STOCK.pack_into(self.map, self.stocks_at + 8 * i, stock)
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class ProductView(MutableMapping):
+    """A product stored in a snapshot, used like the {"price": .., "stock": ..} dicts."""
+
+    def __init__(self, products, name, i):
+        self.products = products
+        self.name = name
+        self.snapshot = products.snapshot
+        self.i = i
+
+    def place(self):
+        """Returns (snapshot, product number), looking the name up again after the file was rebuilt."""
+        if self.snapshot is not self.products.snapshot:
+            self.snapshot = self.products.snapshot
+            self.i = self.snapshot.find(self.name)
+            if self.i < 0:
+                raise KeyError(self.name)
+        return self.snapshot, self.i
+
+    def __getitem__(self, key):
+        snapshot, i = self.place()
+        if key == "price":
+            return snapshot.price(i)
+        if key == "stock":
+            return snapshot.stock(i)
+        return self.products.extras.get(self.name, {})[key]
+
+    def __setitem__(self, key, value):
+        snapshot, i = self.place()
+        if key == "price":
+            snapshot.set_price(i, value)
+        elif key == "stock":
+            snapshot.set_stock(i, value)
+        else:
+            self.products.extras.setdefault(self.name, {})[key] = value
+            self.products.extras_changed = True
+
+    def __delitem__(self, key):
+        fields = self.products.extras.get(self.name, {})
+        if key not in fields:
+            raise KeyError(f"Cannot remove {key} from a snapshot product.")
+        del fields[key]
+        self.products.extras_changed = True
+
+    def __iter__(self):
+        return iter(("price", "stock", *self.products.extras.get(self.name, ())))
+
+    def __len__(self):
+        return 2 + len(self.products.extras.get(self.name, ()))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class SnapshotProducts(MutableMapping):
+    """The products mapping of a catalog kept in a snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshot = Snapshot(path)
+        self.added = {}
+        self.extras_changed = False
+
+    @property
+    def extras(self):
+        return self.snapshot.extras
+
+    def __getitem__(self, name):
+        i = self.snapshot.find(name)
+        if i >= 0:
+            return ProductView(self, name, i)
+        return self.added[name]
+
+    def __setitem__(self, name, product):
+        i = self.snapshot.find(name)
+        if i < 0:
+            self.added[name] = product
+            return
+        view = ProductView(self, name, i)
+        for key, value in product.items():
+            view[key] = value
+
+    def __delitem__(self, name):
+        if self.snapshot.find(name) >= 0:
+            raise KeyError(f"Cannot remove {name} from a snapshot catalog.")
+        del self.added[name]
+
+    def __contains__(self, name):
+        return self.snapshot.find(name) >= 0 or name in self.added
+
+    def __iter__(self):
+        for i in range(self.snapshot.count):
+            yield self.snapshot.name(i)
+        yield from list(self.added)
+
+    def __len__(self):
+        return self.snapshot.count + len(self.added)
+
+    def at_or_below(self, level):
+        """Yields the names of the snapshot's own products with stock <= level, from the stock column alone."""
+        snapshot = self.snapshot
+        stocks = array("q")
+        stocks.frombytes(snapshot.map[snapshot.stocks_at:snapshot.ends_at])
+        if sys.byteorder != "little":
+            stocks.byteswap()
+        for i, stock in enumerate(stocks):
+            if stock <= level:
+                yield snapshot.name(i)
+
+    def stocks(self):
+        """Returns {name: stock} of every product, reading the snapshot's columns in bulk."""
+        snapshot = self.snapshot
+        stocks = array("q")
+        stocks.frombytes(snapshot.map[snapshot.stocks_at:snapshot.ends_at])
+        ends = array("I")
+        ends.frombytes(snapshot.map[snapshot.ends_at:snapshot.index_at])
+        if sys.byteorder != "little":
+            stocks.byteswap()
+            ends.byteswap()
+        strings = snapshot.map[snapshot.strings_at:snapshot.strings_at + snapshot.strings_size]
+        result = {strings[start:end].decode("utf-8"): stock for start, end, stock in zip(ends, ends[1:], stocks)}
+        for name, product in list(self.added.items()):
+            result[name] = product["stock"]
+        return result
+
+    def items_raw(self):
+        """Yields (name, price, stock) for every product."""
+        snapshot = self.snapshot
+        for i in range(snapshot.count):
+            yield snapshot.name(i), snapshot.price(i), snapshot.stock(i)
+        for name, product in list(self.added.items()):
+            yield name, product["price"], product["stock"]
+
+    def all_extras(self):
+        """Returns the other fields of every product, added ones included."""
+        extras = dict(self.extras)
+        extras.update(product_extras(self.added))
+        return extras
+
+    def save(self):
+        """Flushes in-place changes, rebuilding the file if products were added or other fields changed."""
+        if not self.added and not self.extras_changed:
+            self.snapshot.flush()
+            return
+        items = list(self.items_raw())
+        extras = self.all_extras()
+        self.snapshot.close()
+        write_snapshot(self.path, items, extras)
+        # Views handed out before find their products in the new file by name
+        self.snapshot = Snapshot(self.path)
+        self.added = {}
+        self.extras_changed = False
+
+
+# ------------------ Conversion ------------------
+def json_to_snapshot(json_path, snap_path):
+    """Converts a stock.json catalog into a snapshot file."""
+    with open(json_path, "r") as f:
+        products = json.load(f)
+    return write_snapshot(snap_path, ((name, data["price"], data["stock"]) for name, data in products.items()),
+                          product_extras(products))
+
+
+def snapshot_to_json(snap_path, json_path):
+    """Converts a snapshot file back into a stock.json catalog, one product at a time."""
+    products = SnapshotProducts(snap_path)
+    extras = products.all_extras()
+    tmp_path = json_path + ".tmp"
+    count = 0
+    with open(tmp_path, "w") as f:
+        f.write("{")
+        for name, price, stock in products.items_raw():
+            f.write("," if count else "")
+            f.write(f"\n    {json.dumps(name)}: {{\n        \"price\": {json.dumps(price)},\n        \"stock\": {stock}")
+            for key, value in extras.get(name, {}).items():
+                f.write(f",\n        {json.dumps(key)}: {json.dumps(value)}")
+            f.write("\n    }")
+            count += 1
+        f.write("\n}" if count else "}")
+    products.snapshot.close()
+    os.replace(tmp_path, json_path)
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python catalog_snapshot.py stock.json stock.snap   (or the other way round)")
+        sys.exit(1)
+    source, target = sys.argv[1], sys.argv[2]
+    if target.endswith(".snap"):
+        print(f"Wrote {json_to_snapshot(source, target)} products to {target}.")
+    else:
+        print(f"Wrote {snapshot_to_json(source, target)} products to {target}.")
@@ -0,0 +1,342 @@
+import argparse
+import json
+import os
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime
+
+import file_lock
+
+# ------------------ Customers and Credit ------------------
+# Customer accounts of a store and the credit they run up. Everything lives in
+# customers/, per store:
+#
+#   <store>_customers.jsonl  {"id", "name", "phone", "created", "gstin"?}; an edit
+#                            appends the customer again and the last line wins
+#   <store>_ledger.jsonl     {"customer", "date", "kind", "amount", "balance", ...}
+#                            one line per credit bill ("bill"), payment
+#                            ("payment") or refund of returned items
+#                            ("return"), never rewritten
+#   <store>_balances.json    the balances as of some ledger offset
+#
+# Lookups use sorted lists of (phone, id) and (name word, id), so a phone or
+# name prefix is a bisect plus the matches, whatever the number of customers.
+# Each ledger line carries the customer's balance after it, so balances are
+# kept up to date one entry at a time; loading reads the last snapshot and
+# only the ledger lines written after it.
+#
+# The app, the API and the command-line tools (payments here, refunds in
+# returns.py) all write to the same files. Every change is made under the file
+# lock of the file it appends to (see file_lock.py), after reading what the
+# others appended since, so balances and new IDs follow on from their entries.
+customers_dir = "customers"
+# Balances are snapshotted after this many ledger entries
+SNAPSHOT_EVERY = 500
+KINDS = ("bill", "payment", "return")
+
+_books = {}
+_registry_lock = threading.Lock()
+
+
+def phone_digits(phone):
+    return "".join(ch for ch in phone if ch.isdigit())
+
+
+def name_words(name):
+    return name.lower().split()
+
+
+def append_line(path, entry):
+    """Appends one JSON line and returns the file size after it."""
+    with open(path, "ab") as f:
+        f.write((json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def read_lines(path, offset=0):
+    """Yields (entry, offset after it) for the complete lines after offset."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            yield json.loads(line), offset
+
+
+class CustomerBook:
+    """The customers of one store, with prefix indexes and running credit balances."""
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.customers_path = os.path.join(customers_dir, f"{store}_customers.jsonl")
+        self.ledger_path = os.path.join(customers_dir, f"{store}_ledger.jsonl")
+        self.balances_path = os.path.join(customers_dir, f"{store}_balances.json")
+        self.customers = {}
+        self.by_phone = {}
+        self.phone_keys = []
+        self.name_keys = []
+        self.balances = {}
+        self.customers_offset = 0
+        self.ledger_offset = 0
+        self.unsaved = 0
+        # Bumped on every change, so screens know to redraw
+        self.version = 0
+
+        for customer, offset in read_lines(self.customers_path):
+            self.customers[customer["id"]] = customer
+            self.customers_offset = offset
+        # Built in one sort rather than one insert at a time
+        for customer in self.customers.values():
+            self.by_phone[customer["phone"]] = customer["id"]
+        self.phone_keys = sorted((phone, customer_id) for phone, customer_id in self.by_phone.items())
+        self.name_keys = sorted((word, customer["id"]) for customer in self.customers.values()
+                                for word in set(name_words(customer["name"])))
+        try:
+            with open(self.balances_path, "r") as f:
+                snapshot = json.load(f)
+            self.balances = snapshot["balances"]
+            self.ledger_offset = snapshot["offset"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+        for entry, offset in read_lines(self.ledger_path, self.ledger_offset):
+            self.balances[entry["customer"]] = entry["balance"]
+            self.ledger_offset = offset
+            self.unsaved += 1
+
+    def catch_up(self):
+        """Reads the customers and ledger entries other processes appended since; call with the lock held."""
+        changed = False
+        for customer, offset in read_lines(self.customers_path, self.customers_offset):
+            self.index(customer)
+            self.customers_offset = offset
+            changed = True
+        for entry, offset in read_lines(self.ledger_path, self.ledger_offset):
+            self.balances[entry["customer"]] = entry["balance"]
+            self.ledger_offset = offset
+            self.unsaved += 1
+            changed = True
+        if changed:
+            self.version += 1
+
+    # ------------------ Accounts ------------------
+    def index(self, customer):
+        old = self.customers.get(customer["id"])
+        if old is not None:
+            self.unindex(old)
+        self.customers[customer["id"]] = customer
+        self.by_phone[customer["phone"]] = customer["id"]
+        insort(self.phone_keys, (customer["phone"], customer["id"]))
+        for word in set(name_words(customer["name"])):
+            insort(self.name_keys, (word, customer["id"]))
+
+    def unindex(self, customer):
+        del self.by_phone[customer["phone"]]
+        for keys, key in [(self.phone_keys, customer["phone"])] + \
+                         [(self.name_keys, word) for word in set(name_words(customer["name"]))]:
+            i = bisect_left(keys, (key, customer["id"]))
+            del keys[i]
+
+    def check(self, name, phone, gstin, customer_id=None):
+        name = " ".join(name.split())
+        phone = phone_digits(phone)
+        gstin = gstin.strip().upper()
+        if not name:
+            raise ValueError("Customer name cannot be empty.")
+        if len(phone) < 6:
+            raise ValueError("Enter a phone number with at least 6 digits.")
+        if gstin and not (len(gstin) == 15 and gstin.isalnum()):
+            raise ValueError("A GSTIN has 15 letters and digits.")
+        owner = self.by_phone.get(phone)
+        if owner is not None and owner != customer_id:
+            raise ValueError(f"Phone {phone} already belongs to {self.customers[owner]['name']}.")
+        return name, phone, gstin
+
+    def add(self, name, phone, now=None, gstin=""):
+        """Creates a customer and returns it. Business customers give their GSTIN."""
+        with self.lock, file_lock.locked(self.customers_path):
+            # Numbered after every customer added so far, by any process
+            self.catch_up()
+            name, phone, gstin = self.check(name, phone, gstin)
+            customer = {"id": f"C{len(self.customers) + 1:06d}", "name": name, "phone": phone,
+                        "created": (now or datetime.now()).isoformat(timespec="seconds")}
+            if gstin:
+                customer["gstin"] = gstin
+            self.customers_offset = append_line(self.customers_path, customer)
+            self.index(customer)
+            self.version += 1
+            return dict(customer)
+
+    def update(self, customer_id, name, phone, gstin=None):
+        """Changes a customer's name, phone or GSTIN and returns the customer."""
+        with self.lock, file_lock.locked(self.customers_path):
+            self.catch_up()
+            if customer_id not in self.customers:
+                raise KeyError(f"No customer {customer_id}.")
+            customer = dict(self.customers[customer_id])
+            name, phone, gstin = self.check(name, phone, customer.get("gstin", "") if gstin is None else gstin,
+                                            customer_id)
+            customer.update(name=name, phone=phone)
+            customer.pop("gstin", None)
+            if gstin:
+                customer["gstin"] = gstin
+            self.customers_offset = append_line(self.customers_path, customer)
+            self.index(customer)
+            self.version += 1
+            return dict(customer)
+
+    def get(self, customer_id):
+        with self.lock:
+            customer = self.customers.get(customer_id)
+            return dict(customer) if customer else None
+
+    def find(self, query, limit=20):
+        """Returns customers whose phone, or a word of whose name, starts with the query."""
+        digits = phone_digits(query)
+        words = name_words(query)
+        if not words:
+            return []
+        if digits and len(digits) == len(query.replace(" ", "").lstrip("+")):
+            keys, prefix, rest = self.phone_keys, digits, []
+        else:
+            # The longest word narrows the search most; the others filter its matches
+            prefix = max(words, key=len)
+            keys, rest = self.name_keys, [word for word in words if word != prefix]
+        found = []
+        seen = set()
+        with self.lock:
+            i = bisect_left(keys, (prefix,))
+            while i < len(keys) and len(found) < limit:
+                key, customer_id = keys[i]
+                if not key.startswith(prefix):
+                    break
+                i += 1
+                customer = self.customers[customer_id]
+                if customer_id in seen:
+                    continue
+                seen.add(customer_id)
+                own_words = name_words(customer["name"])
+                if all(any(word.startswith(part) for word in own_words) for part in rest):
+                    found.append(dict(customer))
+        return found
+
+    # ------------------ Credit Ledger ------------------
+    def balance(self, customer_id):
+        """Returns what a customer owes."""
+        with self.lock:
+            self.catch_up()
+            return self.balances.get(customer_id, 0)
+
+    def post(self, customer_id, kind, amount, now=None, **details):
+        """Appends a ledger entry and returns it; a bill adds to the balance, a payment or return takes from it."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown ledger entry {kind}.")
+        if amount <= 0:
+            raise ValueError("Amount must be a positive number.")
+        with self.lock, file_lock.locked(self.ledger_path):
+            # The balance follows on from every entry so far, by any process
+            self.catch_up()
+            if customer_id not in self.customers:
+                raise KeyError(f"No customer {customer_id}.")
+            change = amount if kind == "bill" else -amount
+            balance = round(self.balances.get(customer_id, 0) + change, 2)
+            entry = {"customer": customer_id, "date": (now or datetime.now()).isoformat(timespec="seconds"),
+                     "kind": kind, "amount": amount, "balance": balance}
+            entry.update(details)
+            self.ledger_offset = append_line(self.ledger_path, entry)
+            self.balances[customer_id] = balance
+            self.unsaved += 1
+            if self.unsaved >= SNAPSHOT_EVERY:
+                self.save_balances()
+            self.version += 1
+            return entry
+
+    def charge(self, customer_id, record):
+        """Puts a bill on a customer's credit."""
+        return self.post(customer_id, "bill", record["total"], datetime.fromisoformat(record["date"]),
+                         bill_id=record["bill_id"])
+
+    def pay(self, customer_id, amount, now=None, note=""):
+        """Records a payment towards a customer's credit."""
+        return self.post(customer_id, "payment", amount, now, **({"note": note} if note else {}))
+
+    def save_balances(self):
+        """Writes the balance snapshot; call with the lock and the ledger's file lock held."""
+        if not self.unsaved:
+            return
+        tmp_path = self.balances_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"offset": self.ledger_offset, "balances": self.balances}, f)
+        os.replace(tmp_path, self.balances_path)
+        self.unsaved = 0
+
+    def close(self):
+        with self.lock, file_lock.locked(self.ledger_path):
+            self.catch_up()
+            self.save_balances()
+
+    def statement(self, customer_id):
+        """Returns every ledger entry of a customer, oldest first."""
+        return [entry for entry, offset in read_lines(self.ledger_path) if entry["customer"] == customer_id]
+
+
+def get_customers(profile):
+    """Returns the customer book shared by every lane of a store profile."""
+    with _registry_lock:
+        book = _books.get(profile["key"])
+        if book is None:
+            book = _books[profile["key"]] = CustomerBook(profile["key"])
+        return book
+
+
+def close_all():
+    """Snapshots every open book's balances; registered with atexit by the app."""
+    with _registry_lock:
+        books = list(_books.values())
+    for book in books:
+        book.close()
+
+
+if __name__ == "__main__":
+    import store_profiles
+
+    parser = argparse.ArgumentParser(description="Find customers, take payments and print statements.")
+    parser.add_argument("profile", help="store profile from store_profiles.json")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_command = commands.add_parser("add", help="add a customer")
+    add_command.add_argument("name")
+    add_command.add_argument("phone")
+    add_command.add_argument("--gstin", default="", help="GSTIN of a business customer")
+    find_command = commands.add_parser("find", help="find customers by phone or name prefix")
+    find_command.add_argument("query")
+    pay_command = commands.add_parser("pay", help="record a payment")
+    pay_command.add_argument("customer")
+    pay_command.add_argument("amount", type=float)
+    pay_command.add_argument("--note", default="")
+    statement_command = commands.add_parser("statement", help="print a customer's credit history")
+    statement_command.add_argument("customer")
+    args = parser.parse_args()
+
+    book = get_customers(store_profiles.get_profile(args.profile))
+    if args.command == "add":
+        added = book.add(args.name, args.phone, gstin=args.gstin)
+        print(f"Added {added['id']} {added['name']} ({added['phone']}).")
+    elif args.command == "find":
+        for match in book.find(args.query):
+            print(f"{match['id']}  {match['name']:30} {match['phone']:15} owes ₹{book.balance(match['id'])}")
+    elif args.command == "pay":
+        paid = book.pay(args.customer, args.amount, note=args.note)
+        print(f"Payment recorded. {args.customer} now owes ₹{paid['balance']}.")
+    else:
+        for line in book.statement(args.customer):
+            sign = "+" if line["kind"] == "bill" else "-"
+            print(f"{line['date']}  {line['kind']:8} {line.get('bill_id', line.get('note', '')):22} "
+                  f"{sign}₹{line['amount']:<10} balance ₹{line['balance']}")
+    book.close()
@@ -0,0 +1,42 @@
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# ------------------ File Locks ------------------
+# Files shared by several processes (the app, the API, the command-line tools)
+# are appended to under an exclusive lock on a companion "<file>.lock", held
+# while the writer catches up with what the others wrote and adds its own.
+# The lock file itself stays empty; it is never replaced, so the data file can
+# be.
+
+
+@contextmanager
+def locked(path):
+    """Holds the exclusive lock of a shared file, across processes and threads."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    # Locks the first byte; gives up after about 10 seconds, so keep trying
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,251 @@
+import argparse
+import csv
+import json
+import os
+from datetime import datetime, timedelta
+
+import bill_records
+import catalog
+import customers
+import returns
+
+# ------------------ GST Return Export ------------------
+# Adds up a month of bill records into the summaries of a GSTR-1 style return:
+#
+#   b2b   bills to customers with a GSTIN, per customer GSTIN and tax rate
+#   b2cs  all other bills, per tax rate, less their credit notes
+#   cdnr  credit notes to customers with a GSTIN, per customer GSTIN and tax rate
+#   hsn   every bill line less every credit note line, per HSN code and tax rate
+#   docs  the range and count of bill and credit note numbers of each terminal
+#
+# A store's bills are those numbered with its profile's prefix, so stores
+# sharing a records folder (or a name) are kept apart. Credit notes (see
+# returns.py) count in the month they were issued, whatever the month of the
+# bill. The records are read once, a line at a time, into running totals keyed
+# by those fields, so memory depends on the number of rates, HSN codes and B2B
+# customers and not on the number of bills.
+#
+# A product's "hsn" and "gst_rate" come from the catalog, falling back to the
+# profile's gst_rate. Offers are shared out over a bill's lines in proportion
+# to their value. Sales are taken as within the state, so the tax is split
+# equally into CGST and SGST.
+export_dir = "gst_returns"
+
+
+class Totals:
+    """Running totals of one summary row."""
+
+    __slots__ = ("bills", "notes", "qty", "value", "taxable", "tax")
+
+    def __init__(self):
+        self.bills = 0
+        self.notes = 0
+        self.qty = 0
+        self.value = 0.0
+        self.taxable = 0.0
+        self.tax = 0.0
+
+    def add(self, qty, value, taxable, tax):
+        self.qty += qty
+        self.value += value
+        self.taxable += taxable
+        self.tax += tax
+
+    def amounts(self):
+        cgst = round(self.tax / 2, 2)
+        return {"txval": round(self.taxable, 2), "camt": cgst, "samt": round(self.tax - cgst, 2),
+                "iamt": 0, "csamt": 0}
+
+
+def month_range(month):
+    """Returns the first and last day of a YYYY-MM month."""
+    first = datetime.strptime(month, "%Y-%m")
+    last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return first, last
+
+
+class GstReturn:
+    """The month's summaries, filled one bill record at a time."""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.catalog = catalog.get_catalog(profile["catalog"], profile["default_catalog"])
+        book = customers.get_customers(profile)
+        with book.lock:
+            self.gstins = {customer_id: customer["gstin"] for customer_id, customer in book.customers.items()
+                           if customer.get("gstin")}
+        self.inclusive = profile["prices_include_gst"]
+        self.tax_codes = {}
+        self.b2b = {}
+        self.b2cs = {}
+        self.cdnr = {}
+        self.hsn = {}
+        self.docs = {}
+        self.note_docs = {}
+        self.bills = 0
+        self.notes = 0
+
+    def issued_here(self, terminal):
+        """True if a terminal (numbering prefix and number, e.g. NM1) is one of this store's."""
+        prefix = self.profile["numbering"]["prefix"]
+        return terminal.startswith(prefix) and terminal[len(prefix):].isdigit()
+
+    def tax_code(self, product):
+        """Returns (HSN code, rate) of a product, looked up once per product."""
+        code = self.tax_codes.get(product)
+        if code is None:
+            data = self.catalog.products.get(product) or {}
+            rate = float(self.profile["gst_rate"] if data.get("gst_rate") is None else data["gst_rate"])
+            code = self.tax_codes[product] = (str(data.get("hsn", "")), int(rate) if rate.is_integer() else rate)
+        return code
+
+    def split(self, value, rate):
+        """Returns (value with tax, taxable value, tax) of an amount charged at a rate."""
+        if self.inclusive:
+            taxable = value / (1 + rate / 100)
+            return value, taxable, value - taxable
+        return value * (1 + rate / 100), value, value * rate / 100
+
+    def add(self, record):
+        self.bills += 1
+        ctin = self.gstins.get(record.get("customer"))
+        # Offers lower the taxable value of every line by the same share
+        share = record["total"] / record["subtotal"] if record.get("subtotal") else 1
+        seen_rates = set()
+        for product, qty, price, item_total in record["items"]:
+            hsn, rate = self.tax_code(product)
+            value, taxable, tax = self.split(item_total * share, rate)
+            if ctin:
+                section = self.b2b.setdefault((ctin, rate), Totals())
+            else:
+                section = self.b2cs.setdefault(rate, Totals())
+            section.add(qty, value, taxable, tax)
+            if rate not in seen_rates:
+                seen_rates.add(rate)
+                section.bills += 1
+            self.hsn.setdefault((hsn, rate), Totals()).add(qty, value, taxable, tax)
+
+        self.number(self.docs, record.get("terminal", ""), record["bill_id"])
+
+    def add_note(self, note):
+        """Takes a credit note's items off the month's supplies."""
+        self.notes += 1
+        ctin = self.gstins.get(note.get("customer"))
+        seen_rates = set()
+        for product, qty, price, amount in note["items"]:
+            hsn, rate = self.tax_code(product)
+            value, taxable, tax = self.split(amount, rate)
+            if ctin:
+                # Registered customers get the credit note reported as such
+                section = self.cdnr.setdefault((ctin, rate), Totals())
+                section.add(qty, value, taxable, tax)
+            else:
+                # Supplies to everyone else are reported net of returns
+                section = self.b2cs.setdefault(rate, Totals())
+                section.add(-qty, -value, -taxable, -tax)
+            if rate not in seen_rates:
+                seen_rates.add(rate)
+                section.notes += 1
+            self.hsn.setdefault((hsn, rate), Totals()).add(-qty, -value, -taxable, -tax)
+        self.number(self.note_docs, note["terminal"], note["credit_note"])
+
+    @staticmethod
+    def number(docs, terminal, number):
+        """Widens a terminal's range of document numbers to take in one more."""
+        series = docs.get(terminal)
+        if series is None:
+            docs[terminal] = [number, number, 1]
+        else:
+            series[0] = min(series[0], number)
+            series[1] = max(series[1], number)
+            series[2] += 1
+
+    def to_json(self, month):
+        first, last = month_range(month)
+        b2b = {}
+        for (ctin, rate), totals in sorted(self.b2b.items()):
+            b2b.setdefault(ctin, []).append(dict(rt=rate, bills=totals.bills, val=round(totals.value, 2),
+                                                 **totals.amounts()))
+        cdnr = {}
+        for (ctin, rate), totals in sorted(self.cdnr.items()):
+            cdnr.setdefault(ctin, []).append(dict(ntty="C", rt=rate, notes=totals.notes,
+                                                  val=round(totals.value, 2), **totals.amounts()))
+
+        def series(docs):
+            return [{"num": number, "from": start, "to": end, "totnum": count, "cancel": 0, "net_issue": count}
+                    for number, (terminal, (start, end, count)) in enumerate(sorted(docs.items()), 1)]
+
+        doc_det = [{"doc_num": 1, "doc_typ": "Invoices for outward supply", "docs": series(self.docs)}]
+        if self.note_docs:
+            doc_det.append({"doc_num": 5, "doc_typ": "Credit Note", "docs": series(self.note_docs)})
+        return {
+            "gstin": self.profile["gstin"],
+            "fp": first.strftime("%m%Y"),
+            "store": self.profile["name"],
+            "bills": self.bills,
+            "credit_notes": self.notes,
+            "b2b": [{"ctin": ctin, "rates": rates} for ctin, rates in b2b.items()],
+            "b2cs": [dict(sply_ty="INTRA", typ="OE", rt=rate, bills=totals.bills, notes=totals.notes,
+                          **totals.amounts())
+                     for rate, totals in sorted(self.b2cs.items())],
+            "cdnr": [{"ctin": ctin, "rates": rates} for ctin, rates in cdnr.items()],
+            "hsn": {"data": [dict(num=number, hsn_sc=hsn, rt=rate, qty=totals.qty,
+                                  val=round(totals.value, 2), **totals.amounts())
+                             for number, ((hsn, rate), totals) in enumerate(sorted(self.hsn.items()), 1)]},
+            "doc_issue": {"doc_det": doc_det},
+            "period": [first.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d")],
+        }
+
+    def write(self, month, dest_dir=export_dir):
+        """Writes gstr1_<store>_<YYYYMM>.json and one CSV per section; returns their paths."""
+        os.makedirs(dest_dir, exist_ok=True)
+        stem = os.path.join(dest_dir, f"gstr1_{self.profile['key']}_{month.replace('-', '')}")
+        summary = self.to_json(month)
+        paths = [stem + ".json"]
+        with open(paths[0], "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        amount_fields = ["txval", "camt", "samt", "iamt", "csamt"]
+        sections = {
+            "b2b": (["ctin", "rt", "bills", "val"] + amount_fields,
+                    [dict(rate, ctin=entry["ctin"]) for entry in summary["b2b"] for rate in entry["rates"]]),
+            "b2cs": (["rt", "bills", "notes"] + amount_fields, summary["b2cs"]),
+            "cdnr": (["ctin", "rt", "notes", "val"] + amount_fields,
+                     [dict(rate, ctin=entry["ctin"]) for entry in summary["cdnr"] for rate in entry["rates"]]),
+            "hsn": (["hsn_sc", "rt", "qty", "val"] + amount_fields, summary["hsn"]["data"]),
+        }
+        for name, (fields, rows) in sections.items():
+            paths.append(f"{stem}_{name}.csv")
+            with open(paths[-1], "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fields, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(rows)
+        return paths
+
+
+def export_month(profile, month, dest_dir=export_dir):
+    """Exports a YYYY-MM month of a store's bills and credit notes; returns (bill count, file paths)."""
+    first, last = month_range(month)
+    summary = GstReturn(profile)
+    for record in bill_records.iter_records(first, last):
+        if summary.issued_here(record["bill_id"].rsplit("-", 2)[0]):
+            summary.add(record)
+    for note in returns.iter_credit_notes(first, last):
+        if summary.issued_here(note["bill_id"].rsplit("-", 2)[0]):
+            summary.add_note(note)
+    return summary.bills, summary.write(month, dest_dir)
+
+
+if __name__ == "__main__":
+    import store_profiles
+
+    parser = argparse.ArgumentParser(description="Export a month's GSTR-1 style summaries as JSON and CSV.")
+    parser.add_argument("profile", help="store profile from store_profiles.json")
+    parser.add_argument("month", help="month to export, e.g. 2025-10")
+    parser.add_argument("--dir", default=export_dir, help="output folder")
+    args = parser.parse_args()
+
+    count, written = export_month(store_profiles.get_profile(args.profile), args.month, args.dir)
+    print(f"{count} bills exported to:")
+    for written_path in written:
+        print(f"  {written_path}")
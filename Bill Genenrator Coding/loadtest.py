@@ -0,0 +1,302 @@
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import bill_records
+import billing
+import store_profiles
+
+# ------------------ Checkout Load Generator ------------------
+# Drives N lanes at once through the same headless billing path the shop
+# windows use (Lane.add_item / Lane.checkout), either with synthetic baskets or
+# by replaying a recorded day. Each lane is a thread, as in a multi-lane shop.
+#
+# Runs happen in a scratch directory (a fresh temp folder unless --workdir is
+# given) holding a copy of the store's catalog, so the real stock, bill
+# numbers, records and shift totals are never touched. Run it as its own
+# process: the scratch directory becomes the working directory.
+DISTRIBUTIONS = "fixed:N, uniform:A-B, poisson:MEAN (basket size); uniform, zipf:S (popularity)"
+
+
+def basket_sampler(spec):
+    """Returns a function rng -> basket size (at least 1) for e.g. 'poisson:4'."""
+    kind, _, value = spec.partition(":")
+    try:
+        if kind == "fixed":
+            size = int(value)
+            return lambda rng: max(size, 1)
+        if kind == "uniform":
+            low, high = (int(part) for part in value.split("-"))
+            return lambda rng: rng.randint(max(low, 1), max(high, 1))
+        if kind == "poisson":
+            limit = math.exp(-float(value))
+
+            def poisson(rng):
+                # Knuth's method; baskets are small so this is cheap
+                count, product = 0, rng.random()
+                while product > limit:
+                    count += 1
+                    product *= rng.random()
+                return max(count, 1)
+            return poisson
+    except ValueError:
+        pass
+    raise ValueError(f"Unknown basket size distribution '{spec}'. Use {DISTRIBUTIONS}.")
+
+
+def popularity_weights(spec, count):
+    """Returns cumulative pick weights for products ranked by popularity."""
+    kind, _, value = spec.partition(":")
+    if kind == "uniform":
+        weights = [1.0] * count
+    elif kind == "zipf":
+        try:
+            exponent = float(value or 1)
+        except ValueError:
+            raise ValueError(f"Unknown popularity distribution '{spec}'. Use {DISTRIBUTIONS}.")
+        weights = [1 / rank ** exponent for rank in range(1, count + 1)]
+    else:
+        raise ValueError(f"Unknown popularity distribution '{spec}'. Use {DISTRIBUTIONS}.")
+    cumulative, total = [], 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class LoadResult:
+    """Counters and latencies collected from every lane of a run."""
+
+    def __init__(self, lanes):
+        self.lanes = lanes
+        self.lock = threading.Lock()
+        self.bills = 0
+        self.items = 0
+        self.out_of_stock = 0
+        self.empty_bills = 0
+        self.errors = 0
+        self.add_latencies = []
+        self.checkout_latencies = []
+        self.elapsed = 0.0
+
+    def merge(self, bills, items, out_of_stock, empty_bills, errors, add_latencies, checkout_latencies):
+        with self.lock:
+            self.bills += bills
+            self.items += items
+            self.out_of_stock += out_of_stock
+            self.empty_bills += empty_bills
+            self.errors += errors
+            self.add_latencies += add_latencies
+            self.checkout_latencies += checkout_latencies
+
+    def latency_ms(self, latencies):
+        ordered = sorted(latencies)
+        return {name: round(percentile(ordered, fraction) * 1000, 3)
+                for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999), ("max", 1.0))}
+
+    def as_dict(self):
+        elapsed = self.elapsed or 1e-9
+        return {
+            "lanes": self.lanes,
+            "elapsed_s": round(self.elapsed, 3),
+            "bills": self.bills,
+            "items": self.items,
+            "bills_per_s": round(self.bills / elapsed, 1),
+            "items_per_s": round(self.items / elapsed, 1),
+            "out_of_stock": self.out_of_stock,
+            "empty_bills": self.empty_bills,
+            "errors": self.errors,
+            "add_item_ms": self.latency_ms(self.add_latencies),
+            "checkout_ms": self.latency_ms(self.checkout_latencies),
+        }
+
+    def text(self):
+        data = self.as_dict()
+        lines = [
+            f"Lanes: {data['lanes']}   Elapsed: {data['elapsed_s']}s",
+            f"Bills: {data['bills']} ({data['bills_per_s']}/s)   Items: {data['items']} ({data['items_per_s']}/s)",
+            f"Out of stock: {data['out_of_stock']}   Bills left empty: {data['empty_bills']}   Other errors: {data['errors']}",
+        ]
+        for name in ("add_item_ms", "checkout_ms"):
+            figures = "  ".join(f"{key} {value}" for key, value in data[name].items())
+            lines.append(f"{name[:-3]:9} latency (ms): {figures}")
+        return "\n".join(lines)
+
+
+def run_lane(lane, baskets, result, think=0.0, pace=None):
+    """Rings up each basket ([(product, qty), ...]) on one lane and checks it out.
+
+    pace, if given, is a list of start offsets in seconds; each bill waits for
+    its offset from the start of the run (used by replay).
+    """
+    bills = items = out_of_stock = empty_bills = errors = 0
+    add_latencies, checkout_latencies = [], []
+    started = time.perf_counter()
+    for n, basket in enumerate(baskets):
+        if pace is not None:
+            delay = pace[n] - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        for product, qty in basket:
+            begin = time.perf_counter()
+            try:
+                lane.add_item(product, qty)
+                items += 1
+            except billing.BillingError:
+                out_of_stock += 1
+            add_latencies.append(time.perf_counter() - begin)
+        if not lane.bill_items:
+            empty_bills += 1
+            continue
+        begin = time.perf_counter()
+        try:
+            lane.checkout()
+            bills += 1
+        except (billing.BillingError, OSError, ValueError):
+            errors += 1
+        checkout_latencies.append(time.perf_counter() - begin)
+        lane.clear()
+        if think:
+            time.sleep(think)
+    result.merge(bills, items, out_of_stock, empty_bills, errors, add_latencies, checkout_latencies)
+
+
+def synthetic_baskets(products, bills, basket, popularity, max_qty, seed):
+    """Builds the baskets of one lane from the size and popularity distributions."""
+    rng = random.Random(seed)
+    size_of = basket_sampler(basket)
+    cumulative = popularity_weights(popularity, len(products))
+    baskets = []
+    for _ in range(bills):
+        picks = rng.choices(products, cum_weights=cumulative, k=size_of(rng))
+        baskets.append([(product, rng.randint(1, max_qty)) for product in picks])
+    return baskets
+
+
+def replay_baskets(day_file, speed):
+    """Groups a recorded day's bills by terminal: {terminal: (baskets, start offsets)}."""
+    by_terminal = {}
+    first = None
+    for record in bill_records.iter_file(day_file):
+        when = datetime.fromisoformat(record["date"])
+        first = first or when
+        baskets, pace = by_terminal.setdefault(record.get("terminal") or "replay", ([], []))
+        baskets.append([(product, qty) for product, qty, price, item_total in record["items"]])
+        pace.append((when - first).total_seconds() / speed if speed else 0)
+    return by_terminal
+
+
+def prepare_catalog(profile, workdir, products=0, stock=None, extra_prices=None):
+    """Copies the store's catalog into the scratch directory and returns its products."""
+    source = profile["catalog"]
+    if source.endswith(".snap"):
+        raise ValueError("Load tests need a JSON catalog; convert the snapshot with catalog_snapshot.py first.")
+    try:
+        with open(source, "r") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        data = dict(profile["default_catalog"])
+    for i in range(products):
+        data[f"Load Item {i + 1:06d}"] = {"price": 10 + i % 490, "stock": 1000}
+    for name, price in (extra_prices or {}).items():
+        data.setdefault(name, {"price": price, "stock": 1000})
+    if stock is not None:
+        for product in data.values():
+            product["stock"] = stock
+    with open(os.path.join(workdir, os.path.basename(source)), "w") as f:
+        json.dump(data, f)
+    return list(data)
+
+
+def run_load(profile, lanes=4, bills=200, basket="poisson:4", popularity="zipf:1.1", max_qty=3,
+             products=0, stock=None, think=0.0, replay=None, speed=0.0, seed=1, workdir=None):
+    """Runs a load test and returns its LoadResult.
+
+    With replay (a YYYY-MM-DD day from records/), every terminal of that day
+    becomes a lane ringing up its bills in the recorded order; speed > 0 keeps
+    the recorded timing, sped up by that factor, and 0 goes as fast as possible.
+    """
+    scratch = workdir or tempfile.mkdtemp(prefix="loadtest_")
+    os.makedirs(scratch, exist_ok=True)
+    work = []
+    if replay:
+        day_file = os.path.abspath(bill_records.record_path(replay.replace("-", "")))
+        if not os.path.exists(day_file):
+            raise ValueError(f"No bills recorded on {replay}.")
+        prices = {}
+        for record in bill_records.iter_file(day_file):
+            for product, qty, price, item_total in record["items"]:
+                prices[product] = price
+        by_terminal = replay_baskets(day_file, speed)
+
+    names = prepare_catalog(profile, scratch, products, stock, prices if replay else None)
+    profile = dict(profile, catalog=os.path.basename(profile["catalog"]))
+    home = os.getcwd()
+    os.chdir(scratch)
+    try:
+        if replay:
+            for n, (baskets, pace) in enumerate(by_terminal.values(), 1):
+                work.append((billing.Lane(profile, n), baskets, pace))
+        else:
+            for n in range(1, lanes + 1):
+                baskets = synthetic_baskets(names, bills, basket, popularity, max_qty, seed + n)
+                work.append((billing.Lane(profile, n), baskets, None))
+
+        result = LoadResult(len(work))
+        threads = [threading.Thread(target=run_lane, args=(lane, baskets, result, think, pace))
+                   for lane, baskets, pace in work]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result.elapsed = time.perf_counter() - started
+    finally:
+        os.chdir(home)
+        if not workdir:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive many checkout lanes through the billing engine.")
+    parser.add_argument("profile", help="store profile from store_profiles.json")
+    parser.add_argument("--lanes", type=int, default=4)
+    parser.add_argument("--bills", type=int, default=200, help="bills per lane")
+    parser.add_argument("--basket", default="poisson:4", help="basket size: fixed:N, uniform:A-B or poisson:MEAN")
+    parser.add_argument("--popularity", default="zipf:1.1", help="product popularity: uniform or zipf:S")
+    parser.add_argument("--max-qty", type=int, default=3, help="largest quantity per line")
+    parser.add_argument("--products", type=int, default=0, help="extra synthetic products to add to the catalog")
+    parser.add_argument("--stock", type=int, help="set every product's stock to this before starting")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds each lane waits between bills")
+    parser.add_argument("--replay", metavar="YYYY-MM-DD", help="replay the bills recorded on a day")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="replay speed-up over the recorded timing; 0 replays as fast as possible")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="keep the run's catalog, records and numbers in this folder")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    try:
+        outcome = run_load(store_profiles.get_profile(args.profile), lanes=args.lanes, bills=args.bills,
+                           basket=args.basket, popularity=args.popularity, max_qty=args.max_qty,
+                           products=args.products, stock=args.stock, think=args.think,
+                           replay=args.replay, speed=args.speed, seed=args.seed, workdir=args.workdir)
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(outcome.as_dict(), indent=2) if args.json else outcome.text())
@@ -0,0 +1,399 @@
+import argparse
+import asyncio
+import bisect
+import json
+import multiprocessing
+import os
+import re
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import bill_archive
+import bill_records
+import billing
+import receipt
+import store_profiles
+
+# ------------------ POS HTTP API ------------------
+# A small HTTP/1.1 JSON API over the billing engine, for tablets and web
+# storefronts. It serves one store profile; every cart is a Lane, so API bills
+# use the same catalog, stock checks, numbering and records as the counters.
+#
+#   GET    /catalog?q=prefix&limit=100&offset=0   products (name, price, stock)
+#   GET    /catalog/<name>                        one product
+#   POST   /carts                                 open a cart -> {"cart_id"}
+#   GET    /carts/<id>                            items and total
+#   POST   /carts/<id>/items   {"product", "qty"} add an item
+#   DELETE /carts/<id>                            discard the cart
+#   POST   /carts/<id>/checkout                   record the bill -> bill record
+#   GET    /bills/<bill_id>                       bill record
+#   GET    /bills/<bill_id>/receipt               PDF receipt
+#
+# The event loop only parses requests and routes them. Billing calls touch
+# files and the catalog lock, so they run in a small thread pool; receipts are
+# rendered in worker processes, so a slow render never holds up other requests.
+# /catalog pages through a sorted index of the product names, built without
+# holding the catalog lock and dropped when products are added or removed, so
+# browsing a large catalog never holds up the lanes' stock changes.
+#
+# A cart holds the stock of its items until it is checked out or discarded. A
+# cart left untouched for CART_IDLE_MINUTES is discarded by a sweep, and the
+# carts still open when the server stops give their stock back before the
+# catalog is saved.
+MAX_BODY = 1024 * 1024
+IDLE_TIMEOUT = 30
+CART_IDLE_MINUTES = 30
+SWEEP_SECONDS = 60
+STATUS_TEXT = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    """A request was refused with an HTTP status and a JSON error body."""
+
+    def __init__(self, status, title, message):
+        super().__init__(message)
+        self.status = status
+        self.title = title
+
+
+class Cart:
+    """An open API cart: a lane of its own, used by one request at a time."""
+
+    def __init__(self, lane):
+        self.lane = lane
+        self.lock = asyncio.Lock()
+        self.touched = time.monotonic()
+
+
+class PosApi:
+    """Routes API requests to the billing engine of one store."""
+
+    def __init__(self, profile, terminal=9, billing_threads=8, render_workers=2):
+        self.profile = profile
+        self.terminal = terminal
+        self.receipts = billing.get_receipts(profile["layout"])
+        self.catalog = billing.Lane(profile, terminal).catalog
+        self.carts = {}
+        # Sorted (lowercased name, name) of every product, rebuilt when products come or go
+        self.names = None
+        self.indexed = set()
+        self.names_version = 0
+        self.catalog.listeners.append(self.note_catalog_change)
+        self.billing_pool = ThreadPoolExecutor(max_workers=billing_threads, thread_name_prefix="api")
+        # Spawned rather than forked: the server already runs threads
+        self.render_workers = ProcessPoolExecutor(max_workers=render_workers,
+                                                  mp_context=multiprocessing.get_context("spawn"))
+        self.routes = [
+            ("GET", re.compile(r"/catalog"), self.list_products),
+            ("GET", re.compile(r"/catalog/(?P<name>[^/]+)"), self.get_product),
+            ("POST", re.compile(r"/carts"), self.open_cart),
+            ("GET", re.compile(r"/carts/(?P<cart_id>\w+)"), self.get_cart),
+            ("DELETE", re.compile(r"/carts/(?P<cart_id>\w+)"), self.discard_cart),
+            ("POST", re.compile(r"/carts/(?P<cart_id>\w+)/items"), self.add_item),
+            ("POST", re.compile(r"/carts/(?P<cart_id>\w+)/checkout"), self.checkout),
+            ("GET", re.compile(r"/bills/(?P<bill_id>[\w-]+)"), self.get_bill),
+            ("GET", re.compile(r"/bills/(?P<bill_id>[\w-]+)/receipt"), self.get_receipt),
+        ]
+
+    async def blocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.billing_pool, function, *args)
+
+    # ------------------ Catalog ------------------
+    def product_json(self, name):
+        with self.catalog.lock:
+            data = self.catalog.products.get(name)
+            if data is None:
+                raise HttpError(404, "Not Found", f"No product named {name}.")
+            return {"name": name, "price": data["price"], "stock": data["stock"]}
+
+    def note_catalog_change(self, names):
+        """Catalog listener: drops the name index when products were added or removed."""
+        products = self.catalog.products
+        if any((name in self.indexed) != (name in products) for name in names):
+            self.names_version += 1
+            self.names = None
+
+    def name_index(self):
+        """Returns the sorted name index, building it if products came or went since."""
+        index = self.names
+        if index is None:
+            version = self.names_version
+            with self.catalog.lock:
+                names = list(self.catalog.products)
+            # Sorted with the lock released; kept only if no product came or went meanwhile
+            index = sorted((name.lower(), name) for name in names)
+            if version == self.names_version:
+                self.names, self.indexed = index, set(names)
+        return index
+
+    async def list_products(self, query, body):
+        prefix = query.get("q", "").lower()
+        try:
+            limit = min(int(query.get("limit", 100)), 1000)
+            offset = max(int(query.get("offset", 0)), 0)
+        except ValueError:
+            raise HttpError(400, "Bad Request", "limit and offset must be numbers.")
+
+        def page():
+            index = self.name_index()
+            # The names starting with the prefix are next to each other in the index
+            start = bisect.bisect_left(index, (prefix,)) + offset
+            matches = [name for key, name in index[start:start + max(limit, 0)] if key.startswith(prefix)]
+            products = []
+            with self.catalog.lock:
+                for name in matches:
+                    data = self.catalog.products.get(name)
+                    if data is not None:
+                        products.append({"name": name, "price": data["price"], "stock": data["stock"]})
+            return products
+        return 200, {"products": await self.blocking(page)}
+
+    async def get_product(self, query, body, name):
+        return 200, await self.blocking(self.product_json, unquote(name))
+
+    # ------------------ Carts ------------------
+    def cart(self, cart_id):
+        cart = self.carts.get(cart_id)
+        if cart is None:
+            raise HttpError(404, "Not Found", f"No open cart {cart_id}.")
+        cart.touched = time.monotonic()
+        return cart
+
+    async def expire_carts(self, now=None):
+        """Discards the carts nobody has used for CART_IDLE_MINUTES; returns their IDs."""
+        cutoff = (now or time.monotonic()) - CART_IDLE_MINUTES * 60
+        expired = []
+        for cart_id, cart in list(self.carts.items()):
+            if cart.touched > cutoff:
+                continue
+            async with cart.lock:
+                # Used or closed while waiting for the lock
+                if self.carts.get(cart_id) is not cart or cart.touched > cutoff:
+                    continue
+                await self.blocking(cart.lane.clear)
+                self.carts.pop(cart_id, None)
+                expired.append(cart_id)
+        return expired
+
+    async def sweep_carts(self):
+        while True:
+            await asyncio.sleep(SWEEP_SECONDS)
+            await self.expire_carts()
+
+    def release_carts(self):
+        """Gives the stock of every open cart back; used when the server stops."""
+        for cart_id, cart in list(self.carts.items()):
+            cart.lane.release_all()
+            self.carts.pop(cart_id, None)
+
+    def still_open(self, cart_id, cart):
+        # A request queued behind a checkout or discard must not reuse the lane
+        if self.carts.get(cart_id) is not cart:
+            raise HttpError(404, "Not Found", f"No open cart {cart_id}.")
+
+    def cart_json(self, cart_id, lane):
+        return {
+            "cart_id": cart_id,
+            "items": [{"product": product, "qty": qty, "price": price, "total": total}
+                      for product, qty, price, total in lane.bill_items],
+            "total": lane.total,
+        }
+
+    async def open_cart(self, query, body):
+        cart_id = secrets.token_hex(8)
+        self.carts[cart_id] = Cart(billing.Lane(self.profile, self.terminal))
+        return 201, {"cart_id": cart_id}
+
+    async def get_cart(self, query, body, cart_id):
+        return 200, self.cart_json(cart_id, self.cart(cart_id).lane)
+
+    async def discard_cart(self, query, body, cart_id):
+        cart = self.cart(cart_id)
+        async with cart.lock:
+            self.still_open(cart_id, cart)
+            cart.lane.clear()
+            self.carts.pop(cart_id, None)
+        return 204, None
+
+    async def add_item(self, query, body, cart_id):
+        cart = self.cart(cart_id)
+        product = body.get("product")
+        qty = body.get("qty", 1)
+        if not isinstance(product, str) or not isinstance(qty, int):
+            raise HttpError(400, "Bad Request", "Send {\"product\": name, \"qty\": whole number}.")
+        async with cart.lock:
+            self.still_open(cart_id, cart)
+            await self.blocking(cart.lane.add_item, product, qty)
+            return 200, self.cart_json(cart_id, cart.lane)
+
+    async def checkout(self, query, body, cart_id):
+        cart = self.cart(cart_id)
+        async with cart.lock:
+            self.still_open(cart_id, cart)
+            record = await self.blocking(cart.lane.checkout)
+            self.carts.pop(cart_id, None)
+        return 201, record
+
+    # ------------------ Bills ------------------
+    def check_bill_id(self, bill_id):
+        try:
+            bill_records.day_of(bill_id)
+        except ValueError as e:
+            raise HttpError(404, "Not Found", str(e))
+
+    async def get_bill(self, query, body, bill_id):
+        self.check_bill_id(bill_id)
+        record = await self.blocking(bill_records.get_record, bill_id)
+        if record is None:
+            raise HttpError(404, "Not Found", f"No bill {bill_id}.")
+        return 200, record
+
+    def stored_receipt(self, bill_id):
+        """Returns (PDF bytes or None, record) without rendering anything."""
+        data = self.receipts.cached(bill_id)
+        if data is not None:
+            return data, None
+        filename = receipt.bill_filename(bill_id)
+        if bill_archive.has_bill(filename):
+            return bill_archive.read_bill(filename), None
+        return None, bill_records.get_record(bill_id)
+
+    async def get_receipt(self, query, body, bill_id):
+        self.check_bill_id(bill_id)
+        data, record = await self.blocking(self.stored_receipt, bill_id)
+        if data is None:
+            if record is None:
+                raise HttpError(404, "Not Found", f"No bill {bill_id}.")
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(self.render_workers, receipt.render_receipt, record, self.profile["layout"])
+            await self.blocking(self.receipts.put, bill_id, data)
+        return 200, data
+
+    # ------------------ HTTP ------------------
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip("/") or "/"
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if not match:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            if method == "POST":
+                try:
+                    body = json.loads(body or b"{}")
+                except ValueError:
+                    raise HttpError(400, "Bad Request", "The request body is not valid JSON.")
+                if not isinstance(body, dict):
+                    raise HttpError(400, "Bad Request", "The request body must be a JSON object.")
+            return await handler(query, body, **match.groupdict())
+        if allowed:
+            raise HttpError(405, "Method Not Allowed", f"{method} is not allowed on {path}.")
+        raise HttpError(404, "Not Found", f"No such endpoint: {path}.")
+
+    async def respond(self, method, target, body):
+        """Returns (status, content type, payload bytes) for one request."""
+        try:
+            status, result = await self.dispatch(method, target, body)
+        except HttpError as e:
+            status, result = e.status, {"error": e.title, "message": str(e)}
+        except billing.BillingError as e:
+            status, result = 409, {"error": e.title, "message": str(e)}
+        except Exception as e:
+            status, result = 500, {"error": "Server Error", "message": str(e)}
+        if isinstance(result, bytes):
+            return status, "application/pdf", result
+        if result is None:
+            return status, None, b""
+        return status, "application/json", json.dumps(result, ensure_ascii=False).encode("utf-8")
+
+    async def handle_connection(self, reader, writer):
+        """Serves requests on one keep-alive connection until it closes or idles out."""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ")
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    status, content_type, payload = 413, "application/json", b'{"error": "Payload Too Large"}'
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, content_type, payload = await self.respond(method, target, body)
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+
+                response = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                            f"Content-Length: {len(payload)}",
+                            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                if content_type:
+                    response.append(f"Content-Type: {content_type}")
+                if content_type == "application/pdf":
+                    response.append(f'Content-Disposition: inline; filename="{receipt.bill_filename(target.split("/")[2])}"')
+                writer.write(("\r\n".join(response) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        if self.note_catalog_change in self.catalog.listeners:
+            self.catalog.listeners.remove(self.note_catalog_change)
+        self.render_workers.shutdown(cancel_futures=True)
+        self.billing_pool.shutdown()
+
+
+async def serve(profile, host="127.0.0.1", port=8080, terminal=9, render_workers=2):
+    """Runs the API until cancelled."""
+    api = PosApi(profile, terminal, render_workers=render_workers)
+    server = await asyncio.start_server(api.handle_connection, host, port, backlog=1024)
+    print(f"Serving {profile['name']} on http://{host}:{port}/ "
+          f"(bills numbered {profile['numbering']['prefix']}{terminal}-...)")
+    sweeper = asyncio.create_task(api.sweep_carts())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        sweeper.cancel()
+        api.release_carts()
+        api.catalog.save()
+        api.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP/JSON billing API for POS clients.")
+    parser.add_argument("profile", help="store profile from store_profiles.json")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--terminal", type=int, default=9, help="terminal number used for API bills")
+    parser.add_argument("--render-workers", type=int, default=max((os.cpu_count() or 2) // 2, 1),
+                        help="processes rendering receipts")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(store_profiles.get_profile(args.profile), args.host, args.port,
+                          args.terminal, args.render_workers))
+    except KeyboardInterrupt:
+        pass
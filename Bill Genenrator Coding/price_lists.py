@@ -0,0 +1,186 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+# ------------------ Price Lists ------------------
+# Scheduled prices on top of the catalog's own "price" (the base price). A
+# price list file holds named versions, each with an effective period and the
+# prices it sets:
+#
+#   {"lists": [
+#       {"version": "diwali-2025", "from": "2025-10-18T00:00", "to": "2025-10-25T00:00",
+#        "prices": {"Oil": 220, "Masala Items": 180}},
+#       {"version": "2026-rates", "from": "2026-01-01T00:00", "prices": {"Oil": 255}}
+#   ]}
+#
+# "to" is optional (open-ended). Where periods overlap, the list that started
+# last wins, and the later one in the file on a tie. Loading compiles this into
+# one sorted array of change times per product, so the price at any instant is
+# a bisect over that product's few entries.
+#
+# Each compiled file gets a revision (a hash of its contents) and a copy is kept
+# in price_lists_history/, so the revision pinned in a bill record always says
+# exactly which prices were in force.
+history_dir = "price_lists_history"
+BASE = "base"
+# How often, in seconds, a price book looks for edits to its file
+CHECK_INTERVAL = 2.0
+
+_books = {}
+_registry_lock = threading.Lock()
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+class CompiledPrices:
+    """One revision of a price list file, compiled for lookups."""
+
+    def __init__(self, raw, revision):
+        self.revision = revision
+        # product -> ([change times], [(price, version) or None for the base price])
+        self.table = {}
+        spans = {}
+        lists = raw.get("lists", []) if isinstance(raw, dict) else None
+        if not isinstance(lists, list):
+            raise ValueError("A price list file must hold {\"lists\": [...]}.")
+        for order, price_list in enumerate(lists):
+            version = price_list["version"]
+            start = parse_time(price_list.get("from")) or float("-inf")
+            end = parse_time(price_list.get("to")) or float("inf")
+            if end <= start:
+                raise ValueError(f"Price list {version} ends before it starts.")
+            for product, price in price_list.get("prices", {}).items():
+                if not isinstance(price, (int, float)) or price <= 0:
+                    raise ValueError(f"Price of {product} in {version} must be a positive number.")
+                spans.setdefault(product, []).append((start, order, end, price, version))
+        for product, product_spans in spans.items():
+            self.table[product] = self.compile_product(product_spans)
+
+    @staticmethod
+    def compile_product(spans):
+        """Flattens overlapping periods into change times and the price in force after each."""
+        bounds = sorted({bound for start, order, end, price, version in spans for bound in (start, end)})
+        times, entries = [], []
+        for i, bound in enumerate(bounds):
+            if bound == float("inf"):
+                break
+            following = bounds[i + 1] if i + 1 < len(bounds) else float("inf")
+            # The winner for [bound, following): the covering span that started last
+            covering = [span for span in spans if span[0] <= bound and following <= span[2]]
+            winner = max(covering) if covering else None
+            entry = (winner[3], winner[4]) if winner else None
+            if entries and entries[-1] == entry:
+                continue
+            times.append(bound)
+            entries.append(entry)
+        return times, entries
+
+    def price(self, product, base_price, when):
+        """Returns (price, version) of a product at a datetime."""
+        compiled = self.table.get(product)
+        if compiled is not None:
+            times, entries = compiled
+            i = bisect_right(times, when.timestamp()) - 1
+            if i >= 0 and entries[i] is not None:
+                return entries[i]
+        return base_price, BASE
+
+
+class PriceBook:
+    """The price lists of one file, recompiled when the file is edited."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.compiled = CompiledPrices({}, BASE)
+        self.mtime = None
+        self.checked = 0.0
+        # Why the file could not be loaded last time, if it could not
+        self.error = None
+        # Base prices only until a bad file is fixed; current() tries it again
+        self.reload()
+
+    def reload(self):
+        try:
+            self.load()
+            self.error = None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.error = e
+
+    def load(self):
+        """Compiles the file if it changed. A missing file means base prices only."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            self.compiled, self.mtime = CompiledPrices({}, BASE), None
+            return self.compiled
+        if mtime == self.mtime:
+            return self.compiled
+        with open(self.path, "rb") as f:
+            data = f.read()
+        revision = hashlib.sha256(data).hexdigest()[:12]
+        compiled = CompiledPrices(json.loads(data), revision)
+        os.makedirs(history_dir, exist_ok=True)
+        kept = os.path.join(history_dir, f"{revision}.json")
+        if not os.path.exists(kept):
+            shutil.copyfile(self.path, kept)
+        self.compiled, self.mtime = compiled, mtime
+        return compiled
+
+    def current(self):
+        """Returns the compiled prices in force now, reloading edits every few seconds."""
+        now = time.monotonic()
+        if now - self.checked >= CHECK_INTERVAL:
+            with self.lock:
+                if now - self.checked >= CHECK_INTERVAL:
+                    self.checked = now
+                    # Keeps the last good revision while a file is half edited
+                    self.reload()
+        return self.compiled
+
+
+def load_revision(revision):
+    """Returns the compiled prices of a revision pinned in a bill record."""
+    if revision == BASE:
+        return CompiledPrices({}, BASE)
+    with open(os.path.join(history_dir, f"{revision}.json"), "r", encoding="utf-8") as f:
+        return CompiledPrices(json.load(f), revision)
+
+
+def get_price_book(path):
+    """Returns the price book shared by every lane using a price list file."""
+    key = os.path.abspath(path)
+    with _registry_lock:
+        book = _books.get(key)
+        if book is None:
+            book = _books[key] = PriceBook(path)
+        return book
+
+
+if __name__ == "__main__":
+    import catalog
+
+    parser = argparse.ArgumentParser(description="Show the prices in force at a given time.")
+    parser.add_argument("price_lists", help="price list file, e.g. price_lists.json")
+    parser.add_argument("catalog", help="catalog file with the base prices, e.g. stock.json")
+    parser.add_argument("--at", help="date and time, e.g. 2025-10-20T10:00 (default: now)")
+    args = parser.parse_args()
+
+    at = datetime.fromisoformat(args.at) if args.at else datetime.now()
+    book = PriceBook(args.price_lists)
+    if book.error:
+        parser.exit(1, f"{args.price_lists}: {book.error}\n")
+    prices = book.compiled
+    shop_catalog = catalog.get_catalog(args.catalog)
+    print(f"Prices at {at:%d-%m-%Y %H:%M} (revision {prices.revision}):")
+    for name in shop_catalog.products:
+        effective, version = prices.price(name, shop_catalog.price(name), at)
+        print(f"  {name:25} ₹{effective:<10} {version}")
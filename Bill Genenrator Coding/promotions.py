@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# ------------------ Promotions ------------------
+# Offers kept in a promotions file, applied at checkout:
+#
+#   {"rules": [
+#       {"id": "oil-3for2", "type": "buy_get", "product": "Oil", "buy": 2, "free": 1},
+#       {"id": "breakfast", "type": "combo", "products": {"Idli Batter": 2, "Masala Items": 1}, "price": 250},
+#       {"id": "big-basket", "type": "bill_percent", "percent": 5, "min_total": 2000,
+#        "from": "2025-10-18T00:00", "to": "2025-10-25T00:00", "label": "Diwali 5% off"}
+#   ]}
+#
+# buy_get    every buy + free units of a product, the free ones cost nothing
+# combo      every complete set of the products costs the combo price
+# bill_percent  percent off the bill (after the item offers) from min_total up;
+#               only the best one applies
+#
+# Item offers apply in file order and a unit counts towards one offer only.
+# The rules in force are compiled into an index from product to the offers
+# that mention it, so a cart is priced by looking at its own lines, not by
+# trying every rule on it.
+CHECK_INTERVAL = 2.0
+RULE_TYPES = ("buy_get", "combo", "bill_percent")
+
+_books = {}
+_registry_lock = threading.Lock()
+
+
+def money(amount):
+    amount = round(amount, 2)
+    return int(amount) if float(amount).is_integer() else amount
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def rule_label(rule):
+    if rule.get("label"):
+        return rule["label"]
+    if rule["type"] == "buy_get":
+        return f"{rule['product']}: buy {rule['buy']} get {rule['free']} free"
+    if rule["type"] == "combo":
+        return "Combo: " + " + ".join(rule["products"])
+    return f"{rule['percent']}% off the bill"
+
+
+def positive(value, whole=False):
+    """True for a number above zero (a whole one if asked); bools and strings are not numbers."""
+    kinds = int if whole else (int, float)
+    return isinstance(value, kinds) and not isinstance(value, bool) and value > 0
+
+
+def check_rule(rule):
+    """Raises ValueError if a rule is malformed."""
+    if not isinstance(rule, dict):
+        raise ValueError("Every promotion must be an object with an id and a type.")
+    rule_id = rule.get("id")
+    if not rule_id:
+        raise ValueError("Every promotion needs an id.")
+    kind = rule.get("type")
+    if kind not in RULE_TYPES:
+        raise ValueError(f"Promotion {rule_id} has unknown type {kind}. Use one of {', '.join(RULE_TYPES)}.")
+    if kind == "buy_get" and not (isinstance(rule.get("product"), str) and rule["product"]
+                                  and positive(rule.get("buy"), True) and positive(rule.get("free"), True)):
+        raise ValueError(f"Promotion {rule_id} needs a product and positive buy and free counts.")
+    if kind == "combo" and not (isinstance(rule.get("products"), dict) and rule["products"]
+                                and positive(rule.get("price"))
+                                and all(positive(qty, True) for qty in rule["products"].values())):
+        raise ValueError(f"Promotion {rule_id} needs products with quantities and a positive price.")
+    if kind == "bill_percent" and not (positive(rule.get("percent")) and rule["percent"] <= 100
+                                       and (rule.get("min_total", 0) == 0 or positive(rule["min_total"]))):
+        raise ValueError(f"Promotion {rule_id} needs a percent between 0 and 100.")
+    for bound in ("from", "to"):
+        try:
+            parse_time(rule.get(bound))
+        except (TypeError, ValueError):
+            raise ValueError(f"Promotion {rule_id} has a bad \"{bound}\" time {rule[bound]!r}; "
+                             f"use a date and time like 2025-10-18T00:00.")
+
+
+class CompiledPromotions:
+    """The offers in force at one time, indexed by product."""
+
+    def __init__(self, rules, now):
+        self.by_product = {}
+        self.bill_rules = []
+        # The compiled set is good until the next rule starts or ends
+        self.valid_until = None
+        self.valid_from = None
+        for order, rule in enumerate(rules):
+            start, end = parse_time(rule.get("from")), parse_time(rule.get("to"))
+            for bound in (start, end):
+                if bound is not None and bound > now and (self.valid_until is None or bound < self.valid_until):
+                    self.valid_until = bound
+                if bound is not None and bound <= now and (self.valid_from is None or bound > self.valid_from):
+                    self.valid_from = bound
+            if (start and now < start) or (end and now >= end):
+                continue
+            entry = (order, rule)
+            if rule["type"] == "bill_percent":
+                self.bill_rules.append(entry)
+            elif rule["type"] == "combo":
+                for product in rule["products"]:
+                    self.by_product.setdefault(product, []).append(entry)
+            else:
+                self.by_product.setdefault(rule["product"], []).append(entry)
+
+    def is_current(self, now):
+        return (self.valid_until is None or now < self.valid_until) and \
+               (self.valid_from is None or now >= self.valid_from)
+
+    def evaluate(self, items):
+        """Returns the discounts on bill items as [rule id, label, amount] lists."""
+        remaining = {}
+        unit_price = {}
+        subtotal = 0
+        for product, qty, price, item_total in items:
+            remaining[product] = remaining.get(product, 0) + qty
+            # Free units are valued at the lowest price the product was rung up at
+            unit_price[product] = min(price, unit_price.get(product, price))
+            subtotal += item_total
+
+        candidates = {}
+        for product in remaining:
+            for order, rule in self.by_product.get(product, ()):
+                candidates[order] = rule
+
+        discounts = []
+        for order in sorted(candidates):
+            rule = candidates[order]
+            amount = 0
+            if rule["type"] == "buy_get":
+                product = rule["product"]
+                groups = remaining[product] // (rule["buy"] + rule["free"])
+                if groups:
+                    remaining[product] -= groups * (rule["buy"] + rule["free"])
+                    amount = groups * rule["free"] * unit_price[product]
+            else:
+                wanted = rule["products"]
+                sets = min(remaining.get(product, 0) // qty for product, qty in wanted.items())
+                regular = sum(unit_price[product] * qty for product, qty in wanted.items()) if sets else 0
+                if sets and regular > rule["price"]:
+                    for product, qty in wanted.items():
+                        remaining[product] -= sets * qty
+                    amount = sets * (regular - rule["price"])
+            if amount > 0:
+                discounts.append([rule["id"], rule_label(rule), money(amount)])
+
+        after_items = subtotal - sum(discount[2] for discount in discounts)
+        best = None
+        for order, rule in self.bill_rules:
+            if after_items >= rule.get("min_total", 0) and (best is None or rule["percent"] > best["percent"]):
+                best = rule
+        if best is not None:
+            discounts.append([best["id"], rule_label(best), money(after_items * best["percent"] / 100)])
+        return discounts
+
+
+class Promotions:
+    """The promotions file of a store, recompiled when edited or when an offer starts or ends."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.rules = []
+        self.mtime = None
+        self.checked = 0.0
+        # Why the file could not be loaded last time, if it could not
+        self.error = None
+        self.compiled = CompiledPromotions([], datetime.now())
+        # No offers until a bad file is fixed; current() tries it again
+        self.reload()
+
+    def reload(self):
+        try:
+            self.load()
+            self.error = None
+        except (OSError, ValueError, TypeError) as e:
+            self.error = e
+
+    def load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            if self.mtime is not None:
+                self.rules, self.mtime = [], None
+                self.compiled = CompiledPromotions([], datetime.now())
+            return
+        if mtime == self.mtime:
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            rules = json.load(f).get("rules", [])
+        if not isinstance(rules, list):
+            raise ValueError("\"rules\" must be a list of promotions.")
+        for rule in rules:
+            check_rule(rule)
+        # Compiled before anything is replaced, so a bad file leaves the last good rules
+        compiled = CompiledPromotions(rules, datetime.now())
+        self.rules, self.mtime, self.compiled = rules, mtime, compiled
+
+    def current(self, now=None):
+        """Returns the offers in force at now (default: the current time)."""
+        now = now or datetime.now()
+        with self.lock:
+            tick = time.monotonic()
+            if tick - self.checked >= CHECK_INTERVAL:
+                self.checked = tick
+                # Keeps the last good rules while a file is half edited
+                self.reload()
+            if not self.compiled.is_current(now):
+                self.compiled = CompiledPromotions(self.rules, now)
+            return self.compiled
+
+
+def get_promotions(path):
+    """Returns the promotions shared by every lane using a promotions file."""
+    key = os.path.abspath(path)
+    with _registry_lock:
+        book = _books.get(key)
+        if book is None:
+            book = _books[key] = Promotions(path)
+        return book
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a promotions file and try it on a cart.")
+    parser.add_argument("promotions", help="promotions file, e.g. promotions.json")
+    parser.add_argument("items", nargs="*", help="cart lines as product=qty@price, e.g. Oil=3@240")
+    parser.add_argument("--at", help="date and time, e.g. 2025-10-20T10:00 (default: now)")
+    args = parser.parse_args()
+
+    book = Promotions(args.promotions)
+    if book.error:
+        parser.exit(1, f"{args.promotions}: {book.error}\n")
+    offers = book.current(datetime.fromisoformat(args.at) if args.at else None)
+    cart = []
+    for line in args.items:
+        name, _, rest = line.rpartition("=")
+        qty, _, unit = rest.partition("@")
+        cart.append((name, int(qty), float(unit), int(qty) * float(unit)))
+    item_offers = {order for rules in offers.by_product.values() for order, rule in rules}
+    print(f"{len(item_offers)} item offers and "
+          f"{len(offers.bill_rules)} bill offers in force.")
+    for rule_id, label, amount in offers.evaluate(cart):
+        print(f"  {label:40} -₹{amount}")
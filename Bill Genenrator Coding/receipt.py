@@ -0,0 +1,198 @@
+import copy
+import threading
+from datetime import datetime
+from fpdf import FPDF
+
+try:
+    from fontTools import ttLib
+    from fpdf.fonts import SubsetMap
+except ImportError:
+    SubsetMap = None
+
+# ------------------ Receipt Layouts ------------------
+# Each layout turns a bill record (see bill_records.py) into a description of
+# the page: its size, margins and frame, and rows of cells with their font,
+# text and alignment. render_layout draws that as PDF, and receipt_preview.py
+# draws the very same description as a picture.
+fonts = [
+    ("DejaVuSans", "", "DejaVuSans.ttf"),
+    ("DejaVuSans", "B", "DejaVuSans-Bold.ttf"),
+]
+
+# Parsed fonts shared by every receipt rendered in this process
+_font_cache = {}
+_font_lock = threading.Lock()
+
+
+def _font_templates():
+    """Parses the receipt fonts once and returns them by font key."""
+    with _font_lock:
+        if not _font_cache:
+            pdf = FPDF()
+            for family, style, fname in fonts:
+                pdf.add_font(family, style, fname)
+            _font_cache.update(pdf.fonts)
+        return _font_cache
+
+
+def load_fonts(pdf):
+    """Registers the DejaVu fonts so the Rupee symbol (₹) renders correctly."""
+    if SubsetMap is None:
+        for family, style, fname in fonts:
+            pdf.add_font(family, style, fname)
+        return
+    for key, template in _font_templates().items():
+        # The metrics are shared; the glyph subset and the fontTools object are
+        # per document because subsetting rewrites the font in place.
+        font = copy.copy(template)
+        font.i = len(pdf.fonts) + 1
+        font.ttfont = ttLib.TTFont(template.ttffile, recalcTimestamp=False, lazy=True)
+        font.subset = SubsetMap(font)
+        font.biggest_size_pt = 0
+        pdf.fonts[key] = font
+
+
+def row(x, size_pt, *cells, bold=False, gap=0):
+    """A line of cells starting at x, each (width, height, text[, align[, border]]) in mm."""
+    return {"x": x, "size": size_pt, "bold": bold, "gap": gap,
+            "cells": [tuple(cell) + ('L', 0)[len(cell) - 3:] for cell in cells]}
+
+
+def a4_layout(record):
+    """Full A4 page receipt."""
+    printed = datetime.fromisoformat(record["date"]).strftime("%d-%m-%Y %H:%M:%S")
+    rows = [row(10, 12, (200, 10, record["store"], 'C')),
+            row(10, 12, (200, 10, "-------------------------------------", 'C'))]
+    for product, qty, price, item_total in record["items"]:
+        rows.append(row(10, 12, (200, 10, f"{product:15} {qty} x ₹{price} = ₹{item_total}")))
+    rows.append(row(10, 12, (200, 10, "-------------------------------------")))
+    if record.get("discounts"):
+        rows.append(row(10, 12, (200, 10, f"Subtotal: ₹{record['subtotal']}")))
+        for rule_id, label, amount in record["discounts"]:
+            rows.append(row(10, 12, (200, 10, f"{label}: -₹{amount}")))
+    rows.append(row(10, 14, (200, 10, f"Grand Total: ₹{record['total']}"), bold=True))
+    rows.append(row(10, 10, (200, 10, f"Date: {printed}")))
+    return {"page": (210, 297), "margins": (10, 20), "frame": None, "rows": rows}
+
+
+def slip_layout(record):
+    """Small bordered receipt, about a third of an A4 page (70mm x 99mm) per page."""
+    printed = datetime.fromisoformat(record["date"]).strftime("%d-%m-%Y %H:%M:%S")
+    page_width = 70
+    page_height = 99
+    width = page_width - 10
+
+    rows = [
+        # Heading
+        row(5, 8, (width, 5, record["store"], 'C'), bold=True),
+        row(5, 7, (width, 5, f"Bill ID: {record['bill_id']}", 'C')),
+        row(5, 7, (width, 5, "-"*30, 'C')),
+        # Table headers
+        row(5, 6, (20, 4, "Item", 'C', 1), (8, 4, "Qty", 'C', 1), (14, 4, "Price", 'C', 1),
+            (18, 4, "Total", 'C', 1), bold=True, gap=2),
+    ]
+    for product, qty, price, item_total in record["items"]:
+        rows.append(row(5, 6, (20, 4, product, 'L', 1), (8, 4, str(qty), 'C', 1),
+                        (14, 4, f"₹{price}", 'C', 1), (18, 4, f"₹{item_total}", 'C', 1)))
+    rows.append(row(5, 6, (width, 5, "-"*30, 'C'), gap=3))
+    if record.get("discounts"):
+        rows.append(row(5, 6, (width, 4, f"Subtotal: ₹{record['subtotal']}", 'R')))
+        for rule_id, label, amount in record["discounts"]:
+            rows.append(row(5, 6, (width, 4, f"{label}: -₹{amount}", 'R')))
+    rows.append(row(5, 8, (width, 5, f"Grand Total: ₹{record['total']}", 'R'), bold=True))
+    rows.append(row(5, 6, (width, 5, f"Date: {printed}", 'R')))
+    # Border around the bill on every page
+    return {"page": (page_width, page_height), "margins": (5, 5),
+            "frame": (5, 5, width, page_height - 10, 0.5), "rows": rows}
+
+
+def place(layout):
+    """Yields (page, x, y, row, cell) for every cell of a layout, pages numbered from 0.
+
+    Rows go down the page and move to the top of the next page when they would
+    cross the bottom margin. The PDF and the preview (receipt_preview.py) are
+    both drawn from these positions.
+    """
+    top, bottom = layout["margins"]
+    page, y = 0, top
+    for line in layout["rows"]:
+        y += line["gap"]
+        height = max(cell[1] for cell in line["cells"])
+        if y + height > layout["page"][1] - bottom and y > top:
+            page, y = page + 1, top
+        x = line["x"]
+        for cell in line["cells"]:
+            yield page, x, y, line, cell
+            x += cell[0]
+        y += height
+
+
+def render_layout(layout):
+    """Draws a layout (see a4_layout) as PDF bytes."""
+    pdf = FPDF(format=layout["page"])
+    pdf.set_auto_page_break(False)
+    pages = 0
+    for page, x, y, line, (width, height, text, align, border) in place(layout):
+        while pages <= page:
+            pdf.add_page()
+            if not pages:
+                load_fonts(pdf)
+            if layout["frame"]:
+                left, top, frame_width, frame_height, line_width = layout["frame"]
+                pdf.set_line_width(line_width)
+                pdf.rect(left, top, frame_width, frame_height)
+            pages += 1
+        pdf.set_font("DejaVuSans", 'B' if line["bold"] else '', line["size"])
+        pdf.set_xy(x, y)
+        pdf.cell(width, height, text=text, border=border, align=align)
+    return bytes(pdf.output())
+
+
+layouts = {
+    "a4": a4_layout,
+    "slip": slip_layout,
+}
+
+
+def render_receipt(record, layout="a4"):
+    """Renders a bill record with the named layout and returns the PDF bytes."""
+    return render_layout(layouts[layout](record))
+
+
+def render_credit_note(note, layout="a4"):
+    """Renders a credit note (see returns.py) on the page size of a receipt layout."""
+    printed = datetime.fromisoformat(note["date"]).strftime("%d-%m-%Y %H:%M:%S")
+    lines = [(note["store"], True, 'C'), ("CREDIT NOTE", True, 'C'),
+             (f"No: {note['credit_note']}", False, 'C'), (f"Against bill: {note['bill_id']}", False, 'C'),
+             ("-" * 30, False, 'C')]
+    for product, qty, price, amount in note["items"]:
+        lines.append((f"{product:15} {qty} x ₹{price} = ₹{amount}", False, 'L'))
+    lines += [("-" * 30, False, 'C'), (f"Refund: ₹{note['total']}", True, 'R'), (f"Date: {printed}", False, 'R')]
+
+    if layout == "slip":
+        page_width = 70
+        page_height = max(99, 10 + 5 * len(lines) + 10)
+        pdf = FPDF(format=(page_width, page_height))
+        width, height, size = page_width - 10, 5, 6
+    else:
+        pdf = FPDF()
+        width, height, size = 200, 10, 12
+    pdf.add_page()
+    load_fonts(pdf)
+    if layout == "slip":
+        pdf.set_line_width(0.5)
+        pdf.rect(5, 5, page_width - 10, page_height - 10)
+        pdf.set_xy(5, 5)
+
+    for text, bold, align in lines:
+        pdf.set_font("DejaVuSans", 'B' if bold else '', size + 2 if bold else size)
+        if layout == "slip":
+            pdf.set_x(5)
+        pdf.cell(width, height, text=text, new_x="LMARGIN", new_y="NEXT", align=align)
+
+    return bytes(pdf.output())
+
+
+def bill_filename(bill_id):
+    """Returns the PDF file name used for a bill."""
+    return f"bill_{bill_id}.pdf"
@@ -0,0 +1,131 @@
+import os
+import threading
+from collections import OrderedDict
+
+import bill_archive
+import bill_records
+import receipt
+
+# ------------------ Receipt Cache ------------------
+# Receipts are rendered from their bill record the first time someone asks for
+# them, then kept in two size-bounded LRU tiers: PDF bytes in memory and PDF
+# files on disk. Bills that were archived at checkout are read from the archive.
+# Each layout keeps its files in its own folder, receipt_cache/<layout>/, since
+# every cache counts and evicts everything in its folder.
+cache_root = "receipt_cache"
+
+
+class ReceiptCache:
+    """Renders receipts on demand and keeps the recently used ones."""
+
+    def __init__(self, layout="a4", cache_dir=None,
+                 memory_limit=8 * 1024 * 1024, disk_limit=256 * 1024 * 1024):
+        self.layout = layout
+        self.cache_dir = cache_dir = cache_dir or os.path.join(cache_root, layout)
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.disk = OrderedDict()
+        self.disk_size = 0
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # Rebuild the disk LRU order from file access times.
+        entries = []
+        for filename in os.listdir(cache_dir):
+            stat = os.stat(os.path.join(cache_dir, filename))
+            entries.append((stat.st_mtime, filename, stat.st_size))
+        for _, filename, size in sorted(entries):
+            self.disk[filename] = size
+            self.disk_size += size
+
+    def render(self, bill_id):
+        """Builds the PDF for a bill from the archive or from its record."""
+        filename = receipt.bill_filename(bill_id)
+        if bill_archive.has_bill(filename):
+            return bill_archive.read_bill(filename)
+        record = bill_records.get_record(bill_id)
+        if record is None:
+            raise KeyError(f"No record found for bill {bill_id}.")
+        return receipt.render_receipt(record, self.layout)
+
+    def _remember(self, filename, data):
+        old = self.memory.get(filename)
+        if old is not None:
+            self.memory_size -= len(old)
+        self.memory[filename] = data
+        self.memory.move_to_end(filename)
+        self.memory_size += len(data)
+        while self.memory_size > self.memory_limit and len(self.memory) > 1:
+            _, old = self.memory.popitem(last=False)
+            self.memory_size -= len(old)
+
+    def _store(self, filename, data):
+        path = os.path.join(self.cache_dir, filename)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.disk_size -= self.disk.get(filename, 0)
+        self.disk[filename] = len(data)
+        self.disk_size += len(data)
+        while self.disk_size > self.disk_limit and len(self.disk) > 1:
+            old, size = self.disk.popitem(last=False)
+            self.disk_size -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, old))
+            except FileNotFoundError:
+                pass
+
+    def cached(self, bill_id):
+        """Returns the PDF bytes of a bill if either tier has them, else None."""
+        filename = receipt.bill_filename(bill_id)
+        with self.lock:
+            data = self.memory.get(filename)
+            if data is not None:
+                self.memory.move_to_end(filename)
+                return data
+            if filename in self.disk:
+                path = os.path.join(self.cache_dir, filename)
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    os.utime(path)
+                    self.disk.move_to_end(filename)
+                    self._remember(filename, data)
+                    return data
+                except FileNotFoundError:
+                    self.disk_size -= self.disk.pop(filename)
+        return None
+
+    def put(self, bill_id, data):
+        """Keeps a PDF rendered elsewhere (e.g. in a worker process) in both tiers."""
+        filename = receipt.bill_filename(bill_id)
+        with self.lock:
+            self._remember(filename, data)
+            if filename not in self.disk:
+                self._store(filename, data)
+
+    def get(self, bill_id):
+        """Returns the PDF bytes of a bill, rendering it if needed."""
+        data = self.cached(bill_id)
+        if data is None:
+            data = self.render(bill_id)
+            self.put(bill_id, data)
+        return data
+
+    def path(self, bill_id):
+        """Returns a file path to the bill's PDF, for viewers and printing."""
+        filename = receipt.bill_filename(bill_id)
+        with self.lock:
+            if filename in self.disk and os.path.exists(os.path.join(self.cache_dir, filename)):
+                os.utime(os.path.join(self.cache_dir, filename))
+                self.disk.move_to_end(filename)
+                return os.path.join(self.cache_dir, filename)
+        self.get(bill_id)
+        return os.path.join(self.cache_dir, filename)
+
+    def export(self, bill_id, dest_dir):
+        """Copies the bill's PDF into another folder and returns its path."""
+        path = os.path.join(dest_dir, receipt.bill_filename(bill_id))
+        with open(path, "wb") as f:
+            f.write(self.get(bill_id))
+        return path
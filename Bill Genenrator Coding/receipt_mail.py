@@ -0,0 +1,442 @@
+import argparse
+import heapq
+import json
+import os
+import re
+import smtplib
+import socketserver
+import threading
+import time
+from datetime import datetime
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+import billing
+import bill_records
+import file_lock
+import receipt
+
+# ------------------ E-mailed Receipts ------------------
+# Receipts e-mailed to customers go through an outbox per store. Queuing a
+# receipt only writes a line to mail/outbox_<store>.jsonl; a background thread
+# collects whatever is waiting and sends it in batches over one SMTP
+# connection, which stays open between batches until it has been idle for a
+# while. Every status change (queued, sent, retry, failed) is appended to the
+# outbox file, so the status of each message survives a restart and anything
+# not yet sent is picked up again. Messages waiting to go are also kept in a
+# heap ordered by when they are due, so the sender finds the next batch, and
+# how long to sleep, without looking through the whole history.
+#
+# Only the app sends. The command line queues receipts in the same file, under
+# its file lock (see file_lock.py) and numbered after every message already in
+# it, and the app's sender reads them in as it looks at the file every few
+# seconds.
+#
+# Profile setting "mail", e.g.
+#   {"host": "smtp.example.com", "port": 587, "starttls": true, "user": "...",
+#    "password": "...", "sender": "Vazhga Stores <bills@example.com>"}
+# ("ssl": true for port 465). For trying it out, run a local stand-in server:
+#   python receipt_mail.py stand-in --listen 127.0.0.1:8025
+mail_dir = "mail"
+BATCH_SIZE = 25
+# Seconds to wait for more receipts before sending a batch
+BATCH_WAIT = 2.0
+# Seconds an unused connection is kept open
+IDLE_SECONDS = 60
+# Seconds before each retry; a message fails for good after the last one
+RETRY_DELAYS = (30, 120, 600, 1800)
+# Seconds between looks at the outbox file for receipts queued by other processes
+POLL_SECONDS = 2.0
+
+_outboxes = {}
+_registry_lock = threading.Lock()
+
+
+def check_address(address):
+    address = address.strip()
+    if not re.fullmatch(r"[^@\s]+@[^@\s]+\.[^@\s]+", address):
+        raise ValueError(f"{address or 'That'} is not an e-mail address.")
+    return address
+
+
+# Errors about one message rather than the connection
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError, KeyError)
+
+
+def is_permanent(error):
+    """True if the server refused a message for good (a 5xx reply)."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, message in error.recipients.values())
+    code = getattr(error, "smtp_code", None)
+    return code is not None and code >= 500
+
+
+class Outbox:
+    """The queue of e-mailed receipts of one store, with its sending thread."""
+
+    def __init__(self, profile):
+        self.settings = profile["mail"]
+        self.store = profile["name"]
+        self.receipts = billing.get_receipts(profile["layout"])
+        self.path = os.path.join(mail_dir, f"outbox_{profile['key']}.jsonl")
+        self.cond = threading.Condition()
+        self.messages = {}
+        # (due, message ID) of queued and retrying messages; entries whose
+        # message has since moved on are dropped when they reach the top
+        self.waiting = []
+        self.offset = 0
+        self.connection = None
+        self.last_used = 0.0
+        self.running = False
+        # Bumped on every status change, so screens know to redraw
+        self.version = 0
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    message = json.loads(line)
+                    self.messages[message["id"]] = message
+                    self.offset += len(line)
+        except FileNotFoundError:
+            pass
+        self.waiting = [(message["due"], message["id"]) for message in self.messages.values()
+                        if message["status"] in ("queued", "retry")]
+        heapq.heapify(self.waiting)
+
+    def note(self, message):
+        """Takes in a message's status; call with the condition held."""
+        self.messages[message["id"]] = message
+        if message["status"] in ("queued", "retry"):
+            heapq.heappush(self.waiting, (message["due"], message["id"]))
+        self.version += 1
+
+    def catch_up(self):
+        """Reads the statuses other processes appended since the last look; call with the condition held."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.offset += len(line)
+                self.note(json.loads(line))
+
+    def write(self, message):
+        """Appends a message's status; call with the condition and the file lock held, caught up."""
+        message["time"] = datetime.now().isoformat(timespec="seconds")
+        with open(self.path, "ab") as f:
+            f.write((json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+            self.offset = f.tell()
+        self.note(message)
+
+    def log(self, message):
+        """Saves a message's new status; call with the condition held."""
+        with file_lock.locked(self.path):
+            self.catch_up()
+            self.write(message)
+
+    def send_receipt(self, bill_id, to):
+        """Queues a bill's receipt for a customer and returns the message ID."""
+        to = check_address(to)
+        if bill_records.get_record(bill_id) is None:
+            raise KeyError(f"No record found for bill {bill_id}.")
+        with self.cond, file_lock.locked(self.path):
+            # Numbered after every message in the file, whoever queued it
+            self.catch_up()
+            message = {"id": f"M{len(self.messages) + 1:06d}", "bill_id": bill_id, "to": to,
+                       "status": "queued", "attempts": 0, "due": 0}
+            self.write(message)
+            self.cond.notify()
+        return message["id"]
+
+    def status(self, message_id):
+        with self.cond:
+            self.catch_up()
+            message = self.messages.get(message_id)
+            return dict(message) if message else None
+
+    def counts(self):
+        """Returns how many messages are in each status."""
+        with self.cond:
+            counts = {}
+            for message in self.messages.values():
+                counts[message["status"]] = counts.get(message["status"], 0) + 1
+            return counts
+
+    def next_due(self):
+        """Returns when the next waiting message is due, or None; call with the condition held."""
+        while self.waiting:
+            due, message_id = self.waiting[0]
+            message = self.messages[message_id]
+            if message["status"] in ("queued", "retry") and message["due"] == due:
+                return due
+            heapq.heappop(self.waiting)
+        return None
+
+    def take_due(self, now, limit):
+        """Takes up to limit messages due by now off the heap, oldest first; call with the condition held."""
+        batch = []
+        while len(batch) < limit and self.next_due() is not None and self.waiting[0][0] <= now:
+            batch.append(dict(self.messages[heapq.heappop(self.waiting)[1]]))
+        return batch
+
+    # ------------------ Sending ------------------
+    def start(self):
+        """Starts the sending thread; queued and retrying messages from earlier runs go too."""
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        threading.Thread(target=self.run, name="receipt-mail", daemon=True).start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    # Picks up receipts queued from the command line
+                    self.catch_up()
+                    due = self.next_due()
+                    if due is not None and due <= time.time():
+                        break
+                    waits = [POLL_SECONDS] + ([due - time.time()] if due is not None else [])
+                    if self.connection is not None:
+                        waits.append(self.last_used + IDLE_SECONDS - time.monotonic())
+                    self.cond.wait(max(min(waits), 0.1))
+                    if self.connection is not None and time.monotonic() - self.last_used >= IDLE_SECONDS:
+                        self.disconnect()
+                if not self.running:
+                    self.disconnect()
+                    return
+            # Let a few more receipts join the batch
+            time.sleep(BATCH_WAIT)
+            with self.cond:
+                batch = self.take_due(time.time(), self.settings.get("batch_size", BATCH_SIZE))
+            self.send_batch(batch)
+
+    def connect(self):
+        settings = self.settings
+        if settings.get("ssl"):
+            connection = smtplib.SMTP_SSL(settings["host"], settings.get("port", 465), timeout=30)
+        else:
+            connection = smtplib.SMTP(settings["host"], settings.get("port", 25), timeout=30)
+            if settings.get("starttls"):
+                connection.starttls()
+        if settings.get("user"):
+            connection.login(settings["user"], settings.get("password", ""))
+        return connection
+
+    def disconnect(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except (OSError, smtplib.SMTPException):
+                pass
+            self.connection = None
+
+    def open_connection(self):
+        """Returns the open connection, checking it still works after a pause, or a new one."""
+        if self.connection is not None:
+            if time.monotonic() - self.last_used < BATCH_WAIT * 2:
+                return self.connection
+            try:
+                if self.connection.noop()[0] == 250:
+                    return self.connection
+            except (OSError, smtplib.SMTPException):
+                pass
+            self.disconnect()
+        self.connection = self.connect()
+        return self.connection
+
+    def build(self, message):
+        record = bill_records.get_record(message["bill_id"])
+        email = EmailMessage()
+        email["From"] = self.settings["sender"]
+        email["To"] = message["to"]
+        email["Subject"] = f"Your bill {message['bill_id']} from {self.store}"
+        email["Date"] = formatdate(localtime=True)
+        email["Message-ID"] = make_msgid()
+        printed = datetime.fromisoformat(record["date"]).strftime("%d-%m-%Y %H:%M")
+        email.set_content(f"Thank you for shopping at {self.store}.\n\n"
+                          f"Your bill {record['bill_id']} of {printed} for ₹{record['total']} is attached.\n")
+        email.add_attachment(self.receipts.get(message["bill_id"]), maintype="application", subtype="pdf",
+                             filename=receipt.bill_filename(message["bill_id"]))
+        return email
+
+    def send_batch(self, batch):
+        """Sends a batch over one connection, recording each message's outcome."""
+        for i, message in enumerate(batch):
+            try:
+                email = self.build(message)
+                try:
+                    self.open_connection().send_message(email)
+                except smtplib.SMTPServerDisconnected:
+                    # The server dropped an idle connection; one fresh try
+                    self.connection = None
+                    self.open_connection().send_message(email)
+            except MESSAGE_ERRORS as e:
+                # Only this message is at fault
+                self.settle(message, e)
+            except (OSError, smtplib.SMTPException) as e:
+                # The server is unreachable or refuses us: the rest of the batch waits too
+                self.disconnect()
+                for waiting in batch[i:]:
+                    self.settle(waiting, e)
+                return
+            except Exception as e:
+                # Anything else, e.g. a receipt that cannot be rendered, fails
+                # this message instead of stopping the sending thread
+                self.settle(message, e)
+            else:
+                self.settle(message, None)
+            self.last_used = time.monotonic()
+
+    def settle(self, message, error):
+        with self.cond:
+            message["attempts"] += 1
+            if error is None:
+                message.update(status="sent", due=0)
+                message.pop("error", None)
+            elif is_permanent(error) or not isinstance(error, (OSError, smtplib.SMTPException)) \
+                    or message["attempts"] > len(RETRY_DELAYS):
+                message.update(status="failed", error=str(error))
+            else:
+                message.update(status="retry", error=str(error),
+                               due=time.time() + RETRY_DELAYS[message["attempts"] - 1])
+            self.log(message)
+
+
+def get_outbox(profile):
+    """Returns the running outbox of a store profile with "mail" settings."""
+    with _registry_lock:
+        outbox = _outboxes.get(profile["key"])
+        if outbox is None:
+            outbox = _outboxes[profile["key"]] = Outbox(profile)
+            outbox.start()
+        return outbox
+
+
+# ------------------ Stand-in SMTP Server ------------------
+class StandInHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail and save each message as an .eml file."""
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode("ascii"))
+        self.wfile.flush()
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 stand-in ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb in ("HELO", "EHLO"):
+                self.reply("250 stand-in")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                if self.server.refuse and self.server.refuse in command:
+                    self.reply("550 No such mailbox")
+                else:
+                    recipients.append(command)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = bytearray()
+                for line in iter(self.rfile.readline, b""):
+                    if line in (b".\r\n", b".\n"):
+                        break
+                    data += line[1:] if line.startswith(b"..") else line
+                with self.server.lock:
+                    self.server.received += 1
+                    path = os.path.join(self.server.save_dir, f"{self.server.received:06d}.eml")
+                with open(path, "wb") as f:
+                    f.write(data)
+                self.reply("250 OK")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+def serve_stand_in(host="127.0.0.1", port=8025, save_dir=os.path.join(mail_dir, "stand_in"), refuse=None):
+    """Starts a local stand-in SMTP server in a background thread; returns the server."""
+    os.makedirs(save_dir, exist_ok=True)
+    server = socketserver.ThreadingTCPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    server.save_dir = save_dir
+    server.refuse = refuse
+    server.connections = 0
+    server.received = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name="smtp-stand-in", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import store_profiles
+
+    parser = argparse.ArgumentParser(description="E-mail receipts, check the outbox or run a stand-in SMTP server.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    stand_in_command = commands.add_parser("stand-in", help="run a local SMTP server that saves what it gets")
+    stand_in_command.add_argument("--listen", default="127.0.0.1:8025", help="host:port to listen on")
+    stand_in_command.add_argument("--dir", default=os.path.join(mail_dir, "stand_in"), help="where to save messages")
+    stand_in_command.add_argument("--refuse", help="refuse recipients containing this text, e.g. @bounce")
+    send_command = commands.add_parser("send", help="queue a bill's receipt for the app to send")
+    send_command.add_argument("profile", help="store profile from store_profiles.json")
+    send_command.add_argument("bill_id")
+    send_command.add_argument("to", help="e-mail address")
+    send_command.add_argument("--wait", type=float, default=60, help="seconds to wait for the app to send it")
+    status_command = commands.add_parser("status", help="show the outbox of a store")
+    status_command.add_argument("profile", help="store profile from store_profiles.json")
+    args = parser.parse_args()
+
+    if args.command == "stand-in":
+        listen_host, _, listen_port = args.listen.rpartition(":")
+        stand_in = serve_stand_in(listen_host or "127.0.0.1", int(listen_port), args.dir, args.refuse)
+        print(f"Stand-in SMTP server on {args.listen}, saving to {args.dir}. Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print(f"{stand_in.received} messages over {stand_in.connections} connections.")
+    else:
+        store = store_profiles.get_profile(args.profile)
+        if not store["mail"]:
+            parser.error(f"Store profile {args.profile} has no mail settings.")
+        if args.command == "send":
+            # Queued for the app's sender; this process never sends, so there is one sender per outbox
+            store_outbox = Outbox(store)
+            message_id = store_outbox.send_receipt(args.bill_id, args.to)
+            deadline = time.monotonic() + args.wait
+            while store_outbox.status(message_id)["status"] == "queued" and time.monotonic() < deadline:
+                time.sleep(0.5)
+            outcome = store_outbox.status(message_id)
+            if outcome["status"] == "queued":
+                print(f"{message_id}: queued; the app sends it while it is running.")
+            else:
+                print(f"{message_id}: {outcome['status']} {outcome.get('error', '')}")
+        else:
+            store_outbox = Outbox(store)
+            print(", ".join(f"{count} {status}" for status, count in sorted(store_outbox.counts().items()))
+                  or "The outbox is empty.")
+            for waiting in store_outbox.messages.values():
+                if waiting["status"] in ("retry", "failed"):
+                    print(f"  {waiting['id']} {waiting['bill_id']} to {waiting['to']}: "
+                          f"{waiting['status']} after {waiting['attempts']} tries - {waiting.get('error', '')}")
@@ -0,0 +1,150 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+import billing
+import receipt
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# ------------------ Receipt Preview ------------------
+# Images of receipts for the preview pane of the billing screen. With
+# pypdfium2 installed the receipt PDF itself is rasterized. Without it the
+# layout description the PDF is made from (see receipt.py) is drawn straight
+# onto an image, with the same pages, positions, fonts and sizes, which takes
+# a few milliseconds and needs nothing beyond Pillow (already required by fpdf2).
+#
+# Images are made on the render pool and kept per bill ID in a small LRU, so
+# showing a bill again is instant.
+PREVIEW_WIDTH = 280
+MM_PER_PT = 25.4 / 72
+CELL_MARGIN = 1
+
+
+@lru_cache(maxsize=32)
+def font(size_px, bold=False):
+    return ImageFont.truetype(receipt.fonts[1 if bold else 0][2], size_px)
+
+
+class Sheet:
+    """A page image drawn in millimetres, the way FPDF places cells."""
+
+    def __init__(self, width_mm, height_mm):
+        self.scale = PREVIEW_WIDTH / width_mm
+        self.image = Image.new("RGB", (PREVIEW_WIDTH, round(height_mm * self.scale)), "white")
+        self.draw = ImageDraw.Draw(self.image)
+        self.size_pt = 12
+        self.bold = False
+
+    def px(self, mm):
+        return round(mm * self.scale)
+
+    def set_font(self, size_pt, bold=False):
+        self.size_pt = size_pt
+        self.bold = bold
+
+    def cell(self, x, y, w, h, text, align="L", border=0):
+        face = font(max(self.px(self.size_pt * MM_PER_PT), 1), self.bold)
+        text_width = self.draw.textlength(text, font=face) / self.scale
+        if align == "C":
+            left = x + (w - text_width) / 2
+        elif align == "R":
+            left = x + w - CELL_MARGIN - text_width
+        else:
+            left = x + CELL_MARGIN
+        # FPDF puts the baseline 0.3 font sizes below the middle of the cell
+        baseline = y + h / 2 + 0.3 * self.size_pt * MM_PER_PT
+        self.draw.text((self.px(left), self.px(baseline)), text, font=face, fill="black", anchor="ls")
+        if border:
+            # The border is drawn with the given line width in mm
+            self.rect(x, y, w, h, border)
+
+    def rect(self, x, y, w, h, line_mm):
+        self.draw.rectangle((self.px(x), self.px(y), self.px(x + w), self.px(y + h)),
+                            outline="black", width=max(self.px(line_mm), 1))
+
+
+def draw_layout(layout):
+    """Draws a receipt layout (see receipt.py) with its pages one under the other."""
+    page_width, page_height = layout["page"]
+    cells = list(receipt.place(layout))
+    pages = cells[-1][0] + 1 if cells else 1
+    sheet = Sheet(page_width, page_height * pages)
+    line_mm = layout["frame"][4] if layout["frame"] else 0.2
+    for page in range(pages):
+        if page:
+            sheet.draw.line((0, sheet.px(page * page_height), PREVIEW_WIDTH, sheet.px(page * page_height)),
+                            fill="lightgray")
+        if layout["frame"]:
+            left, top, frame_width, frame_height, frame_line_mm = layout["frame"]
+            sheet.rect(left, page * page_height + top, frame_width, frame_height, frame_line_mm)
+    for page, x, y, line, (width, height, text, align, border) in cells:
+        sheet.set_font(line["size"], line["bold"])
+        sheet.cell(x, page * page_height + y, width, height, text, align, border and line_mm)
+    return sheet.image
+
+
+def preview_image(record, layout="a4"):
+    """Returns a PIL image of a bill's receipt, PREVIEW_WIDTH pixels wide."""
+    if pdfium is None:
+        return draw_layout(receipt.layouts[layout](record))
+    page = pdfium.PdfDocument(receipt.render_receipt(record, layout))[0]
+    return page.render(scale=PREVIEW_WIDTH / page.get_width()).to_pil()
+
+
+class PreviewCache:
+    """Receipt images of recent bills, made on the render pool."""
+
+    def __init__(self, layout, limit=64):
+        self.layout = layout
+        self.limit = limit
+        self.images = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def get(self, bill_id):
+        """Returns the cached image of a bill, or None."""
+        with self.lock:
+            image = self.images.get(bill_id)
+            if image is not None:
+                self.images.move_to_end(bill_id)
+            return image
+
+    def request(self, record):
+        """Starts making a bill's image if needed; returns a future of the image."""
+        bill_id = record["bill_id"]
+        with self.lock:
+            future = self.pending.get(bill_id)
+            if future is None:
+                future = self.pending[bill_id] = billing.render_pool.submit(self.make, record)
+            return future
+
+    def make(self, record):
+        try:
+            image = preview_image(record, self.layout)
+            with self.lock:
+                self.images[record["bill_id"]] = image
+                while len(self.images) > self.limit:
+                    self.images.popitem(last=False)
+            return image
+        finally:
+            # A failed render is tried again on the next request
+            with self.lock:
+                self.pending.pop(record["bill_id"], None)
+
+
+_previews = {}
+
+
+def get_previews(layout):
+    """Returns the preview cache shared by every window using a layout."""
+    cache = _previews.get(layout)
+    if cache is None:
+        cache = _previews[layout] = PreviewCache(layout)
+    return cache
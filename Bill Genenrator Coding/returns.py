@@ -0,0 +1,283 @@
+import argparse
+import json
+import os
+import threading
+from datetime import datetime
+
+import bill_records
+import billing
+import promotions
+import receipt
+
+# ------------------ Returns and Credit Notes ------------------
+# Items brought back are taken off their original bill with a credit note.
+# Credit notes are kept next to the bill records, in a file per day of the
+# ORIGINAL bill, so everything returned against a bill is in one small file
+# found from the bill ID alone (like the bill itself, see bill_records.py):
+#
+#   records/returns_YYYYMMDD.jsonl
+#     {"credit_note", "bill_id", "store", "terminal", "date",
+#      "items": [[product, qty, price, amount], ...], "lines": [...], "total",
+#      "customer"?, "credit"?, "journal_end"}
+#     {"restocked": credit note}   once its items are back in stock
+#
+# "lines" gives the bill line each item comes from, so a line can never be
+# returned more times than it was sold. The refund of a line is its share of
+# what was paid, after offers; for a bill on credit it comes off the
+# customer's balance, otherwise out of the till. Restocking goes through the
+# catalog like any stock update and happens once per credit note: the stock
+# is saved first, then journalled as "return <credit note>", then the note is
+# marked. A note written but not marked, e.g. after a crash, is restocked by
+# finish_restocking unless its journal entry exists, which is only written
+# once the stock is saved (a crash in the moment between the two restocks the
+# note again, rather than losing it). "journal_end" is how long the catalog's
+# journal was when the note was issued, so only what came after is read to
+# look for it.
+credit_notes_dir = "credit_notes"
+
+_lock = threading.Lock()
+# Per day of original bills: {"notes": {bill ID: [credit notes]}, "restocked": set(), "end": offset}
+_index = {}
+
+
+def returns_path(day):
+    """Returns the credit note file for the bills of a day (YYYYMMDD)."""
+    return os.path.join(bill_records.records_dir, f"returns_{day}.jsonl")
+
+
+def _index_day(day):
+    """Returns the index of a day's credit notes, reading what was appended since last time."""
+    index = _index.get(day)
+    if index is None:
+        index = _index[day] = {"notes": {}, "restocked": set(), "end": 0}
+    try:
+        f = open(returns_path(day), "rb")
+    except FileNotFoundError:
+        return index
+    with f:
+        f.seek(index["end"])
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            index["end"] += len(line)
+            entry = json.loads(line)
+            if "restocked" in entry:
+                index["restocked"].add(entry["restocked"])
+            else:
+                index["notes"].setdefault(entry["bill_id"], []).append(entry)
+    return index
+
+
+def _append(day, entry):
+    os.makedirs(bill_records.records_dir, exist_ok=True)
+    with open(returns_path(day), "ab") as f:
+        f.write((json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def credit_notes(bill_id):
+    """Returns the credit notes issued against a bill, oldest first."""
+    with _lock:
+        return list(_index_day(bill_records.day_of(bill_id))["notes"].get(bill_id, []))
+
+
+def iter_credit_notes(start, end):
+    """Yields the credit notes dated within [start, end] dates, a line at a time."""
+    first, last = start.strftime("%Y%m%d"), end.strftime("%Y%m%d")
+    filenames = os.listdir(bill_records.records_dir) if os.path.isdir(bill_records.records_dir) else []
+    for filename in sorted(filenames):
+        if not (filename.startswith("returns_") and filename.endswith(".jsonl")):
+            continue
+        # Notes are filed under the day of their bill, which is never after the note
+        if filename[len("returns_"):-len(".jsonl")] > last:
+            break
+        with open(os.path.join(bill_records.records_dir, filename), "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                if "credit_note" in entry and first <= entry["date"][:10].replace("-", "") <= last:
+                    yield entry
+
+
+def returned_lines(notes):
+    """Adds up {bill line: qty returned} over credit notes."""
+    returned = {}
+    for note in notes:
+        for line, item in zip(note["lines"], note["items"]):
+            returned[line] = returned.get(line, 0) + item[1]
+    return returned
+
+
+def find_bill(bill_id):
+    """Returns (bill record, {line: qty already returned}) or raises BillingError."""
+    try:
+        record = bill_records.get_record(bill_id)
+    except ValueError as e:
+        raise billing.BillingError("No Such Bill", str(e))
+    if record is None:
+        raise billing.BillingError("No Such Bill", f"Bill {bill_id} was not found.")
+    return record, returned_lines(credit_notes(bill_id))
+
+
+def take_return(lane, bill_id, quantities, now=None):
+    """Issues a credit note for {bill line: qty} of a bill and puts the items back in stock.
+
+    Returns the credit note. Refunds of credit bills go to the customer's ledger.
+    """
+    now = now or datetime.now()
+    record = find_bill(bill_id)[0]
+    if record["store"] != lane.profile["name"]:
+        raise billing.BillingError("Other Store", f"Bill {bill_id} was issued by {record['store']}.")
+    share = record["total"] / record["subtotal"] if record.get("subtotal") else 1
+    day = bill_records.day_of(bill_id)
+    with _lock:
+        # Counted again under the lock, in case another lane took items back meanwhile
+        returned = returned_lines(_index_day(day)["notes"].get(bill_id, []))
+        items, lines = [], []
+        for line, qty in sorted(quantities.items()):
+            if not qty:
+                continue
+            if not 0 <= line < len(record["items"]):
+                raise billing.BillingError("No Such Item", f"Bill {bill_id} has no line {line + 1}.")
+            product, sold, price, item_total = record["items"][line]
+            left = sold - returned.get(line, 0)
+            if not isinstance(qty, int) or qty < 0 or qty > left:
+                raise billing.BillingError("Too Many Returned",
+                                           f"Only {left} of {product} can still be returned on bill {bill_id}.")
+            items.append([product, qty, price, promotions.money(item_total * qty / sold * share)])
+            lines.append(line)
+        if not items:
+            raise billing.BillingError("Nothing To Return", "Enter how many of each item are being returned.")
+        note = {
+            "credit_note": billing.next_bill_id(f"CN-{lane.terminal}", now),
+            "bill_id": bill_id,
+            "store": record["store"],
+            "terminal": lane.terminal,
+            "date": now.isoformat(timespec="seconds"),
+            "items": items,
+            "lines": lines,
+            "total": promotions.money(sum(item[3] for item in items)),
+        }
+        if record.get("customer"):
+            note["customer"] = record["customer"]
+            if record.get("credit"):
+                note["credit"] = True
+        note["journal_end"] = journal_size(lane.catalog)
+        _append(day, note)
+        _index_day(day)
+
+    restock(lane.catalog, note, now)
+    if note.get("credit"):
+        lane.customers.post(record["customer"], "return", note["total"], now, bill_id=bill_id,
+                            credit_note=note["credit_note"])
+    lane.shift.record_refund(note)
+    return note
+
+
+def journal_size(shop_catalog):
+    try:
+        return os.path.getsize(shop_catalog.journal_path())
+    except FileNotFoundError:
+        return 0
+
+
+def restock(shop_catalog, note, now=None):
+    """Puts a credit note's items back in stock, once. Returns False if already done."""
+    day = bill_records.day_of(note["bill_id"])
+    with _lock:
+        if note["credit_note"] in _index_day(day)["restocked"]:
+            return False
+        deltas = {}
+        with shop_catalog.lock:
+            for product, qty, price, amount in note["items"]:
+                # A product deleted from the catalog since has no stock to go back to
+                if product in shop_catalog.products:
+                    shop_catalog.give(product, qty)
+                    deltas[product] = deltas.get(product, 0) + qty
+        # Journalled only once saved, so a journal entry means the stock is back
+        shop_catalog.save()
+        shop_catalog.log_adjustments(deltas, f"return {note['credit_note']}", now)
+        _append(day, {"restocked": note["credit_note"]})
+        _index_day(day)
+    return True
+
+
+def finish_restocking(shop_catalog, store):
+    """Restocks a store's credit notes that were issued but never marked restocked.
+
+    Notes whose adjustments are already in the catalog's journal are only marked.
+    Returns the credit notes restocked.
+    """
+    pending = []
+    with _lock:
+        filenames = os.listdir(bill_records.records_dir) if os.path.isdir(bill_records.records_dir) else []
+        for filename in sorted(filenames):
+            if filename.startswith("returns_") and filename.endswith(".jsonl"):
+                index = _index_day(filename[len("returns_"):-len(".jsonl")])
+                pending += [note for notes in index["notes"].values() for note in notes
+                            if note["store"] == store and note["credit_note"] not in index["restocked"]]
+    if not pending:
+        return []
+    journalled = set()
+    try:
+        with open(shop_catalog.journal_path(), "rb") as f:
+            # Their entries can only come after the journal's length when they were issued
+            f.seek(min(note.get("journal_end", 0) for note in pending))
+            for line in f:
+                if line.endswith(b"\n"):
+                    journalled.add(json.loads(line).get("reason"))
+    except FileNotFoundError:
+        pass
+    done = []
+    for note in pending:
+        if f"return {note['credit_note']}" in journalled:
+            day = bill_records.day_of(note["bill_id"])
+            with _lock:
+                _append(day, {"restocked": note["credit_note"]})
+                _index_day(day)
+        elif restock(shop_catalog, note):
+            done.append(note["credit_note"])
+    return done
+
+
+def save_credit_note(note, layout="a4"):
+    """Writes a credit note's PDF to credit_notes/ and returns its path."""
+    os.makedirs(credit_notes_dir, exist_ok=True)
+    path = os.path.join(credit_notes_dir, f"{note['credit_note']}.pdf")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(receipt.render_credit_note(note, layout))
+    os.replace(tmp_path, path)
+    return path
+
+
+if __name__ == "__main__":
+    import store_profiles
+
+    parser = argparse.ArgumentParser(description="Show a bill's returnable items or take items back.")
+    parser.add_argument("profile", help="store profile from store_profiles.json")
+    parser.add_argument("bill_id")
+    parser.add_argument("returns", nargs="*", metavar="LINE=QTY",
+                        help="bill lines (as numbered by showing the bill) and how many are returned")
+    parser.add_argument("--terminal", type=int, default=1, help="terminal number the credit note is issued from")
+    args = parser.parse_args()
+
+    store = store_profiles.get_profile(args.profile)
+    if not args.returns:
+        bill, already = find_bill(args.bill_id)
+        print(f"{bill['bill_id']}  {bill['date']}  ₹{bill['total']}")
+        for number, (name, sold_qty, unit_price, line_total) in enumerate(bill["items"], 1):
+            print(f"  {number:>3}. {name:20} sold {sold_qty:>4}  returned {already.get(number - 1, 0):>4}  ₹{line_total}")
+    else:
+        wanted = {}
+        for spec in args.returns:
+            number, _, count = spec.partition("=")
+            wanted[int(number) - 1] = int(count)
+        try:
+            issued = take_return(billing.Lane(store, args.terminal), args.bill_id, wanted)
+        except billing.BillingError as e:
+            parser.exit(1, f"{e.title}: {e}\n")
+        print(f"Credit note {issued['credit_note']}: refund ₹{issued['total']}.")
+        print(f"Saved to {save_credit_note(issued, store['layout'])}.")
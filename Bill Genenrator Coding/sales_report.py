@@ -0,0 +1,349 @@
+import argparse
+import csv
+import os
+from datetime import datetime
+
+import numpy as np
+
+import bill_records
+import returns
+
+# ------------------ Sales Reports ------------------
+# Bill records are turned into columns (one NumPy array per field) and every
+# report is a vectorized group-by over those columns. The columns of each
+# day's record file are cached next to it in records/columns/ and rebuilt
+# only when the day's file grows, so re-running reports over a year only
+# parses the days that changed.
+#
+# A store's report only takes in the bills numbered with its profile's prefix
+# (as gst_export.py does), so stores sharing a records folder are kept apart.
+# Credit notes (see returns.py) are netted out on the day they were issued:
+# their lines come off the product and hour tables and their totals off the
+# takings of the terminal that took the return. Averages are of the bills as
+# rung up.
+columns_dir = os.path.join(bill_records.records_dir, "columns")
+# Bumped when the cached columns change, so older caches are rebuilt
+COLUMNS_VERSION = 2
+PERIODS = ("daily", "weekly", "monthly")
+
+
+class Sales:
+    """Columnar sales: one row per bill line plus one row per bill."""
+
+    def __init__(self, products, terminals, line_time, line_product, line_qty, line_amount,
+                 bill_time, bill_terminal, bill_total, bill_items, note_time, note_terminal, note_total):
+        self.products = products
+        self.terminals = terminals
+        self.line_time = line_time
+        self.line_product = line_product
+        self.line_qty = line_qty
+        self.line_amount = line_amount
+        self.bill_time = bill_time
+        self.bill_terminal = bill_terminal
+        self.bill_total = bill_total
+        self.bill_items = bill_items
+        self.note_time = note_time
+        self.note_terminal = note_terminal
+        self.note_total = note_total
+
+
+def issued_here(terminal, prefix):
+    """True if a terminal (numbering prefix and number, e.g. NM1) is numbered with a prefix."""
+    return terminal.startswith(prefix) and terminal[len(prefix):].isdigit()
+
+
+def parse_day(path):
+    """Reads one day's record file into column arrays."""
+    products = {}
+    terminals = {}
+    line_time, line_product, line_terminal, line_qty, line_amount = [], [], [], [], []
+    bill_time, bill_terminal, bill_total, bill_items = [], [], [], []
+    for record in bill_records.iter_file(path):
+        when = record["date"]
+        terminal = terminals.setdefault(record.get("terminal", ""), len(terminals))
+        items = 0
+        for product, qty, price, item_total in record["items"]:
+            line_time.append(when)
+            line_product.append(products.setdefault(product, len(products)))
+            line_terminal.append(terminal)
+            line_qty.append(qty)
+            line_amount.append(item_total)
+            items += qty
+        bill_time.append(when)
+        bill_terminal.append(terminal)
+        bill_total.append(record["total"])
+        bill_items.append(items)
+    return {
+        "products": np.array(list(products), dtype=str),
+        "terminals": np.array(list(terminals), dtype=str),
+        "line_time": np.array(line_time, dtype="datetime64[s]"),
+        "line_product": np.array(line_product, dtype=np.int32),
+        "line_terminal": np.array(line_terminal, dtype=np.int32),
+        "line_qty": np.array(line_qty, dtype=np.int64),
+        "line_amount": np.array(line_amount, dtype=np.float64),
+        "bill_time": np.array(bill_time, dtype="datetime64[s]"),
+        "bill_terminal": np.array(bill_terminal, dtype=np.int32),
+        "bill_total": np.array(bill_total, dtype=np.float64),
+        "bill_items": np.array(bill_items, dtype=np.int64),
+    }
+
+
+def parse_notes(start=None, end=None, prefix=None):
+    """Reads the credit notes issued between two dates into columns shaped like parse_day's.
+
+    Lines are negative, since they come off the sales. With a prefix only the
+    notes against that store's bills are read.
+    """
+    products = {}
+    terminals = {}
+    line_time, line_product, line_terminal, line_qty, line_amount = [], [], [], [], []
+    note_time, note_terminal, note_total = [], [], []
+    for note in returns.iter_credit_notes(start or datetime.min, end or datetime.max):
+        if prefix is not None and not issued_here(note["bill_id"].rsplit("-", 2)[0], prefix):
+            continue
+        when = note["date"]
+        terminal = terminals.setdefault(note["terminal"], len(terminals))
+        for product, qty, price, amount in note["items"]:
+            line_time.append(when)
+            line_product.append(products.setdefault(product, len(products)))
+            line_terminal.append(terminal)
+            line_qty.append(-qty)
+            line_amount.append(-amount)
+        note_time.append(when)
+        note_terminal.append(terminal)
+        note_total.append(note["total"])
+    empty = parse_day(os.devnull)
+    return dict(empty,
+                products=np.array(list(products), dtype=str),
+                terminals=np.array(list(terminals), dtype=str),
+                line_time=np.array(line_time, dtype="datetime64[s]"),
+                line_product=np.array(line_product, dtype=np.int32),
+                line_terminal=np.array(line_terminal, dtype=np.int32),
+                line_qty=np.array(line_qty, dtype=np.int64),
+                line_amount=np.array(line_amount, dtype=np.float64),
+                note_time=np.array(note_time, dtype="datetime64[s]"),
+                note_terminal=np.array(note_terminal, dtype=np.int32),
+                note_total=np.array(note_total, dtype=np.float64))
+
+
+def only_issued_here(columns, prefix):
+    """Keeps the lines and bills of a day's columns that were numbered with a prefix."""
+    here = np.array([issued_here(terminal, prefix) for terminal in columns["terminals"]], dtype=bool)
+    line_kept = here[columns["line_terminal"]]
+    bill_kept = here[columns["bill_terminal"]]
+    kept = {key: value[line_kept] if key.startswith("line_") else value[bill_kept] if key.startswith("bill_")
+            else value for key, value in columns.items()}
+    # Drop the other stores' terminals from the table and renumber the rest
+    renumbered = np.cumsum(here, dtype=np.int32) - 1
+    kept["terminals"] = columns["terminals"][here]
+    kept["line_terminal"] = renumbered[kept["line_terminal"]]
+    kept["bill_terminal"] = renumbered[kept["bill_terminal"]]
+    return kept
+
+
+def load_day(day):
+    """Returns the columns of one day, from the cache when it is current."""
+    source = bill_records.record_path(day)
+    size = os.path.getsize(source)
+    cache = os.path.join(columns_dir, f"bills_{day}.npz")
+    if os.path.exists(cache):
+        with np.load(cache) as data:
+            if "version" in data.files and int(data["version"]) == COLUMNS_VERSION \
+                    and int(data["source_size"]) == size:
+                return {key: data[key] for key in data.files if key not in ("source_size", "version")}
+    columns = parse_day(source)
+    os.makedirs(columns_dir, exist_ok=True)
+    tmp_path = cache + ".tmp.npz"
+    np.savez(tmp_path, source_size=size, version=COLUMNS_VERSION, **columns)
+    os.replace(tmp_path, cache)
+    return columns
+
+
+def load_sales(start=None, end=None, prefix=None):
+    """Loads the sales between two dates (inclusive) into one Sales, net of credit notes.
+
+    With a numbering prefix only the bills of that store, and the notes
+    against them, are loaded.
+    """
+    days = [day for day in bill_records.record_days()
+            if (not start or day >= start.strftime("%Y%m%d")) and (not end or day <= end.strftime("%Y%m%d"))]
+    parts = [load_day(day) for day in days]
+    if prefix is not None:
+        parts = [only_issued_here(part, prefix) for part in parts]
+    notes = parse_notes(start, end, prefix)
+    parts.append(notes)
+
+    def joined(key):
+        return np.concatenate([part[key] for part in parts])
+
+    # Map each day's own product and terminal codes onto one shared table.
+    products, product_codes = np.unique(joined("products"), return_inverse=True)
+    terminals, terminal_codes = np.unique(joined("terminals"), return_inverse=True)
+    line_product, bill_terminal = [], []
+    p_offset = t_offset = 0
+    for part in parts:
+        terminal_map = terminal_codes[t_offset:t_offset + len(part["terminals"])]
+        line_product.append(product_codes[p_offset:p_offset + len(part["products"])][part["line_product"]])
+        bill_terminal.append(terminal_map[part["bill_terminal"]])
+        p_offset += len(part["products"])
+        t_offset += len(part["terminals"])
+    # The notes are the last part, so terminal_map is theirs
+    note_terminal = terminal_map[notes["note_terminal"]]
+
+    return Sales(products, terminals,
+                 joined("line_time"), np.concatenate(line_product).astype(np.int64),
+                 joined("line_qty"), joined("line_amount"),
+                 joined("bill_time"), np.concatenate(bill_terminal).astype(np.int64),
+                 joined("bill_total"), joined("bill_items"),
+                 notes["note_time"], note_terminal.astype(np.int64), notes["note_total"])
+
+
+def period_start(times, period):
+    """Returns the first day of the day/week (Monday)/month each time falls in."""
+    days = times.astype("datetime64[D]")
+    if period == "daily":
+        return days
+    if period == "weekly":
+        # Day 0 of the epoch was a Thursday; shift so weeks start on Monday.
+        return days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    if period == "monthly":
+        return times.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Unknown period {period}. Use one of {', '.join(PERIODS)}.")
+
+
+def group_sum(groups, n_groups, keys, n_keys, weights):
+    """Sums weights into a (group, key) table with one bincount."""
+    flat = np.bincount(groups * n_keys + keys, weights=weights, minlength=n_groups * n_keys)
+    return flat.reshape(n_groups, n_keys)
+
+
+class Report:
+    """All tables of a sales report, one row per period."""
+
+    def __init__(self, sales, period, top=5):
+        self.sales = sales
+        self.period = period
+        line_period = period_start(sales.line_time, period)
+        bill_period = period_start(sales.bill_time, period)
+        note_period = period_start(sales.note_time, period)
+        self.periods = np.unique(np.concatenate([bill_period, note_period]))
+        bill_idx = np.searchsorted(self.periods, bill_period)
+        note_idx = np.searchsorted(self.periods, note_period)
+        line_idx = np.searchsorted(self.periods, line_period)
+        n_periods = len(self.periods)
+        n_products = len(sales.products)
+        n_terminals = len(sales.terminals)
+
+        self.product_qty = group_sum(line_idx, n_periods, sales.line_product, n_products, sales.line_qty)
+        self.product_amount = group_sum(line_idx, n_periods, sales.line_product, n_products, sales.line_amount)
+        hours = (sales.line_time - sales.line_time.astype("datetime64[D]")).astype("timedelta64[h]").astype(np.int64)
+        self.hour_amount = group_sum(line_idx, n_periods, hours, 24, sales.line_amount)
+        self.terminal_amount = (group_sum(bill_idx, n_periods, sales.bill_terminal, n_terminals, sales.bill_total)
+                                - group_sum(note_idx, n_periods, sales.note_terminal, n_terminals, sales.note_total))
+        self.terminal_bills = group_sum(bill_idx, n_periods, sales.bill_terminal, n_terminals, None)
+
+        self.bills = np.bincount(bill_idx, minlength=n_periods)
+        billed = np.bincount(bill_idx, weights=sales.bill_total, minlength=n_periods)
+        self.refunds = np.bincount(note_idx, weights=sales.note_total, minlength=n_periods)
+        self.takings = billed - self.refunds
+        items = np.bincount(bill_idx, weights=sales.bill_items, minlength=n_periods)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.average_basket = np.where(self.bills > 0, billed / self.bills, 0)
+            self.average_items = np.where(self.bills > 0, items / self.bills, 0)
+
+        # Top movers: best sellers by quantity, with the change from the period before
+        self.top = min(top, n_products)
+        self.top_products = np.argsort(-self.product_qty, axis=1, kind="stable")[:, :self.top]
+        previous = np.vstack([np.zeros((1, n_products)), self.product_qty[:-1]]) if len(self.periods) else self.product_qty
+        self.qty_change = self.product_qty - previous
+
+    def label(self, i):
+        start = self.periods[i]
+        if self.period == "monthly":
+            return str(start.astype("datetime64[M]"))
+        if self.period == "weekly":
+            return f"week of {start}"
+        return str(start)
+
+    def text(self):
+        """Formats the report for printing."""
+        sales = self.sales
+        lines = []
+        for i in range(len(self.periods)):
+            lines.append(f"===== {self.label(i)} =====")
+            lines.append(f"Bills: {self.bills[i]}   Takings: ₹{self.takings[i]:.2f}   "
+                         f"Average basket: ₹{self.average_basket[i]:.2f} ({self.average_items[i]:.1f} items)")
+            if self.refunds[i]:
+                lines.append(f"Refunds: ₹{self.refunds[i]:.2f}")
+            lines.append("Top movers:")
+            for p in self.top_products[i]:
+                if self.product_qty[i, p] <= 0:
+                    break
+                lines.append(f"  {sales.products[p]:20} {int(self.product_qty[i, p]):>6} sold "
+                             f"({int(self.qty_change[i, p]):+d})  ₹{self.product_amount[i, p]:.2f}")
+            lines.append("Sales by product:")
+            for p in np.nonzero((self.product_qty[i] != 0) | (self.product_amount[i] != 0))[0]:
+                lines.append(f"  {sales.products[p]:20} {int(self.product_qty[i, p]):>6}  ₹{self.product_amount[i, p]:.2f}")
+            lines.append("Sales by hour:")
+            for hour in np.nonzero(self.hour_amount[i])[0]:
+                lines.append(f"  {hour:02d}:00  ₹{self.hour_amount[i, hour]:.2f}")
+            lines.append("Sales by terminal:")
+            for t in np.nonzero((self.terminal_bills[i] != 0) | (self.terminal_amount[i] != 0))[0]:
+                lines.append(f"  {sales.terminals[t] or '-':8} {int(self.terminal_bills[i, t]):>5} bills  ₹{self.terminal_amount[i, t]:.2f}")
+            lines.append("")
+        return "\n".join(lines) if lines else "No sales recorded in this range."
+
+    def write_csv(self, folder):
+        """Writes the report tables as CSV files into a folder."""
+        os.makedirs(folder, exist_ok=True)
+        sales = self.sales
+        labels = [self.label(i) for i in range(len(self.periods))]
+        with open(os.path.join(folder, f"{self.period}_summary.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("period", "bills", "takings", "refunds", "average_basket", "average_items"))
+            for i, label in enumerate(labels):
+                writer.writerow((label, int(self.bills[i]), round(self.takings[i], 2), round(self.refunds[i], 2),
+                                 round(self.average_basket[i], 2), round(self.average_items[i], 2)))
+        with open(os.path.join(folder, f"{self.period}_products.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("period", "product", "qty", "amount", "qty_change"))
+            for i, p in zip(*np.nonzero((self.product_qty != 0) | (self.product_amount != 0))):
+                writer.writerow((labels[i], sales.products[p], int(self.product_qty[i, p]),
+                                 round(self.product_amount[i, p], 2), int(self.qty_change[i, p])))
+        with open(os.path.join(folder, f"{self.period}_hours.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("period", "hour", "amount"))
+            for i, hour in zip(*np.nonzero(self.hour_amount)):
+                writer.writerow((labels[i], int(hour), round(self.hour_amount[i, hour], 2)))
+        with open(os.path.join(folder, f"{self.period}_terminals.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("period", "terminal", "bills", "amount"))
+            for i, t in zip(*np.nonzero((self.terminal_bills != 0) | (self.terminal_amount != 0))):
+                writer.writerow((labels[i], sales.terminals[t], int(self.terminal_bills[i, t]),
+                                 round(self.terminal_amount[i, t], 2)))
+
+
+def sales_report(profile, period="daily", start=None, end=None, top=5):
+    """Builds a daily, weekly or monthly report over a store's recorded sales."""
+    return Report(load_sales(start, end, profile["numbering"]["prefix"]), period, top)
+
+
+if __name__ == "__main__":
+    import store_profiles
+
+    parser = argparse.ArgumentParser(description="Sales reports from the recorded bills.")
+    parser.add_argument("profile", help="store profile from store_profiles.json")
+    parser.add_argument("period", choices=PERIODS)
+    parser.add_argument("--from", dest="start", help="first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", help="last day, YYYY-MM-DD")
+    parser.add_argument("--top", type=int, default=5, help="number of top movers to show")
+    parser.add_argument("--csv", help="folder to write CSV tables into")
+    args = parser.parse_args()
+
+    report = sales_report(store_profiles.get_profile(args.profile), args.period,
+                          datetime.strptime(args.start, "%Y-%m-%d") if args.start else None,
+                          datetime.strptime(args.end, "%Y-%m-%d") if args.end else None,
+                          args.top)
+    print(report.text())
+    if args.csv:
+        report.write_csv(args.csv)
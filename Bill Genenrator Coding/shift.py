@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import threading
+from datetime import datetime
+
+import file_lock
+
+# ------------------ Shift Totals ------------------
+# Running totals of the open shift of each store: takings, bills and items,
+# per terminal and per product. Every checkout appends one line for its bill to
+# the shift's journal, shifts/shift_<store>_<number>.jsonl, and every process
+# billing for the store (the app, the API) folds the lines it has not seen yet
+# into its totals, so they all show the same shift and none overwrites another.
+# The dashboard and the Z-report read the totals directly and never go back
+# over the bill history. Refunds of returned items come off the takings and
+# are shown on their own.
+#
+# Closing the shift appends a "close" line; whoever reads it moves on to the
+# next shift's journal. shifts/shift_<store>.json says which shift is open.
+# Lines are appended under the file lock of that file (see file_lock.py), after
+# catching up, so no sale lands behind a close line and two tills closing at
+# once cannot close the shift the first of them just opened.
+shifts_dir = "shifts"
+reports_dir = os.path.join(shifts_dir, "z_reports")
+
+_shifts = {}
+_registry_lock = threading.Lock()
+
+
+def new_state(number, now):
+    return {
+        "number": number,
+        "opened": now.isoformat(timespec="seconds"),
+        "bills": 0,
+        "takings": 0,
+        "refunds": 0,
+        "items": 0,
+        "first_bill": None,
+        "last_bill": None,
+        "terminals": {},
+        "products": {},
+    }
+
+
+def add_sale(state, event):
+    qty_sold = 0
+    for product, qty, item_total in event["items"]:
+        sold = state["products"].setdefault(product, [0, 0])
+        sold[0] += qty
+        sold[1] += item_total
+        qty_sold += qty
+    terminal = state["terminals"].setdefault(event["terminal"], [0, 0])
+    terminal[0] += 1
+    terminal[1] += event["total"]
+    state["bills"] += 1
+    state["takings"] += event["total"]
+    state["items"] += qty_sold
+    state["first_bill"] = state["first_bill"] or event["sale"]
+    state["last_bill"] = event["sale"]
+
+
+def add_refund(state, event):
+    state["refunds"] = state.get("refunds", 0) + event["total"]
+    state["takings"] -= event["total"]
+    terminal = state["terminals"].setdefault(event["terminal"], [0, 0])
+    terminal[1] -= event["total"]
+
+
+class Shift:
+    """The open shift of one store, folded from its journal."""
+
+    def __init__(self, store, name=None):
+        self.store = store
+        self.name = name or store
+        self.path = os.path.join(shifts_dir, f"shift_{store}.json")
+        self.lock = threading.Lock()
+        # Bumped on every change, so dashboards know to redraw
+        self.version = 0
+        # The last shift closed, as (state, closing date)
+        self.closed = None
+        try:
+            with open(self.path, "r") as f:
+                current = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            current = {}
+        opened = current.get("opened")
+        self.state = new_state(current.get("number", 1), datetime.fromisoformat(opened) if opened else datetime.now())
+        self.offset = 0
+        self.catch_up()
+
+    def journal_path(self):
+        return os.path.join(shifts_dir, f"shift_{self.store}_{self.state['number']:04d}.jsonl")
+
+    def catch_up(self):
+        """Folds in the journal lines written since the last look, by any process; call with the lock held."""
+        changed = False
+        while True:
+            try:
+                f = open(self.journal_path(), "rb")
+            except FileNotFoundError:
+                break
+            closing = None
+            with f:
+                f.seek(self.offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self.offset += len(line)
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # The rest of a line torn by a crash
+                        continue
+                    changed = True
+                    if "close" in event:
+                        closing = event
+                        break
+                    if "sale" in event:
+                        add_sale(self.state, event)
+                    else:
+                        add_refund(self.state, event)
+            if closing is None:
+                break
+            self.closed = (self.state, closing["date"])
+            self.state = new_state(self.state["number"] + 1, datetime.fromisoformat(closing["date"]))
+            self.offset = 0
+        if changed:
+            self.version += 1
+
+    def write(self, event):
+        """Appends an event to the open shift's journal; call with both locks held, caught up."""
+        os.makedirs(shifts_dir, exist_ok=True)
+        with open(self.journal_path(), "ab") as f:
+            f.write((json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self.catch_up()
+
+    def append(self, event):
+        """Journals an event in the open shift and folds it in; call with the lock held."""
+        with file_lock.locked(self.path):
+            self.catch_up()
+            self.write(event)
+
+    def record_sale(self, record):
+        """Adds one checked-out bill record to the running totals."""
+        with self.lock:
+            self.append({"sale": record["bill_id"], "terminal": record.get("terminal", ""), "total": record["total"],
+                         "items": [[product, qty, item_total] for product, qty, price, item_total in record["items"]]})
+
+    def record_refund(self, note):
+        """Takes a credit note's refund off the running takings."""
+        with self.lock:
+            self.append({"refund": note["credit_note"], "terminal": note.get("terminal", ""), "total": note["total"]})
+
+    def refresh(self):
+        """Picks up what other processes added; returns the version."""
+        with self.lock:
+            self.catch_up()
+            return self.version
+
+    def totals(self):
+        """Returns a copy of the current shift state."""
+        with self.lock:
+            self.catch_up()
+            return json.loads(json.dumps(self.state))
+
+    def close(self, now=None, number=None):
+        """Writes the Z-report of the shift, starts a new one and returns (report path, report text).
+
+        number is the shift the caller means to close, as shown to them; if
+        another till has closed it meanwhile, ValueError is raised instead of
+        closing the shift that till opened.
+        """
+        now = now or datetime.now()
+        with self.lock, file_lock.locked(self.path):
+            self.catch_up()
+            if number is not None and number != self.state["number"]:
+                raise ValueError(f"Shift #{number} was already closed by another till.")
+            self.write({"close": self.state["number"], "date": now.isoformat(timespec="seconds")})
+            state, closed_at = self.closed
+            text = z_report_text(self.name, state, datetime.fromisoformat(closed_at))
+            os.makedirs(reports_dir, exist_ok=True)
+            report_path = os.path.join(reports_dir, f"Z{state['number']:04d}_{self.store}_{now:%Y%m%d_%H%M%S}.txt")
+            with open(report_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"number": self.state["number"], "opened": self.state["opened"]}, f)
+            os.replace(tmp_path, self.path)
+        return report_path, text
+
+
+def summary_lines(state):
+    """The headline figures of a shift, as used by the dashboard and the Z-report."""
+    bills = state["bills"]
+    average = state["takings"] / bills if bills else 0
+    lines = [
+        f"Bills: {bills}",
+        f"Takings: ₹{state['takings']:.2f}",
+        f"Items sold: {state['items']}",
+        f"Average basket: ₹{average:.2f}",
+    ]
+    if state.get("refunds"):
+        lines.insert(2, f"Refunds: ₹{state['refunds']:.2f}")
+    return lines
+
+
+def z_report_text(name, state, now):
+    """Formats the end-of-shift Z-report."""
+    lines = [
+        f"{name} - Z-Report #{state['number']}",
+        f"Shift opened: {datetime.fromisoformat(state['opened']):%d-%m-%Y %H:%M:%S}",
+        f"Shift closed: {now:%d-%m-%Y %H:%M:%S}",
+        f"First bill: {state['first_bill'] or '-'}",
+        f"Last bill: {state['last_bill'] or '-'}",
+        "-" * 40,
+    ]
+    lines += summary_lines(state)
+    lines.append("-" * 40)
+    lines.append("By terminal:")
+    for terminal, (bills, amount) in sorted(state["terminals"].items()):
+        lines.append(f"  {terminal or '-':10} {bills:>5} bills  ₹{amount:.2f}")
+    lines.append("By product:")
+    for product, (qty, amount) in sorted(state["products"].items(), key=lambda item: -item[1][0]):
+        lines.append(f"  {product:20} {qty:>6}  ₹{amount:.2f}")
+    return "\n".join(lines) + "\n"
+
+
+def get_shift(profile):
+    """Returns the open shift shared by every lane of a store profile."""
+    with _registry_lock:
+        shift = _shifts.get(profile["key"])
+        if shift is None:
+            shift = _shifts[profile["key"]] = Shift(profile["key"], profile["name"])
+        return shift
+
+
+if __name__ == "__main__":
+    import store_profiles
+
+    parser = argparse.ArgumentParser(description="Show or close the current shift of a store.")
+    parser.add_argument("profile", help="store profile from store_profiles.json")
+    parser.add_argument("--close", action="store_true", help="print the Z-report and start a new shift")
+    args = parser.parse_args()
+
+    store_shift = get_shift(store_profiles.get_profile(args.profile))
+    if args.close:
+        path, report = store_shift.close(number=store_shift.totals()["number"])
+        print(report)
+        print(f"Saved to {path}.")
+    else:
+        totals = store_shift.totals()
+        print(f"{store_shift.name} - shift #{totals['number']} since {totals['opened']}")
+        print("\n".join(summary_lines(totals)))
@@ -0,0 +1,982 @@
+import ttkbootstrap as tb
+from ttkbootstrap.constants import *
+import tkinter as tk
+from tkinter import messagebox, filedialog, simpledialog
+from PIL import ImageTk
+from datetime import datetime
+import argparse
+import os
+import subprocess
+import threading
+import atexit
+
+import billing
+import catalog
+import catalog_io
+import customers
+import promotions
+import receipt_mail
+import receipt_preview
+import returns
+import shift
+import stock_sync
+import store_profiles
+
+# ------------------ Shop Window ------------------
+# One window per lane. Several stores and lanes can run in one process; they
+# share the font cache, receipt caches, catalogs and the render pool.
+#
+# Catalog changes, whether from a sale, another lane or an edit of the catalog
+# file by another program, are collected by a listener and applied every half
+# second: only the product tiles and stock rows of the changed products are
+# added, removed or updated.
+
+
+class ShopWindow:
+    """The billing screen of one lane, built from its store profile."""
+
+    def __init__(self, window, lane):
+        self.window = window
+        self.lane = lane
+        self.profile = lane.profile
+        self.stock_entries = {}
+        self.stock_rows = {}
+        self.stock_shown = {}
+        self.stock_window = None
+        self.return_window = None
+        self.tiles = {}
+        self.catalog_changes = set()
+        self.changes_lock = threading.Lock()
+        self.shift_window = None
+        self.previews = receipt_preview.get_previews(self.profile["layout"])
+        self.preview_bill = None
+        self.preview_photo = None
+        self.build()
+        self.lane.catalog.listeners.append(self.note_catalog_change)
+        self.refresh_catalog()
+
+    @property
+    def products(self):
+        return self.lane.products
+
+    # ------------------ Helper Functions ------------------
+    def add_item_to_bill(self, product_name):
+        """Adds a selected product to the bill, checking stock availability."""
+        try:
+            qty = int(self.qty_var.get())
+        except ValueError:
+            messagebox.showerror("Invalid Quantity", "Quantity must be a number.")
+            return
+        try:
+            product_name, qty, price, item_total = self.lane.add_item(product_name, qty)
+        except billing.BillingError as e:
+            messagebox.showerror(e.title, str(e))
+            return
+
+        self.show_total()
+        self.bill_text.insert(tk.END, f"{product_name:15} {qty} x ₹{price} = ₹{item_total}\n")
+
+    def show_total(self):
+        """Shows the open bill's total, less any offers it gets."""
+        saved = sum(discount[2] for discount in self.lane.discounts())
+        if saved:
+            self.total_label.config(text=f"Total: ₹{promotions.money(self.lane.total - saved)} "
+                                         f"(offers -₹{promotions.money(saved)})")
+        else:
+            self.total_label.config(text=f"Total: ₹{self.lane.total}")
+
+    def select_product_and_add(self, product_name):
+        """Sets the product name in the UI and adds the item."""
+        self.product_var.set(product_name)
+        self.add_item_to_bill(product_name)
+
+    def generate_bill(self):
+        """Records the final bill; its PDF is rendered when first needed."""
+        try:
+            record = self.lane.checkout()
+        except billing.BillingError as e:
+            messagebox.showwarning(e.title, str(e))
+            return
+
+        printed = datetime.fromisoformat(record["date"]).strftime("%d-%m-%Y %H:%M:%S")
+        self.bill_text.insert(tk.END, "\n" + "-"*35 + "\n")
+        if record.get("customer"):
+            customer = self.lane.customers.get(record["customer"])
+            on_credit = " (on credit)" if record.get("credit") else ""
+            self.bill_text.insert(tk.END, f"Customer: {customer['name']}{on_credit}\n")
+        for rule_id, label, amount in record.get("discounts", []):
+            self.bill_text.insert(tk.END, f"{label}: -₹{amount}\n")
+        self.bill_text.insert(tk.END, f"Grand Total: ₹{record['total']}\n", "highlight")
+        self.bill_text.insert(tk.END, "Date: " + printed)
+        self.show_preview(record)
+        self.show_customer()
+
+        messagebox.showinfo("Bill Generated", f"Bill {record['bill_id']} saved. You can now view and print it.")
+
+    def show_preview(self, record):
+        """Shows a bill's receipt next to the bill text, drawing it off the UI thread."""
+        self.preview_bill = record["bill_id"]
+        image = self.previews.get(record["bill_id"])
+        if image is not None:
+            self.set_preview(image)
+            return
+        self.set_preview(None)
+        self.wait_for_preview(self.previews.request(record), record["bill_id"])
+
+    def wait_for_preview(self, future, bill_id):
+        if bill_id != self.preview_bill:
+            return
+        if not future.done():
+            self.window.after(15, self.wait_for_preview, future, bill_id)
+        elif future.exception() is None:
+            self.set_preview(future.result())
+
+    def set_preview(self, image):
+        # Tk images must be made on the UI thread, and kept referenced while shown
+        self.preview_photo = ImageTk.PhotoImage(image) if image is not None else None
+        self.preview_label.config(image=self.preview_photo or "")
+
+    def print_bill(self):
+        """Opens the generated PDF file for viewing."""
+        if not self.lane.last_generated_bill:
+            messagebox.showwarning("No Bill to Print", "Please generate a bill first.")
+            return
+
+        try:
+            # Renders the receipt on first use, then serves it from the cache
+            bill_path = self.lane.receipts.path(self.lane.last_generated_bill)
+            if os.name == 'nt':
+                os.startfile(bill_path)
+            elif os.name == 'posix':
+                subprocess.run(['open', bill_path])
+            else:
+                messagebox.showinfo("View", "Viewing is not supported on this OS.")
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open the file: {e}")
+
+    def email_receipt(self):
+        """Queues the last bill's receipt for e-mailing; it is sent in the background."""
+        if not self.lane.last_generated_bill:
+            messagebox.showwarning("No Bill to Send", "Please generate a bill first.")
+            return
+        address = simpledialog.askstring("Email Receipt", "Customer's e-mail address:", parent=self.window)
+        if not address:
+            return
+        try:
+            receipt_mail.get_outbox(self.profile).send_receipt(self.lane.last_generated_bill, address)
+        except (ValueError, KeyError) as e:
+            messagebox.showerror("Email Receipt", str(e).strip("'"))
+            return
+        messagebox.showinfo("Email Receipt", f"Receipt {self.lane.last_generated_bill} will be sent to {address}.")
+
+    def refresh_bill(self):
+        """Clears the current bill, returning its stock, and resets the lane."""
+        self.lane.clear()
+        self.show_open_bill()
+        self.qty_var.set("1")
+        messagebox.showinfo("Refreshed", "Bill has been cleared.")
+
+    def show_open_bill(self):
+        """Redraws the bill display from the lane's open bill."""
+        self.bill_text.delete("1.0", tk.END)
+        self.write_bill_heading()
+        self.preview_bill = None
+        self.set_preview(None)
+        if self.lane.cart_name:
+            self.bill_text.insert(tk.END, f"({self.lane.cart_name})\n")
+        for product_name, qty, price, item_total in self.lane.bill_items:
+            self.bill_text.insert(tk.END, f"{product_name:15} {qty} x ₹{price} = ₹{item_total}\n")
+        self.show_total()
+        self.show_customer()
+
+    # ------------------ Customers ------------------
+    def search_customers(self, event=None):
+        """Lists the customers whose phone or name starts with what was typed."""
+        self.customer_matches = self.lane.customers.find(self.customer_query_var.get())
+        self.customer_list.delete(0, tk.END)
+        for customer in self.customer_matches:
+            self.customer_list.insert(tk.END, f"{customer['name']:25} {customer['phone']}")
+
+    def choose_customer(self, event=None):
+        """Attaches the open bill to the customer picked from the list."""
+        selection = self.customer_list.curselection()
+        if not selection:
+            return
+        self.lane.set_customer(self.customer_matches[selection[0]]["id"], self.lane.on_credit)
+        self.show_customer()
+
+    def walk_in(self):
+        """Detaches the open bill from its customer."""
+        self.lane.set_customer(None)
+        self.customer_query_var.set("")
+        self.search_customers()
+        self.show_customer()
+
+    def set_credit(self):
+        try:
+            self.lane.set_customer(self.lane.customer, self.credit_var.get())
+        except billing.BillingError as e:
+            messagebox.showwarning(e.title, str(e))
+        self.show_customer()
+
+    def show_customer(self):
+        """Shows who the open bill is for and what they owe."""
+        self.credit_var.set(self.lane.on_credit)
+        customer = self.lane.customers.get(self.lane.customer) if self.lane.customer else None
+        if customer is None:
+            self.customer_label.config(text="Walk-in customer")
+            return
+        balance = promotions.money(self.lane.customers.balance(customer["id"]))
+        self.customer_label.config(text=f"{customer['name']} ({customer['phone']})  owes ₹{balance}")
+
+    def save_new_customer(self, window, name_entry, phone_entry, gstin_entry):
+        try:
+            customer = self.lane.customers.add(name_entry.get(), phone_entry.get(), gstin=gstin_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Validation Error", str(e), parent=window)
+            return
+        window.destroy()
+        self.lane.set_customer(customer["id"], self.lane.on_credit)
+        self.customer_query_var.set(customer["phone"])
+        self.search_customers()
+        self.show_customer()
+
+    def open_add_customer_window(self):
+        """Opens a window to add a customer; the open bill is attached to them."""
+        add_customer_window = tb.Toplevel(self.window)
+        add_customer_window.title("New Customer")
+        add_customer_window.geometry("360x300")
+        add_customer_window.grab_set()
+
+        tb.Label(add_customer_window, text="Name:", font=("Segoe UI", 12)).pack(pady=5)
+        name_entry = tb.Entry(add_customer_window, width=30, font=("Segoe UI", 12))
+        name_entry.pack(pady=5)
+
+        tb.Label(add_customer_window, text="Phone:", font=("Segoe UI", 12)).pack(pady=5)
+        phone_entry = tb.Entry(add_customer_window, width=30, font=("Segoe UI", 12))
+        phone_entry.pack(pady=5)
+        query = self.customer_query_var.get().strip()
+        (phone_entry if customers.phone_digits(query) == query else name_entry).insert(0, query)
+
+        tb.Label(add_customer_window, text="GSTIN (business customers):", font=("Segoe UI", 12)).pack(pady=5)
+        gstin_entry = tb.Entry(add_customer_window, width=30, font=("Segoe UI", 12))
+        gstin_entry.pack(pady=5)
+
+        tb.Button(add_customer_window, text="Save Customer",
+                  command=lambda: self.save_new_customer(add_customer_window, name_entry, phone_entry,
+                                                         gstin_entry),
+                  bootstyle="success").pack(pady=10)
+
+    def take_payment(self):
+        """Records a payment towards the chosen customer's credit."""
+        if not self.lane.customer:
+            messagebox.showwarning("No Customer", "Choose the customer who is paying first.")
+            return
+        customer = self.lane.customers.get(self.lane.customer)
+        owed = promotions.money(self.lane.customers.balance(customer["id"]))
+        amount = simpledialog.askfloat("Credit Payment", f"{customer['name']} owes ₹{owed}.\nAmount paid:",
+                                       parent=self.window, minvalue=0.01)
+        if amount is None:
+            return
+        entry = self.lane.customers.pay(customer["id"], promotions.money(amount))
+        self.show_customer()
+        messagebox.showinfo("Payment Recorded",
+                            f"{customer['name']} now owes ₹{promotions.money(entry['balance'])}.")
+
+    # ------------------ Returns ------------------
+    def show_returnable(self, bill_entry, lines_frame):
+        """Looks up a bill and lists its lines with how many can still be returned."""
+        for widget in lines_frame.winfo_children():
+            widget.destroy()
+        self.return_entries = {}
+        self.return_bill = None
+        try:
+            record, returned = returns.find_bill(bill_entry.get().strip())
+        except billing.BillingError as e:
+            messagebox.showerror(e.title, str(e), parent=self.return_window)
+            return
+        self.return_bill = record["bill_id"]
+        tb.Label(lines_frame, text=f"{record['bill_id']}  {datetime.fromisoformat(record['date']):%d-%m-%Y %H:%M}"
+                                   f"  ₹{record['total']}", font=("Segoe UI", 11, "bold")).grid(row=0, column=0,
+                                                                                              columnspan=3, sticky="w")
+        tb.Label(lines_frame, text="Can return", font=("Segoe UI", 10, "bold")).grid(row=1, column=1, padx=10)
+        tb.Label(lines_frame, text="Returning", font=("Segoe UI", 10, "bold")).grid(row=1, column=2, padx=10)
+        for line, (product, qty, price, item_total) in enumerate(record["items"]):
+            left = qty - returned.get(line, 0)
+            tb.Label(lines_frame, text=f"{product} @ ₹{price}", font=("Segoe UI", 12)).grid(row=line + 2, column=0,
+                                                                                         padx=10, pady=3, sticky="w")
+            tb.Label(lines_frame, text=str(left), font=("Segoe UI", 12)).grid(row=line + 2, column=1, padx=10)
+            if left:
+                entry = tb.Spinbox(lines_frame, from_=0, to=left, width=5, font=("Segoe UI", 12))
+                entry.set("0")
+                entry.grid(row=line + 2, column=2, padx=10)
+                self.return_entries[line] = entry
+
+    def issue_credit_note(self):
+        """Takes the entered items back and opens the credit note."""
+        if not self.return_bill:
+            messagebox.showwarning("No Bill", "Find the bill first.", parent=self.return_window)
+            return
+        try:
+            quantities = {line: int(entry.get() or 0) for line, entry in self.return_entries.items()}
+        except ValueError:
+            messagebox.showerror("Error", "Quantities must be whole numbers.", parent=self.return_window)
+            return
+        try:
+            note = returns.take_return(self.lane, self.return_bill, quantities)
+        except billing.BillingError as e:
+            messagebox.showerror(e.title, str(e), parent=self.return_window)
+            return
+        self.show_customer()
+        self.return_window.destroy()
+        how = "taken off the customer's credit" if note.get("credit") else "to be paid back"
+        messagebox.showinfo("Credit Note", f"Credit note {note['credit_note']}: ₹{note['total']} {how}.")
+        try:
+            note_path = returns.save_credit_note(note, self.profile["layout"])
+            if os.name == 'nt':
+                os.startfile(note_path)
+            elif os.name == 'posix':
+                subprocess.run(['open', note_path])
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open the credit note: {e}")
+
+    def open_return_window(self):
+        """Opens the window for taking items of an earlier bill back."""
+        if self.return_window and self.return_window.winfo_exists():
+            self.return_window.lift()
+            return
+
+        self.return_window = tb.Toplevel(self.window)
+        self.return_window.title("Return Items")
+        self.return_window.geometry("520x420")
+        self.return_window.grab_set()
+
+        tb.Label(self.return_window, text="Return Items", font=("Segoe UI", 16, "bold"), bootstyle="inverse").pack(fill="x", pady=10)
+        find_frame = tb.Frame(self.return_window, padding=10)
+        find_frame.pack(fill="x")
+        tb.Label(find_frame, text="Bill ID:", font=("Segoe UI", 12)).pack(side="left")
+        bill_entry = tb.Entry(find_frame, width=24, font=("Segoe UI", 12))
+        bill_entry.pack(side="left", padx=5)
+        lines_frame = tb.Frame(self.return_window, padding=10)
+        lines_frame.pack(fill="both", expand=True)
+        tb.Button(find_frame, text="Find", bootstyle="info",
+                  command=lambda: self.show_returnable(bill_entry, lines_frame)).pack(side="left")
+        bill_entry.bind("<Return>", lambda event: self.show_returnable(bill_entry, lines_frame))
+        if self.lane.last_generated_bill:
+            bill_entry.insert(0, self.lane.last_generated_bill)
+
+        self.return_entries = {}
+        self.return_bill = None
+        tb.Button(self.return_window, text="Issue Credit Note", command=self.issue_credit_note,
+                  bootstyle="danger").pack(pady=10)
+
+    # ------------------ Parked Bills ------------------
+    def park_bill(self):
+        """Suspends the open bill so the lane can serve the next customer."""
+        try:
+            self.lane.park(self.park_name_var.get().strip() or None)
+        except billing.BillingError as e:
+            messagebox.showwarning(e.title, str(e))
+            return
+        self.park_name_var.set("")
+        self.show_open_bill()
+        self.show_parked()
+
+    def selected_parked(self):
+        selection = self.parked_list.curselection()
+        if not selection:
+            messagebox.showwarning("Parked Bills", "Select a parked bill first.")
+            return None
+        return self.parked_names[selection[0]]
+
+    def resume_bill(self, event=None):
+        """Brings a parked bill back; the open bill, if any, is parked in its place."""
+        name = self.selected_parked()
+        if name is None:
+            return
+        try:
+            self.lane.resume(name)
+        except billing.BillingError as e:
+            messagebox.showwarning(e.title, str(e))
+        self.show_open_bill()
+        self.show_parked()
+
+    def cancel_parked_bill(self):
+        """Drops a parked bill and gives its stock back."""
+        name = self.selected_parked()
+        if name is None or not messagebox.askyesno("Cancel Bill", f"Cancel the parked bill {name}?"):
+            return
+        self.lane.cancel_parked(name)
+        self.show_parked()
+
+    def show_parked(self):
+        self.parked_names = list(self.lane.parked)
+        self.parked_list.delete(0, tk.END)
+        for cart in self.lane.parked.values():
+            self.parked_list.insert(tk.END, f"{cart.name:15} ₹{cart.total:<8} until {cart.expires:%H:%M}")
+
+    def expire_parked_bills(self):
+        """Releases parked bills that have waited too long."""
+        if self.lane.expire_parked():
+            self.show_parked()
+        self.window.after(5000, self.expire_parked_bills)
+
+    # ------------------ Live Catalog Changes ------------------
+    def note_catalog_change(self, names):
+        """Catalog listener; may be called from any thread."""
+        with self.changes_lock:
+            self.catalog_changes.update(names)
+
+    def refresh_catalog(self):
+        """Applies the catalog changes noted since the last look."""
+        with self.changes_lock:
+            names, self.catalog_changes = self.catalog_changes, set()
+        if names:
+            with self.lane.catalog.lock:
+                current = {name: dict(self.products[name]) for name in names if name in self.products}
+            self.update_tiles(names, current)
+            if self.stock_window and self.stock_window.winfo_exists():
+                self.update_stock_rows(names, current)
+        self.window.after(500, self.refresh_catalog)
+
+    def update_tiles(self, names, current):
+        """Adds tiles for new products and removes those of deleted ones."""
+        moved = False
+        for name in names:
+            if name in current and name not in self.tiles:
+                self.tiles[name] = self.make_tile(name)
+                moved = True
+            elif name not in current and name in self.tiles:
+                self.tiles.pop(name).destroy()
+                moved = True
+        if moved:
+            self.place_tiles()
+
+    def update_stock_rows(self, names, current):
+        """Updates the stock rows of changed products, leaving values being edited alone."""
+        for name in names:
+            data = current.get(name)
+            if data is None:
+                for widget in self.stock_rows.pop(name, []):
+                    widget.destroy()
+                self.stock_entries.pop(name, None)
+                self.stock_shown.pop(name, None)
+            elif name not in self.stock_entries:
+                self.add_stock_row(name, data)
+            else:
+                shown = list(self.stock_shown[name])
+                values = [str(data["stock"]), str(self.lane.low_stock.level(data))]
+                for i, entry in enumerate(self.stock_entries[name]):
+                    if entry is not None and entry.get() == shown[i] and values[i] != shown[i]:
+                        entry.delete(0, tk.END)
+                        entry.insert(0, values[i])
+                        shown[i] = values[i]
+                self.stock_shown[name] = tuple(shown)
+
+    # ------------------ Stock Management Window ------------------
+    def add_stock_row(self, item, data):
+        row = self.stock_next_row
+        self.stock_next_row += 1
+        label = tb.Label(self.stock_frame, text=item, font=("Segoe UI", 12))
+        label.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+
+        entry = tb.Entry(self.stock_frame, width=10, font=("Segoe UI", 12))
+        entry.insert(0, str(data["stock"]))
+        entry.grid(row=row, column=1, padx=10, pady=5)
+        level_entry = None
+        level = str(self.lane.low_stock.level(data))
+        if not self.lane.catalog.is_snapshot():
+            level_entry = tb.Entry(self.stock_frame, width=10, font=("Segoe UI", 12))
+            level_entry.insert(0, level)
+            level_entry.grid(row=row, column=2, padx=10, pady=5)
+        self.stock_entries[item] = (entry, level_entry)
+        self.stock_rows[item] = [widget for widget in (label, entry, level_entry) if widget is not None]
+        self.stock_shown[item] = (str(data["stock"]), level)
+
+    def update_stock_in_gui(self, stock_frame):
+        """Refreshes the stock display in the stock window."""
+        for widget in stock_frame.winfo_children():
+            widget.destroy()
+        self.stock_frame = stock_frame
+        self.stock_entries = {}
+        self.stock_rows = {}
+        self.stock_shown = {}
+        self.stock_next_row = 1
+
+        tb.Label(stock_frame, text="Stock", font=("Segoe UI", 10, "bold")).grid(row=0, column=1, padx=10)
+        if not self.lane.catalog.is_snapshot():
+            tb.Label(stock_frame, text="Reorder at", font=("Segoe UI", 10, "bold")).grid(row=0, column=2, padx=10)
+
+        with self.lane.catalog.lock:
+            current = [(item, dict(data)) for item, data in self.products.items()]
+        for item, data in current:
+            self.add_stock_row(item, data)
+
+    def save_and_close_stock(self):
+        """Saves the stock and reorder levels that were edited and closes the window."""
+        try:
+            new_stock = {}
+            for item, (entry, level_entry) in self.stock_entries.items():
+                level = int(level_entry.get()) if level_entry else None
+                new_stock[item] = (int(entry.get()), level)
+        except ValueError:
+            messagebox.showerror("Error", "Stock and reorder levels must be valid numbers.")
+            return
+        if any(stock < 0 or (level is not None and level < 0) for stock, level in new_stock.values()):
+            messagebox.showerror("Error", "Stock cannot be a negative number.")
+            return
+        edited = []
+        with self.lane.catalog.lock:
+            deltas = {}
+            for item, (stock, level) in new_stock.items():
+                product = self.products.get(item)
+                shown_stock, shown_level = self.stock_shown[item]
+                # Rows left as shown keep whatever sales or other programs did meanwhile
+                if product is None:
+                    continue
+                if str(stock) != shown_stock:
+                    deltas[item] = stock - product["stock"]
+                    product["stock"] = stock
+                    edited.append(item)
+                if level is not None and str(level) != shown_level:
+                    product["reorder_level"] = level
+                    edited.append(item)
+            self.lane.catalog.log_adjustments(deltas, "stock update")
+        self.lane.catalog.changed(edited)
+        self.lane.catalog.save()
+        messagebox.showinfo("Success", "Stock updated successfully!")
+        self.stock_window.destroy()
+
+    def open_stock_window(self):
+        """Opens a new window to manage product stock."""
+        if self.stock_window and self.stock_window.winfo_exists():
+            self.stock_window.lift()
+            return
+
+        self.stock_window = tb.Toplevel(self.window)
+        self.stock_window.title("Manage Stock")
+        self.stock_window.geometry("480x400")
+        self.stock_window.grab_set()
+
+        tb.Label(self.stock_window, text="Update Stock", font=("Segoe UI", 16, "bold"), bootstyle="inverse").pack(fill="x", pady=10)
+
+        stock_frame = tb.Frame(self.stock_window, padding=10)
+        stock_frame.pack(fill="both", expand=True)
+
+        self.update_stock_in_gui(stock_frame)
+
+        save_button = tb.Button(self.stock_window, text="Save Changes", command=self.save_and_close_stock, bootstyle="success")
+        save_button.pack(pady=10)
+
+    # ------------------ Add New Product Window ------------------
+    def save_new_product(self, window, product_entry, price_entry, stock_entry):
+        """Validates and saves a new product to the stock."""
+        name = product_entry.get().strip()
+        price = price_entry.get().strip()
+        stock = stock_entry.get().strip()
+
+        if not name or not price or not stock:
+            messagebox.showerror("Validation Error", "All fields are required.")
+            return
+
+        try:
+            price = float(price)
+            stock = int(stock)
+            if price <= 0 or stock < 0:
+                messagebox.showerror("Validation Error", "Price must be positive and stock must be non-negative.")
+                return
+        except ValueError:
+            messagebox.showerror("Validation Error", "Price must be a number and stock must be an integer.")
+            return
+
+        if name in self.products:
+            messagebox.showerror("Duplicate Product", f"{name} already exists. Use 'Update Stock' to modify it.")
+            return
+
+        with self.lane.catalog.lock:
+            self.products[name] = {"price": price, "stock": stock}
+            self.lane.catalog.log_adjustments({name: stock}, "new product")
+        self.lane.catalog.changed([name])
+        self.lane.catalog.save()
+        messagebox.showinfo("Success", f"Product '{name}' added successfully!")
+        window.destroy()
+
+    def open_add_product_window(self):
+        """Opens a new window to add a product with a scrollbar."""
+        add_product_window = tb.Toplevel(self.window)
+        add_product_window.title("Add New Product")
+        add_product_window.geometry("400x300")
+        add_product_window.grab_set()
+
+        main_scroll_frame = tb.Frame(add_product_window, padding=10)
+        main_scroll_frame.pack(fill="both", expand=True)
+
+        canvas = tk.Canvas(main_scroll_frame, highlightthickness=0)
+        scrollbar = tb.Scrollbar(main_scroll_frame, orient="vertical", command=canvas.yview)
+        scrollable_frame = tb.Frame(canvas, padding=10)
+
+        scrollable_frame.bind(
+            "<Configure>",
+            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
+        )
+
+        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
+        canvas.configure(yscrollcommand=scrollbar.set)
+
+        canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        tb.Label(scrollable_frame, text="Product Name:", font=("Segoe UI", 12)).pack(pady=5)
+        product_entry = tb.Entry(scrollable_frame, width=30, font=("Segoe UI", 12))
+        product_entry.pack(pady=5)
+
+        tb.Label(scrollable_frame, text="Price:", font=("Segoe UI", 12)).pack(pady=5)
+        price_entry = tb.Entry(scrollable_frame, width=30, font=("Segoe UI", 12))
+        price_entry.pack(pady=5)
+
+        tb.Label(scrollable_frame, text="Initial Stock:", font=("Segoe UI", 12)).pack(pady=5)
+        stock_entry = tb.Entry(scrollable_frame, width=30, font=("Segoe UI", 12))
+        stock_entry.pack(pady=5)
+
+        add_button = tb.Button(scrollable_frame, text="Add", bootstyle="success",
+                               command=lambda: self.save_new_product(add_product_window, product_entry, price_entry, stock_entry))
+        add_button.pack(pady=20)
+
+    # ------------------ Low Stock Alerts ------------------
+    def refresh_alerts(self):
+        """Redraws the low stock panel when the alert index has changed."""
+        index = self.lane.low_stock
+        if index.version != self.alerts_version:
+            self.alerts_version = index.version
+            self.alerts_list.delete(0, tk.END)
+            for name, stock, level in index.most_urgent(20):
+                self.alerts_list.insert(tk.END, f"{name:20} {stock:>5} (reorder at {level})")
+            self.alerts_label.config(text=f"Low Stock: {index.count()}")
+        self.window.after(500, self.refresh_alerts)
+
+    def export_reorder_list(self):
+        """Saves the products at or below their reorder level as a CSV file."""
+        path = filedialog.asksaveasfilename(parent=self.window, title="Export Reorder List",
+                                            defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        if not path:
+            return
+        try:
+            count = self.lane.low_stock.export_reorder_list(path)
+        except OSError as e:
+            messagebox.showerror("Export Failed", str(e))
+            return
+        messagebox.showinfo("Reorder List", f"Exported {count} products to {path}.")
+
+    # ------------------ Shift Dashboard ------------------
+    def refresh_shift_window(self):
+        """Redraws the shift dashboard when the running totals have changed."""
+        if not (self.shift_window and self.shift_window.winfo_exists()):
+            return
+        current = self.lane.shift
+        version = current.refresh()
+        if version != self.shift_version:
+            self.shift_version = version
+            totals = current.totals()
+            self.shift_summary.config(text=f"Shift #{totals['number']} since "
+                                           f"{datetime.fromisoformat(totals['opened']):%d-%m-%Y %H:%M}\n"
+                                           + "\n".join(shift.summary_lines(totals)))
+            self.shift_products.delete(0, tk.END)
+            for product, (qty, amount) in sorted(totals["products"].items(), key=lambda item: -item[1][0]):
+                self.shift_products.insert(tk.END, f"{product:20} {qty:>5}  ₹{amount:.2f}")
+        self.shift_window.after(1000, self.refresh_shift_window)
+
+    def close_shift(self):
+        """Prints the Z-report of the shift and starts a new one."""
+        number = self.lane.shift.totals()["number"]
+        if not messagebox.askyesno("Close Shift", f"Close shift #{number} and print the Z-report?",
+                                   parent=self.shift_window):
+            return
+        try:
+            report_path, report = self.lane.shift.close(number=number)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Close Shift", str(e), parent=self.shift_window)
+            return
+        messagebox.showinfo("Z-Report", f"{report}\nSaved to {report_path}.", parent=self.shift_window)
+
+    def open_shift_window(self):
+        """Opens the live totals of the current shift."""
+        if self.shift_window and self.shift_window.winfo_exists():
+            self.shift_window.lift()
+            return
+
+        self.shift_window = tb.Toplevel(self.window)
+        self.shift_window.title(f"Shift - {self.profile['name']}")
+        self.shift_window.geometry("420x480")
+
+        tb.Label(self.shift_window, text="Current Shift", font=("Segoe UI", 16, "bold"), bootstyle="inverse").pack(fill="x", pady=10)
+        self.shift_summary = tb.Label(self.shift_window, font=("Segoe UI", 12), justify="left")
+        self.shift_summary.pack(fill="x", padx=10)
+        self.shift_products = tk.Listbox(self.shift_window, font=("Courier New", 10))
+        self.shift_products.pack(fill="both", expand=True, padx=10, pady=10)
+        tb.Button(self.shift_window, text="Close Shift (Z-Report)", command=self.close_shift,
+                  bootstyle="danger").pack(pady=10)
+
+        self.shift_version = None
+        self.refresh_shift_window()
+
+    # ------------------ Bulk Import / Export ------------------
+    def import_catalog_file(self):
+        """Previews a CSV/JSONL catalog import, then applies it if confirmed."""
+        path = filedialog.askopenfilename(parent=self.window, title="Import Catalog",
+                                          filetypes=[("Catalog files", "*.csv *.jsonl"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            preview = catalog_io.import_catalog(self.lane.catalog, path, dry_run=True)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Import Failed", str(e))
+            return
+        if not (preview.added or preview.updated):
+            messagebox.showinfo("Import Catalog", preview.summary())
+            return
+        if not messagebox.askyesno("Import Catalog", preview.summary() + "\n\nApply these changes?"):
+            return
+        result = catalog_io.import_catalog(self.lane.catalog, path)
+        messagebox.showinfo("Import Catalog", result.summary())
+
+    def export_catalog_file(self):
+        """Saves the catalog as a CSV or JSONL file."""
+        path = filedialog.asksaveasfilename(parent=self.window, title="Export Catalog", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+        if not path:
+            return
+        try:
+            count = catalog_io.export_catalog(self.lane.catalog, path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Export Failed", str(e))
+            return
+        messagebox.showinfo("Export Catalog", f"Exported {count} products to {path}.")
+
+    # ------------------ Main GUI Window ------------------
+    def make_tile(self, product_name):
+        return tb.Button(self.products_frame, text=product_name,
+                         command=lambda p=product_name: self.select_product_and_add(p),
+                         bootstyle=self.profile["tile_style"], width=15)
+
+    def place_tiles(self):
+        """Lays the product tiles out two to a row."""
+        for i, product_tile in enumerate(self.tiles.values()):
+            product_tile.grid(row=i // 2, column=i % 2, padx=10, pady=10, sticky="nsew")
+
+    def update_product_buttons(self):
+        """Clears and re-creates the product selection buttons."""
+        for widget in self.products_frame.winfo_children():
+            widget.destroy()
+
+        self.tiles = {product_name: self.make_tile(product_name) for product_name in list(self.products.keys())}
+        self.place_tiles()
+
+    def write_bill_heading(self):
+        """Writes the shop name at the top of the bill display."""
+        self.bill_text.insert(tk.END, " " * 6 + self.profile["name"] + "\n", "center")
+        self.bill_text.insert(tk.END, "-" * 35 + "\n")
+
+    def action_button(self, icon, text, command, bootstyle):
+        label = f"{icon} {text}" if self.profile["button_icons"] else text
+        tb.Button(self.action_frame, text=label, command=command, bootstyle=bootstyle, width=18).pack(pady=5, padx=5, fill="x")
+
+    def build(self):
+        """Lays out the billing screen."""
+        profile = self.profile
+        self.window.title(f"Shop Bill Generator - {profile['name']} ({self.lane.terminal})")
+        self.window.geometry("1300x700")
+
+        # Heading
+        tb.Label(self.window, text=f"{profile['icon']} {profile['name']}".strip(),
+                 font=tuple(profile["heading_font"]),
+                 bootstyle="inverse").pack(fill="x", pady=10)
+
+        # Frames
+        main_frame = tb.Frame(self.window, padding=20)
+        main_frame.pack(fill="both", expand=True)
+
+        left_frame = tb.Frame(main_frame, padding=20, bootstyle=profile["panel_style"])
+        left_frame.pack(side="left", fill="both", expand=True)
+
+        right_frame = tb.Frame(main_frame, padding=20, bootstyle="light")
+        right_frame.pack(side="right", fill="both", expand=True)
+
+        # ---- Left Frame (Product Selection) ----
+        tb.Label(left_frame, text="Select Product", font=("Segoe UI", 18, "bold"), bootstyle="inverse").pack(pady=10)
+        self.products_frame = tb.Frame(left_frame)
+        self.products_frame.pack(pady=10)
+
+        self.update_product_buttons()
+
+        # ---- Quantity and Actions ----
+        qty_frame = tb.Frame(left_frame)
+        qty_frame.pack(pady=20)
+        tb.Label(qty_frame, text="Quantity:", font=("Segoe UI", 12, "bold")).pack(side="left", padx=10)
+        self.qty_var = tk.StringVar(value="1")
+        qty_spinbox = tb.Spinbox(qty_frame, from_=1, to=100, textvariable=self.qty_var, width=5, font=("Segoe UI", 12))
+        qty_spinbox.pack(side="left")
+
+        # Action Buttons
+        self.action_frame = tb.Frame(left_frame)
+        self.action_frame.pack(pady=10, fill="x")
+
+        self.action_button("📄", "Generate Bill", self.generate_bill, "success")
+        self.action_button("🖨️", "Print Bill", self.print_bill, "primary")
+        if profile["mail"]:
+            self.action_button("✉", "Email Receipt", self.email_receipt, "primary")
+        self.action_button("🧹", "Clear Bill", self.refresh_bill, "warning")
+        self.action_button("⏸", "Park Bill", self.park_bill, "secondary")
+        self.action_button("📦", "Update Stock", self.open_stock_window, "info")
+        self.action_button("↩", "Return Items", self.open_return_window, "danger")
+        self.action_button("📊", "Shift Totals", self.open_shift_window, "secondary")
+        if profile["add_product"]:
+            self.action_button("+", "Add Product", self.open_add_product_window, "success")
+            self.action_button("📥", "Import Catalog", self.import_catalog_file, "secondary")
+            self.action_button("📤", "Export Catalog", self.export_catalog_file, "secondary")
+
+        self.product_var = tk.StringVar()
+
+        # ---- Right Frame (Bill Display) ----
+        tb.Label(right_frame, text="Customer Bill", font=("Segoe UI", 18, "bold"), bootstyle="inverse").pack(pady=10)
+
+        customer_frame = tb.Frame(right_frame)
+        customer_frame.pack(fill="x")
+        tb.Label(customer_frame, text="Customer:", font=("Segoe UI", 12, "bold")).pack(side="left")
+        self.customer_query_var = tk.StringVar()
+        customer_entry = tb.Entry(customer_frame, textvariable=self.customer_query_var, width=18)
+        customer_entry.pack(side="left", padx=5)
+        customer_entry.bind("<KeyRelease>", self.search_customers)
+        tb.Button(customer_frame, text="New", command=self.open_add_customer_window,
+                  bootstyle="success-outline").pack(side="left")
+        tb.Button(customer_frame, text="Walk-in", command=self.walk_in,
+                  bootstyle="secondary-outline").pack(side="left", padx=5)
+        tb.Button(customer_frame, text="Payment", command=self.take_payment,
+                  bootstyle="info-outline").pack(side="right")
+        self.credit_var = tk.BooleanVar()
+        tb.Checkbutton(customer_frame, text="On Credit", variable=self.credit_var,
+                       command=self.set_credit).pack(side="right", padx=5)
+        self.customer_list = tk.Listbox(right_frame, height=3, font=("Courier New", 10))
+        self.customer_list.pack(fill="x", pady=5)
+        self.customer_list.bind("<<ListboxSelect>>", self.choose_customer)
+        self.customer_matches = []
+        self.customer_label = tb.Label(right_frame, text="Walk-in customer", font=("Segoe UI", 11))
+        self.customer_label.pack(anchor="w")
+
+        bill_display_frame = tb.Frame(right_frame)
+        bill_display_frame.pack(fill="both", expand=True)
+
+        self.preview_label = tb.Label(bill_display_frame)
+        self.preview_label.pack(side="right", fill="y", padx=(10, 0))
+
+        self.bill_text = tk.Text(bill_display_frame, height=18, font=("Courier New", 12),
+                                 bg="#FAFAFA", relief="flat", bd=0)
+        self.bill_text.pack(side="left", fill="both", expand=True)
+
+        scrollbar = tb.Scrollbar(bill_display_frame, command=self.bill_text.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.bill_text.config(yscrollcommand=scrollbar.set)
+
+        self.bill_text.tag_configure("highlight", foreground="#28a745", font=("Courier New", 14, "bold"))
+        self.write_bill_heading()
+
+        self.total_label = tb.Label(right_frame, text="Total: ₹0", font=("Segoe UI", 18, "bold"), bootstyle="success")
+        self.total_label.pack(pady=10)
+
+        # ---- Low Stock Panel ----
+        alerts_frame = tb.Frame(right_frame)
+        alerts_frame.pack(fill="x")
+        self.alerts_label = tb.Label(alerts_frame, text="Low Stock: 0", font=("Segoe UI", 12, "bold"), bootstyle="danger")
+        self.alerts_label.pack(side="left")
+        tb.Button(alerts_frame, text="Export Reorder List", command=self.export_reorder_list,
+                  bootstyle="danger-outline").pack(side="right")
+        self.alerts_list = tk.Listbox(right_frame, height=4, font=("Courier New", 10))
+        self.alerts_list.pack(fill="x", pady=5)
+        self.alerts_version = None
+        self.refresh_alerts()
+
+        # ---- Parked Bills Panel ----
+        parked_frame = tb.Frame(right_frame)
+        parked_frame.pack(fill="x")
+        tb.Label(parked_frame, text="Parked Bills", font=("Segoe UI", 12, "bold")).pack(side="left")
+        tb.Button(parked_frame, text="Cancel", command=self.cancel_parked_bill,
+                  bootstyle="danger-outline").pack(side="right")
+        tb.Button(parked_frame, text="Resume", command=self.resume_bill,
+                  bootstyle="info-outline").pack(side="right", padx=5)
+        self.park_name_var = tk.StringVar()
+        tb.Entry(parked_frame, textvariable=self.park_name_var, width=12).pack(side="right")
+        self.parked_list = tk.Listbox(right_frame, height=3, font=("Courier New", 10))
+        self.parked_list.pack(fill="x", pady=5)
+        self.parked_list.bind("<Double-Button-1>", self.resume_bill)
+        self.parked_names = []
+        self.expire_parked_bills()
+
+        # Footer
+        footer = tb.Label(self.window, text=f"Developed by {profile['name']}",
+                          font=("Segoe UI", 10, "italic"), bootstyle="secondary")
+        footer.pack(side="bottom", fill="x", pady=5)
+
+
+# ------------------ Host Process ------------------
+def save_all_catalogs():
+    """Saves every open catalog; registered to run on program exit."""
+    for shop_catalog in catalog.all_catalogs():
+        shop_catalog.save()
+
+
+def run(profile_keys, lanes=1):
+    """Opens one window per lane for each store profile and runs the app."""
+    profiles = store_profiles.load_profiles()
+    selected = [profiles[key] for key in profile_keys]
+
+    # ttkbootstrap has one theme per process, so the first store picks it.
+    root = tb.Window(themename=selected[0]["theme"])
+    windows = []
+    for profile in selected:
+        for terminal in range(1, lanes + 1):
+            window = root if not windows else tb.Toplevel(root)
+            windows.append(ShopWindow(window, billing.Lane(profile, terminal)))
+
+    # Stock sync with other branches, once per catalog
+    synced = set()
+    for profile in selected:
+        if profile["sync"] and profile["catalog"] not in synced:
+            synced.add(profile["catalog"])
+            stock_sync.start(profile)
+        # Receipts left in the outbox by an earlier run go out now
+        if profile["mail"]:
+            receipt_mail.get_outbox(profile)
+
+    for shop_catalog in catalog.all_catalogs():
+        if shop_catalog.created:
+            messagebox.showinfo("Stock", f"Default stock data created in {shop_catalog.path}.")
+        # Pick up edits of the catalog file made by other programs
+        shop_catalog.watch()
+    # Returns cut short last time get their stock back now
+    for profile in selected:
+        returns.finish_restocking(catalog.get_catalog(profile["catalog"], profile["default_catalog"]),
+                                  profile["name"])
+
+    # Save stock on program exit, after open and parked bills give theirs back
+    def release_lanes():
+        for shop_window in windows:
+            shop_window.lane.release_all()
+
+    atexit.register(save_all_catalogs)
+    atexit.register(customers.close_all)
+    atexit.register(release_lanes)
+
+    root.mainloop()
+
+
+def main(default_profiles):
+    """Command line entry point shared by the shop launchers."""
+    parser = argparse.ArgumentParser(description="Shop bill generator")
+    parser.add_argument("profiles", nargs="*", default=default_profiles,
+                        help="store profiles from store_profiles.json to open")
+    parser.add_argument("--lanes", type=int, default=1, help="checkout lanes per store")
+    args = parser.parse_args()
+    run(args.profiles, args.lanes)
+
+
+if __name__ == "__main__":
+    main(["vazhga"])
@@ -0,0 +1,150 @@
+import csv
+import heapq
+import itertools
+import threading
+
+# ------------------ Low Stock Alerts ------------------
+# Each product may carry a "reorder_level" (products without one use the
+# store's default). The index holds only the products at or below their level
+# and is updated from the catalog's change notifications, so showing alerts or
+# exporting the reorder list never walks the whole catalog.
+#
+# The index is filled the first time it is asked for, not when a lane opens.
+# For a snapshot catalog that reads only the stock column (snapshot products
+# have no reorder level of their own), so opening a large snapshot stays fast.
+_indexes = {}
+_registry_lock = threading.Lock()
+
+
+class LowStockIndex:
+    """Products at or below their reorder level, most urgent first."""
+
+    def __init__(self, shop_catalog, default_level=0):
+        self.catalog = shop_catalog
+        self.default_level = default_level
+        self.low = {}
+        self.heap = []
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        # Bumped whenever the alert list changes, so screens know to redraw
+        self.version = 0
+        self.built = False
+        # Products changed while the index is being filled
+        self.building = False
+        self.pending = set()
+        self.build_lock = threading.Lock()
+        shop_catalog.listeners.append(self.update)
+
+    def build(self):
+        """Finds the low products on first use."""
+        if self.built:
+            return
+        # The catalog lock is never taken while holding self.lock, since
+        # listeners take self.lock while the catalog lock may be held.
+        with self.build_lock:
+            if self.built:
+                return
+            with self.lock:
+                self.building = True
+            products = self.catalog.products
+            with self.catalog.lock:
+                if hasattr(products, "at_or_below"):
+                    # Products with a level of their own are checked against it
+                    names = list(products.at_or_below(self.default_level)) + list(products.added) + \
+                        [name for name, fields in products.extras.items() if "reorder_level" in fields]
+                else:
+                    names = list(products)
+            with self.lock:
+                self.check(dict.fromkeys(names + list(self.pending)))
+                self.pending = set()
+                self.building = False
+                self.built = True
+
+    def level(self, product):
+        level = product.get("reorder_level")
+        return self.default_level if level is None else level
+
+    def update(self, names):
+        """Re-checks the given products after their stock or level changed."""
+        with self.lock:
+            if self.built:
+                self.check(names)
+            elif self.building:
+                self.pending.update(names)
+
+    def check(self, names):
+        """Updates the index for the given products; call with the lock held."""
+        products = self.catalog.products
+        for name in names:
+            product = products.get(name)
+            was_low = name in self.low
+            if product is not None and product["stock"] <= self.level(product):
+                # How far below the level it is; smaller is more urgent.
+                urgency = product["stock"] - self.level(product)
+                if self.low.get(name) != urgency:
+                    self.low[name] = urgency
+                    heapq.heappush(self.heap, (urgency, next(self.counter), name))
+                    self.version += 1
+            elif was_low:
+                del self.low[name]
+                self.version += 1
+        if len(self.heap) > 2 * len(self.low) + 16:
+            # Mostly stale entries, e.g. from a low product sold all shift: start afresh
+            self.heap = [(urgency, next(self.counter), name) for name, urgency in self.low.items()]
+            heapq.heapify(self.heap)
+
+    def count(self):
+        """Returns how many products are low."""
+        self.build()
+        with self.lock:
+            return len(self.low)
+
+    def most_urgent(self, count=10):
+        """Returns up to count (name, stock, reorder level) rows, most urgent first."""
+        self.build()
+        with self.lock:
+            # Pop until enough live entries are found; stale ones are dropped
+            # for good, live ones go back on the heap.
+            taken = []
+            seen = set()
+            while self.heap and len(taken) < count:
+                entry = heapq.heappop(self.heap)
+                urgency, _, name = entry
+                if self.low.get(name) != urgency or name in seen:
+                    continue
+                seen.add(name)
+                taken.append(entry)
+            for entry in taken:
+                heapq.heappush(self.heap, entry)
+        rows = [name for _, _, name in taken]
+        products = self.catalog.products
+        return [(name, products[name]["stock"], self.level(products[name])) for name in rows if name in products]
+
+    def all_low(self):
+        """Returns every low product as (name, stock, reorder level), most urgent first."""
+        self.build()
+        with self.lock:
+            names = sorted(self.low, key=self.low.get)
+        products = self.catalog.products
+        return [(name, products[name]["stock"], self.level(products[name])) for name in names if name in products]
+
+    def export_reorder_list(self, path):
+        """Writes the products to reorder, with a suggested order quantity, as CSV."""
+        rows = self.all_low()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("name", "stock", "reorder_level", "order_qty"))
+            for name, stock, level in rows:
+                product = self.catalog.products.get(name, {})
+                order_qty = product.get("reorder_qty") or max(2 * level - stock, level, 1)
+                writer.writerow((name, stock, level, order_qty))
+        return len(rows)
+
+
+def get_index(shop_catalog, default_level=0):
+    """Returns the low stock index shared by every lane on a catalog."""
+    with _registry_lock:
+        index = _indexes.get(id(shop_catalog))
+        if index is None:
+            index = _indexes[id(shop_catalog)] = LowStockIndex(shop_catalog, default_level)
+        return index
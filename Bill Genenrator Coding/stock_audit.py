@@ -0,0 +1,292 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import bill_archive
+import bill_records
+import catalog
+import receipt
+
+# ------------------ Stock and Archive Audit ------------------
+# Checks that the stock agrees with what was billed and that the bill archive
+# is intact and complete.
+#
+# Stock: what each product should have is the last baseline in the catalog's
+# adjustment journal, minus everything sold since (from the bill records),
+# plus the journalled adjustments since (see catalog.py). Any difference from
+# the catalog is drift. Bills still open or parked on a running lane hold
+# stock back, so audit with the lanes idle. A catalog with no baseline yet is
+# reported as such; --accept takes one.
+#
+# Bills: every archived bill is rebuilt and checked against the SHA-256 it was
+# stored with; a bill archived for a store that archives every receipt but
+# missing from the archive, and an archived bill with no record, are reported.
+# Loose bill_*.pdf files are checked for a complete PDF structure.
+#
+# The work is split by day: each worker process reads one day's record file
+# and checks that day's archive container.
+audit_dir = "audits"
+# Recompressed streams kept per container while verifying
+STREAM_CACHE_LIMIT = 64 * 1024 * 1024
+# Receipts saved before bill records existed
+LEGACY_NAME = re.compile(r"bill_\d{8}_\d{6}\.pdf")
+
+
+def shard_days():
+    """Returns {YYYYMMDD: container path} for the whole archive."""
+    days = {}
+    for folder, _, filenames in os.walk(bill_archive.archive_dir):
+        for filename in filenames:
+            match = re.fullmatch(r"bills_(\d{8})\.bpk", filename)
+            if match:
+                days[match.group(1)] = os.path.join(folder, filename)
+    return days
+
+
+def audit_day(day, shard_path, stores, archiving):
+    """Audits one day; runs in a worker process.
+
+    stores maps a store name to (catalog key, baseline date) for the stock
+    check; archiving is the set of stores whose every bill should be archived.
+    """
+    result = {"day": day, "sold": {}, "records": 0, "archived": 0,
+              "missing": [], "unaccounted": [], "corrupt": [], "damaged": None}
+    expected = set()
+    recorded = set()
+    path = bill_records.record_path(day)
+    if os.path.exists(path):
+        for record in bill_records.iter_file(path):
+            result["records"] += 1
+            name = receipt.bill_filename(record["bill_id"])
+            recorded.add(name)
+            if record["store"] in archiving:
+                expected.add(name)
+            audited = stores.get(record["store"])
+            # A bill in the same second as the baseline came after it (baselines are taken with lanes idle)
+            if audited is None or record["date"] < audited[1]:
+                continue
+            sold = result["sold"].setdefault(audited[0], {})
+            for product, qty, price, item_total in record["items"]:
+                sold[product] = sold.get(product, 0) + qty
+
+    archived = set()
+    if shard_path:
+        try:
+            shard = bill_archive.Shard(shard_path)
+        except (OSError, ValueError) as e:
+            result["damaged"] = str(e)
+            shard = None
+        if shard is not None:
+            size = os.path.getsize(shard_path)
+            if shard.end < size:
+                result["damaged"] = f"{size - shard.end} bytes after the last complete record"
+            compressed = {}
+            for name in shard.bills:
+                archived.add(name)
+                try:
+                    intact = shard.verify(name, compressed)
+                except (KeyError, OSError, ValueError, struct.error, zlib.error):
+                    intact = False
+                if not intact:
+                    result["corrupt"].append(name)
+                if sum(len(body) for body in compressed.values()) > STREAM_CACHE_LIMIT:
+                    compressed.clear()
+    result["archived"] = len(archived)
+    result["missing"] = sorted(expected - archived)
+    result["unaccounted"] = sorted(archived - recorded)
+    return result
+
+
+def check_pdf(path):
+    """Returns why a loose PDF file is damaged, or None if it looks complete."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        return str(e)
+    if not data.startswith(b"%PDF-"):
+        return "not a PDF"
+    tail = data[-1024:]
+    if b"%%EOF" not in tail:
+        return "cut short (no %%EOF)"
+    match = re.search(rb"startxref\s+(\d+)", tail)
+    if not match:
+        return "no startxref"
+    xref = int(match.group(1))
+    if not (data.startswith(b"xref", xref) or re.match(rb"\d+ \d+ obj", data[xref:xref + 20])):
+        return "cross-reference table is not where the trailer says"
+    return None
+
+
+def check_loose(paths):
+    """Checks a chunk of loose PDFs; runs in a worker process."""
+    return [(path, check_pdf(path)) for path in paths]
+
+
+class Audit:
+    """The findings of one audit run."""
+
+    def __init__(self):
+        self.drift = {}
+        self.records = 0
+        self.archived = 0
+        self.missing = []
+        self.unaccounted = []
+        self.corrupt = []
+        self.damaged = []
+        self.loose = 0
+        self.loose_damaged = []
+        self.loose_unrecorded = []
+        self.loose_legacy = 0
+
+    def report(self):
+        lines = [f"Audit of {datetime.now():%d-%m-%Y %H:%M:%S}",
+                 f"{self.records} bill records, {self.archived} archived bills, {self.loose} loose PDF files "
+                 f"({self.loose_legacy} from before bill records were kept)", ""]
+        for catalog_path, drift in self.drift.items():
+            lines.append(f"Stock drift in {catalog_path}:")
+            if drift is None:
+                lines.append("  not checked: no baseline yet (run with --accept to take the current stock)")
+                continue
+            if not drift:
+                lines.append("  none")
+            for product, (expected, actual) in sorted(drift.items()):
+                lines.append(f"  {product:25} expected {expected:>7} actual {actual:>7} "
+                             f"drift {actual - expected:+d}")
+        sections = [
+            ("Corrupt archived bills", self.corrupt),
+            ("Damaged archive containers", self.damaged),
+            ("Bills missing from the archive", self.missing),
+            ("Archived bills with no record", self.unaccounted),
+            ("Damaged loose PDF files", self.loose_damaged),
+            ("Loose PDF files with no record", self.loose_unrecorded),
+        ]
+        for title, entries in sections:
+            lines.append(f"{title}: {len(entries)}")
+            lines.extend(f"  {entry}" for entry in entries[:200])
+            if len(entries) > 200:
+                lines.append(f"  ... and {len(entries) - 200} more")
+        return "\n".join(lines) + "\n"
+
+
+def read_journal(shop_catalog):
+    """Returns (baseline date, baseline stock, adjustments since) from a catalog's journal."""
+    since, baseline, adjustments = "", {}, {}
+    try:
+        f = open(shop_catalog.journal_path(), "rb")
+    except FileNotFoundError:
+        return since, baseline, adjustments
+    with f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            entry = json.loads(line)
+            if "baseline" in entry:
+                since, baseline, adjustments = entry["date"], entry["baseline"], {}
+            else:
+                adjustments[entry["product"]] = adjustments.get(entry["product"], 0) + entry["delta"]
+    return since, baseline, adjustments
+
+
+def run_audit(profiles, all_profiles, workers=None, loose_dir="."):
+    """Audits the stock of the given profiles' catalogs and the whole bill archive."""
+    audit = Audit()
+    catalogs = {}
+    stores = {}
+    for profile in profiles:
+        shop_catalog = catalog.get_catalog(profile["catalog"], profile["default_catalog"])
+        key = os.path.abspath(shop_catalog.path)
+        if key not in catalogs:
+            catalogs[key] = (shop_catalog, read_journal(shop_catalog))
+    for profile in all_profiles:
+        key = os.path.abspath(profile["catalog"])
+        if key in catalogs:
+            stores[profile["name"]] = (key, catalogs[key][1][0])
+    archiving = {profile["name"] for profile in all_profiles if not profile["render_on_demand"]}
+
+    shards = shard_days()
+    days = sorted(set(bill_records.record_days()) | set(shards))
+    loose = sorted(os.path.join(loose_dir, filename) for filename in os.listdir(loose_dir)
+                   if filename.startswith("bill_") and filename.endswith(".pdf"))
+    sold = {key: {} for key in catalogs}
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        day_results = [pool.submit(audit_day, day, shards.get(day), stores, archiving) for day in days]
+        loose_results = [pool.submit(check_loose, loose[i:i + 200]) for i in range(0, len(loose), 200)]
+        for future in day_results:
+            result = future.result()
+            audit.records += result["records"]
+            audit.archived += result["archived"]
+            audit.missing += result["missing"]
+            audit.unaccounted += result["unaccounted"]
+            audit.corrupt += result["corrupt"]
+            if result["damaged"]:
+                audit.damaged.append(f"{shards[result['day']]}: {result['damaged']}")
+            for key, products in result["sold"].items():
+                for product, qty in products.items():
+                    sold[key][product] = sold[key].get(product, 0) + qty
+        for future in loose_results:
+            for path, problem in future.result():
+                audit.loose += 1
+                if problem:
+                    audit.loose_damaged.append(f"{path}: {problem}")
+
+    for path in loose:
+        filename = os.path.basename(path)
+        if LEGACY_NAME.fullmatch(filename):
+            audit.loose_legacy += 1
+            continue
+        try:
+            if bill_records.get_record(filename[len("bill_"):-len(".pdf")]) is not None:
+                continue
+        except ValueError:
+            pass
+        audit.loose_unrecorded.append(path)
+
+    for key, (shop_catalog, (since, baseline, adjustments)) in catalogs.items():
+        if not since:
+            audit.drift[shop_catalog.path] = None
+            continue
+        with shop_catalog.lock:
+            actual = {name: data["stock"] for name, data in shop_catalog.products.items()}
+        drift = {}
+        for product in set(actual) | set(baseline) | set(adjustments) | set(sold[key]):
+            expected = baseline.get(product, 0) + adjustments.get(product, 0) - sold[key].get(product, 0)
+            if expected != actual.get(product, 0):
+                drift[product] = (expected, actual.get(product, 0))
+        audit.drift[shop_catalog.path] = drift
+    return audit
+
+
+if __name__ == "__main__":
+    import store_profiles
+
+    parser = argparse.ArgumentParser(description="Check stock against billed sales and verify the bill archive.")
+    parser.add_argument("profiles", nargs="*", help="store profiles whose stock to check (default: all)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--loose-dir", default=".", help="folder with loose bill_*.pdf files")
+    parser.add_argument("--accept", action="store_true",
+                        help="after the audit, take the current stock as the new baseline")
+    args = parser.parse_args()
+
+    every_profile = list(store_profiles.load_profiles().values())
+    chosen = [store_profiles.get_profile(key) for key in args.profiles] or every_profile
+    started = datetime.now()
+    findings = run_audit(chosen, every_profile, args.workers, args.loose_dir)
+    text = findings.report()
+    print(text)
+    os.makedirs(audit_dir, exist_ok=True)
+    report_path = os.path.join(audit_dir, f"audit_{started:%Y%m%d_%H%M%S}.txt")
+    with open(report_path, "w", encoding="utf-8") as report_file:
+        report_file.write(text)
+    print(f"Saved to {report_path} ({(datetime.now() - started).total_seconds():.1f}s).")
+    if args.accept:
+        for accepted in {os.path.abspath(profile["catalog"]): profile for profile in chosen}.values():
+            catalog.get_catalog(accepted["catalog"], accepted["default_catalog"]).log_baseline()
+        print("Current stock taken as the new baseline.")
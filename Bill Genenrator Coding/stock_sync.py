@@ -0,0 +1,373 @@
+import argparse
+import json
+from array import array
+import os
+import socket
+import socketserver
+import threading
+import time
+
+import catalog
+
+# ------------------ Stock Sync Between Branches ------------------
+# Every node (a branch or the back office) turns its own stock changes into
+# deltas: {"node", "seq", "product", "delta"}, numbered 1, 2, 3... per node.
+# Nodes exchange the deltas the other side has not seen yet and add them to
+# their stock. Adding deltas gives the same result in any order, so all nodes
+# end up with the same stock however often, late or in which order they sync.
+# What a node has seen is a version vector: the last seq applied per node.
+#
+# Local changes are found by comparing the catalog with the stock as of the
+# last sync (the "shadow"), so sales, stock edits and imports made while a node
+# was offline, or even without syncing switched on, are all picked up.
+#
+# A node keeps, in sync_dir:
+#   <node>_log.jsonl    every delta it knows, its own and other nodes'
+#   <node>_state.json   its last seq, version vector and shadow stock
+#
+# Transports: a shared folder, where each node appends its own deltas to
+# <node>.jsonl and reads the other nodes' files, or a TCP socket, where two
+# nodes swap version vectors and send each other what is missing.
+#
+# Each node's deltas are in its log in seq order, so a node keeps where every
+# delta starts in the log, per origin node, and answers "what is newer than
+# this version vector" by reading from the oldest delta the other side lacks
+# instead of from the top of the log.
+sync_dir = "sync"
+_syncs = {}
+_registry_lock = threading.Lock()
+
+
+def read_ops(path, offset=0):
+    """Returns (deltas, new offset) of the complete lines after offset."""
+    ops = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            ops.append(json.loads(line))
+            offset += len(line)
+    return ops, offset
+
+
+def append_ops(path, ops):
+    with open(path, "ab") as f:
+        for op in ops:
+            f.write((json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class StockSync:
+    """The sync state of one catalog on one node."""
+
+    def __init__(self, shop_catalog, node):
+        self.catalog = shop_catalog
+        self.node = node
+        self.lock = threading.RLock()
+        self.log_path = os.path.join(sync_dir, f"{node}_log.jsonl")
+        self.state_path = os.path.join(sync_dir, f"{node}_state.json")
+        self.dirty = set()
+        # {origin node: offsets in the log of its deltas seq 1, 2, 3...}, up to log_end
+        self.starts = {}
+        self.log_end = 0
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+            self.seq = state["seq"]
+            self.seen = state["seen"]
+            self.shadow = state["shadow"]
+            self.pushed = state.get("pushed", {})
+            self.offsets = state.get("offsets", {})
+            # Pick up whatever changed since the last run
+            with shop_catalog.lock:
+                self.dirty.update(shop_catalog.products)
+            self.dirty.update(self.shadow)
+        except FileNotFoundError:
+            # A new node starts from its current stock, with nothing to send
+            self.seq = 0
+            self.seen = {}
+            with shop_catalog.lock:
+                self.shadow = {name: data["stock"] for name, data in shop_catalog.products.items()}
+            self.pushed = {}
+            self.offsets = {}
+            os.makedirs(sync_dir, exist_ok=True)
+            self.save_state()
+        shop_catalog.listeners.append(self.mark)
+
+    def mark(self, names):
+        """Catalog listener: these products need checking at the next commit."""
+        self.dirty.update(names)
+
+    def save_state(self):
+        state = {"node": self.node, "seq": self.seq, "seen": self.seen, "shadow": self.shadow,
+                 "pushed": self.pushed, "offsets": self.offsets}
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def version_vector(self):
+        with self.lock:
+            return dict(self.seen, **{self.node: self.seq})
+
+    def commit(self):
+        """Turns the stock changes made on this node since the last commit into deltas."""
+        with self.lock, self.catalog.lock:
+            names, self.dirty = self.dirty, set()
+            if not names:
+                return 0
+            products = self.catalog.products
+            ops = []
+            for name in sorted(names):
+                product = products.get(name)
+                if product is None:
+                    continue
+                new = name not in self.shadow
+                delta = product["stock"] - self.shadow.get(name, 0)
+                if delta or new:
+                    self.seq += 1
+                    op = {"node": self.node, "seq": self.seq, "product": name, "delta": delta}
+                    if new:
+                        # Lets other nodes create the product if they lack it
+                        op["price"] = product["price"]
+                    ops.append(op)
+                    self.shadow[name] = product["stock"]
+            if ops:
+                append_ops(self.log_path, ops)
+                self.save_state()
+            return len(ops)
+
+    def apply(self, ops):
+        """Adds other nodes' deltas to the stock. Returns how many were new."""
+        with self.lock:
+            self.commit()
+            applied = []
+            changed = set()
+            received = {}
+            with self.catalog.lock:
+                products = self.catalog.products
+                # Each node's deltas go in seq order; anything already seen is skipped
+                for op in sorted(ops, key=lambda op: (op["node"], op["seq"])):
+                    origin = op["node"]
+                    if origin == self.node or op["seq"] != self.seen.get(origin, 0) + 1:
+                        continue
+                    name = op["product"]
+                    if name not in products:
+                        products[name] = {"price": op.get("price", 0), "stock": 0}
+                        self.shadow.setdefault(name, 0)
+                    products[name]["stock"] += op["delta"]
+                    self.shadow[name] = self.shadow.get(name, 0) + op["delta"]
+                    self.seen[origin] = op["seq"]
+                    applied.append(op)
+                    changed.add(name)
+                    deltas = received.setdefault(origin, {})
+                    deltas[name] = deltas.get(name, 0) + op["delta"]
+                for origin, deltas in received.items():
+                    self.catalog.log_adjustments(deltas, f"sync from {origin}")
+                if applied:
+                    append_ops(self.log_path, applied)
+                    self.save_state()
+            if applied:
+                # Outside the catalog lock, so listeners of merged outside edits are not held up
+                self.catalog.save()
+            if changed:
+                self.catalog.changed(sorted(changed))
+            return len(applied)
+
+    def index_log(self):
+        """Notes where the deltas appended to the log since last time start."""
+        try:
+            f = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(self.log_end)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.starts.setdefault(json.loads(line)["node"], array("q")).append(self.log_end)
+                self.log_end += len(line)
+
+    def ops_since(self, vector):
+        """Returns every known delta newer than a version vector."""
+        with self.lock:
+            self.commit()
+            self.index_log()
+            start = self.log_end
+            for origin, starts in self.starts.items():
+                known = vector.get(origin, 0)
+                if known < len(starts):
+                    start = min(start, starts[known])
+            if start == self.log_end:
+                return []
+            ops, _ = read_ops(self.log_path, start)
+        return [op for op in ops if op["seq"] > vector.get(op["node"], 0)]
+
+    # ------------------ Shared Folder ------------------
+    def sync_directory(self, shared_dir):
+        """Swaps deltas with the other nodes using a shared folder. Returns (sent, received)."""
+        key = os.path.abspath(shared_dir)
+        with self.lock:
+            self.commit()
+            own_file = os.path.join(shared_dir, f"{self.node}.jsonl")
+            pushed = self.pushed.get(key, 0)
+            outgoing = [op for op in self.ops_since({self.node: pushed}) if op["node"] == self.node]
+            if outgoing:
+                append_ops(own_file, outgoing)
+                self.pushed[key] = outgoing[-1]["seq"]
+                self.save_state()
+
+            received = 0
+            offsets = self.offsets.setdefault(key, {})
+            for filename in sorted(os.listdir(shared_dir)):
+                origin, extension = os.path.splitext(filename)
+                if extension != ".jsonl" or origin == self.node:
+                    continue
+                ops, offsets[origin] = read_ops(os.path.join(shared_dir, filename), offsets.get(origin, 0))
+                received += self.apply(ops)
+            self.save_state()
+            return len(outgoing), received
+
+    # ------------------ Socket ------------------
+    def exchange(self, stream):
+        """Client side of a socket sync. Returns (sent, received)."""
+        send_line(stream, {"node": self.node, "vv": self.version_vector()})
+        incoming = []
+        while True:
+            message = read_line(stream)
+            if "done" in message:
+                break
+            incoming.append(message)
+        received = self.apply(incoming)
+        outgoing = self.ops_since(message["vv"])
+        for op in outgoing:
+            send_line(stream, op)
+        send_line(stream, {"done": True})
+        return len(outgoing), received
+
+    def answer(self, stream):
+        """Server side of a socket sync."""
+        hello = read_line(stream)
+        for op in self.ops_since(hello["vv"]):
+            send_line(stream, op)
+        send_line(stream, {"done": True, "vv": self.version_vector()})
+        incoming = []
+        while True:
+            message = read_line(stream)
+            if "done" in message:
+                break
+            incoming.append(message)
+        self.apply(incoming)
+
+    def sync_with(self, host, port, timeout=30):
+        """Swaps deltas with a node listening on host:port. Returns (sent, received)."""
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            with sock.makefile("rwb") as stream:
+                return self.exchange(stream)
+
+    def serve(self, host="127.0.0.1", port=9301):
+        """Starts answering sync requests in a background thread; returns the server."""
+        node_sync = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    node_sync.answer(self)
+                except (OSError, ValueError, KeyError):
+                    pass
+
+        server = socketserver.ThreadingTCPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="stock-sync", daemon=True).start()
+        return server
+
+
+def send_line(stream, message):
+    writer = stream.wfile if hasattr(stream, "wfile") else stream
+    writer.write((json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+    writer.flush()
+
+
+def read_line(stream):
+    reader = stream.rfile if hasattr(stream, "rfile") else stream
+    line = reader.readline()
+    if not line.endswith(b"\n"):
+        raise ConnectionError("Sync connection closed early.")
+    return json.loads(line)
+
+
+def get_sync(shop_catalog, node):
+    """Returns the sync state of a catalog on this node."""
+    with _registry_lock:
+        node_sync = _syncs.get(id(shop_catalog))
+        if node_sync is None:
+            node_sync = _syncs[id(shop_catalog)] = StockSync(shop_catalog, node)
+        return node_sync
+
+
+def sync_once(node_sync, settings):
+    """Syncs with the shared folder and peers of a profile's sync settings, skipping unreachable ones."""
+    sent = received = 0
+    errors = []
+    targets = ([("dir", settings["dir"])] if settings.get("dir") else []) + \
+              [("peer", peer) for peer in settings.get("peers", [])]
+    for kind, target in targets:
+        try:
+            if kind == "dir":
+                counts = node_sync.sync_directory(target)
+            else:
+                host, _, port = target.rpartition(":")
+                counts = node_sync.sync_with(host, int(port))
+        except (OSError, ValueError) as e:
+            # Offline: the deltas stay in the log until the next attempt
+            errors.append(f"{target}: {e}")
+            continue
+        sent += counts[0]
+        received += counts[1]
+    return sent, received, errors
+
+
+def start(profile):
+    """Starts background syncing for a store profile with "sync" settings."""
+    settings = profile["sync"]
+    shop_catalog = catalog.get_catalog(profile["catalog"], profile["default_catalog"])
+    node_sync = get_sync(shop_catalog, settings["node"])
+    if settings.get("listen"):
+        host, _, port = settings["listen"].rpartition(":")
+        node_sync.serve(host or "127.0.0.1", int(port))
+
+    def loop():
+        while True:
+            sync_once(node_sync, settings)
+            time.sleep(settings.get("interval", 60))
+
+    threading.Thread(target=loop, name="stock-sync-loop", daemon=True).start()
+    return node_sync
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync stock changes with other branches.")
+    parser.add_argument("catalog", help="catalog file, e.g. stock.json")
+    parser.add_argument("--node", required=True, help="this branch's unique node name")
+    parser.add_argument("--dir", help="shared folder to sync through")
+    parser.add_argument("--peer", action="append", default=[], help="host:port of a node to sync with")
+    parser.add_argument("--listen", help="host:port to answer sync requests on (keeps running)")
+    args = parser.parse_args()
+
+    shop_sync = get_sync(catalog.get_catalog(args.catalog), args.node)
+    if args.listen:
+        listen_host, _, listen_port = args.listen.rpartition(":")
+        shop_sync.serve(listen_host or "127.0.0.1", int(listen_port))
+    sent_count, received_count, problems = sync_once(shop_sync, {"dir": args.dir, "peers": args.peer})
+    print(f"Sent {sent_count} and received {received_count} stock changes.")
+    for problem in problems:
+        print(f"Could not sync with {problem}")
+    if args.listen:
+        print(f"Answering sync requests on {args.listen}. Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,64 @@
+import json
+
+# ------------------ Store Profiles ------------------
+# A profile declares everything that differs between shops: name, theme,
+# receipt layout, catalog source and bill numbering. See store_profiles.json.
+profiles_file = "store_profiles.json"
+
+defaults = {
+    "icon": "",
+    "theme": "darkly",
+    "heading_font": ["Segoe UI", 28, "bold"],
+    "panel_style": "secondary",
+    "tile_style": "info-outline",
+    "button_icons": False,
+    "add_product": False,
+    "layout": "a4",
+    "catalog": "stock.json",
+    "default_catalog": {},
+    "numbering": {"prefix": ""},
+    # Products without their own reorder_level alert at or below this stock
+    "reorder_level": 5,
+    # Only the bill record is written at checkout; the PDF is rendered the first
+    # time it is viewed, printed or exported. Set to false to archive every PDF.
+    "render_on_demand": True,
+    # Parked bills give their reserved stock back after this many minutes
+    "park_minutes": 30,
+    # Scheduled prices (see price_lists.py), e.g. "price_lists.json"; null for catalog prices only
+    "price_lists": None,
+    # Offers (see promotions.py), e.g. "promotions.json"; null for none
+    "promotions": None,
+    # Stock sync with other branches, e.g. {"node": "branch-1", "dir": "//server/sync",
+    # "peers": ["192.168.1.20:9301"], "listen": "0.0.0.0:9301", "interval": 60}
+    "sync": None,
+    # E-mailed receipts (see receipt_mail.py), e.g. {"host": "smtp.example.com", "port": 587,
+    # "starttls": true, "user": "...", "password": "...", "sender": "bills@example.com"}
+    "mail": None,
+    # GST (see gst_export.py): the store's GSTIN and the rate of products without their own gst_rate
+    "gstin": "",
+    "gst_rate": 5,
+    "prices_include_gst": True,
+}
+
+
+def load_profiles(path=None):
+    """Loads all store profiles, filling in defaults for missing settings."""
+    with open(path or profiles_file, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    profiles = {}
+    for key, settings in raw.items():
+        if "name" not in settings:
+            raise ValueError(f"Store profile '{key}' has no name.")
+        profile = dict(defaults)
+        profile.update(settings)
+        profile["key"] = key
+        profiles[key] = profile
+    return profiles
+
+
+def get_profile(key, path=None):
+    """Returns one store profile by its key."""
+    profiles = load_profiles(path)
+    if key not in profiles:
+        raise KeyError(f"No store profile named '{key}'. Known profiles: {', '.join(profiles)}")
+    return profiles[key]
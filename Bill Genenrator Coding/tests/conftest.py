@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# The modules live one folder up and keep their data in folders relative to
+# the working directory, so every test runs in its own empty folder.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,113 @@
+import os
+import zlib
+
+import pytest
+
+import bill_archive
+
+
+def make_pdf(text, font=b"FONT" * 500):
+    """A small PDF with a font stream shared between bills and a content stream of its own."""
+    objects = []
+    for body in (zlib.compress(font, 6), zlib.compress(text, 9)):
+        objects.append(b"%d 0 obj\n<</Length %d /Filter /FlateDecode>>stream\n" % (len(objects) + 1, len(body))
+                       + body + b"\nendstream\nendobj\n")
+    return b"%PDF-1.3\n" + b"".join(objects) + b"trailer\n%%EOF\n"
+
+
+@pytest.fixture(autouse=True)
+def fresh_shards():
+    bill_archive._shards.clear()
+    yield
+    bill_archive._shards.clear()
+
+
+def reopen(path):
+    bill_archive._shards.clear()
+    return bill_archive.Shard(path)
+
+
+def test_round_trip_with_shared_streams_and_aliases():
+    bills = {f"bill_X1-20250101-{n:05d}.pdf": make_pdf(b"BT (bill %d) Tj ET" % n) for n in range(1, 4)}
+    for name, data in bills.items():
+        bill_archive.store_bill(name, data)
+    bill_archive.store_bill("bill_X1-20250101-00009.pdf", bills["bill_X1-20250101-00001.pdf"])
+    path = bill_archive.shard_path("bill_X1-20250101-00001.pdf")
+
+    shard = reopen(path)
+    assert shard.end == os.path.getsize(path)
+    assert shard.bills["bill_X1-20250101-00009.pdf"][0] == b"A"
+    for name, data in bills.items():
+        assert bill_archive.read_bill(name) == data
+        assert shard.verify(name)
+    assert bill_archive.read_bill("bill_X1-20250101-00009.pdf") == bills["bill_X1-20250101-00001.pdf"]
+
+
+def test_torn_last_record_is_ignored_at_every_cut():
+    first = make_pdf(b"BT (first) Tj ET")
+    last = make_pdf(b"BT (last) Tj ET")
+    bill_archive.store_bill("bill_X1-20250102-00001.pdf", first)
+    path = bill_archive.shard_path("bill_X1-20250102-00001.pdf")
+    intact = os.path.getsize(path)
+    bill_archive.store_bill("bill_X1-20250102-00002.pdf", last)
+    with open(path, "rb") as f:
+        whole = f.read()
+
+    for cut in range(intact, len(whole)):
+        with open(path, "wb") as f:
+            f.write(whole[:cut])
+        shard = reopen(path)
+        assert shard.end <= cut
+        assert "bill_X1-20250102-00002.pdf" not in shard.bills
+        assert all(start + length <= shard.end for start, length in shard.streams.values())
+        assert shard.verify("bill_X1-20250102-00001.pdf")
+
+    # The next write replaces the torn tail
+    bill_archive._shards.clear()
+    bill_archive.store_bill("bill_X1-20250102-00002.pdf", last)
+    assert reopen(path).verify("bill_X1-20250102-00002.pdf")
+    assert bill_archive.read_bill("bill_X1-20250102-00002.pdf") == last
+
+
+def test_torn_name_field_is_not_indexed():
+    bill_archive.store_bill("bill_X1-20250103-00001.pdf", make_pdf(b"BT (one) Tj ET"))
+    path = bill_archive.shard_path("bill_X1-20250103-00001.pdf")
+    size = os.path.getsize(path)
+    # An alias record cut inside its name length, then inside its name
+    name = "bill_X1-20250103-00002.pdf".encode("utf-8")
+    record = bill_archive.RECORD.pack(b"A", 2 + len(name) + 32) + len(name).to_bytes(2, "big") + name
+    for cut in (bill_archive.RECORD.size + 1, bill_archive.RECORD.size + 5):
+        with open(path, "r+b") as f:
+            f.truncate(size)
+            f.seek(size)
+            f.write(record[:cut])
+        shard = reopen(path)
+        assert shard.end == size
+        assert list(shard.bills) == ["bill_X1-20250103-00001.pdf"]
+
+
+def test_two_processes_appending_to_one_day_keep_each_others_bills():
+    path = bill_archive.shard_path("bill_X1-20250104-00001.pdf")
+    # Each Shard stands for the index of its own process
+    app, api = bill_archive.Shard(path), bill_archive.Shard(path)
+    bills = {f"bill_X1-20250104-{n:05d}.pdf": make_pdf(b"BT (bill %d) Tj ET" % n) for n in range(1, 7)}
+    for n, (name, data) in enumerate(bills.items()):
+        (app if n % 2 else api).add(name, data)
+    shard = reopen(path)
+    assert sorted(shard.bills) == sorted(bills)
+    for name, data in bills.items():
+        assert b"".join(shard.parts(name)) == data
+    # A bill another process archived is found without reopening
+    assert b"".join(app.parts("bill_X1-20250104-00001.pdf")) == bills["bill_X1-20250104-00001.pdf"]
+    assert bill_archive.read_bill("bill_X1-20250104-00006.pdf") == bills["bill_X1-20250104-00006.pdf"]
+
+
+def test_damaged_tail_is_never_cut_off():
+    bill_archive.store_bill("bill_X1-20250105-00001.pdf", make_pdf(b"BT (one) Tj ET"))
+    path = bill_archive.shard_path("bill_X1-20250105-00001.pdf")
+    with open(path, "ab") as f:
+        f.write(bill_archive.RECORD.pack(b"Z", 4) + b"junk")
+    size = os.path.getsize(path)
+    with pytest.raises(ValueError):
+        reopen(path).add("bill_X1-20250105-00002.pdf", make_pdf(b"BT (two) Tj ET"))
+    assert os.path.getsize(path) == size
@@ -0,0 +1,111 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import billing
+import catalog
+import customers
+import price_lists
+import shift
+import stock_alerts
+import store_profiles
+
+
+@pytest.fixture(autouse=True)
+def fresh_registries(monkeypatch):
+    monkeypatch.setattr(catalog, "_catalogs", {})
+    monkeypatch.setattr(customers, "_books", {})
+    monkeypatch.setattr(price_lists, "_books", {})
+    monkeypatch.setattr(shift, "_shifts", {})
+    monkeypatch.setattr(stock_alerts, "_indexes", {})
+
+
+def make_lane(**settings):
+    profile = dict(store_profiles.defaults, key="lane", name="Lane Store", numbering={"prefix": "L"},
+                   default_catalog={"Rice": {"price": 50, "stock": 10}, "Dal": {"price": 80, "stock": 10}},
+                   **settings)
+    return billing.Lane(profile)
+
+
+def stock(lane):
+    return {name: data["stock"] for name, data in lane.catalog.products.items()}
+
+
+def write_prices(path, price, mtime):
+    with open(path, "w") as f:
+        json.dump({"lists": [{"version": f"rice-{price}", "from": "2000-01-01T00:00", "prices": {"Rice": price}}]}, f)
+    os.utime(path, (mtime, mtime))
+
+
+def test_expired_parked_bills_give_their_stock_back():
+    lane = make_lane()
+    parked_at = datetime(2025, 10, 1, 10)
+    lane.add_item("Rice", 3)
+    assert lane.park(now=parked_at) == "Cart 1"
+    assert stock(lane) == {"Rice": 7, "Dal": 10} and not lane.bill_items
+    minutes = lane.profile["park_minutes"]
+    assert lane.expire_parked(parked_at + timedelta(minutes=minutes - 1)) == []
+    assert lane.expire_parked(parked_at + timedelta(minutes=minutes)) == ["Cart 1"]
+    assert stock(lane) == {"Rice": 10, "Dal": 10} and not lane.parked
+
+    lane.add_item("Dal", 2)
+    lane.park("Table 4", now=parked_at)
+    with pytest.raises(billing.BillingError):
+        lane.resume("Table 4", now=parked_at + timedelta(minutes=minutes + 1))
+    assert stock(lane) == {"Rice": 10, "Dal": 10}
+
+
+def test_resuming_parks_the_open_bill_in_its_place():
+    lane = make_lane()
+    now = datetime(2025, 10, 1, 10)
+    lane.add_item("Rice", 2)
+    lane.park("Table 4", now=now)
+    lane.add_item("Dal", 1)
+    lane.resume("Table 4", now=now)
+    assert lane.bill_items == [("Rice", 2, 50, 100)] and lane.total == 100 and lane.cart_name == "Table 4"
+    assert list(lane.parked) == ["Cart 1"] and lane.parked["Cart 1"].items == (("Dal", 1, 80, 80),)
+    # Both bills keep their stock reserved
+    assert stock(lane) == {"Rice": 8, "Dal": 9}
+    # Parking the resumed bill again keeps its name
+    assert lane.park(now=now) == "Table 4"
+    lane.resume("Cart 1", now=now)
+    assert lane.total == 80 and sorted(lane.parked) == ["Table 4"]
+
+
+def test_resumed_bill_keeps_its_price_list_and_customer():
+    lane = make_lane(price_lists="prices.json")
+    write_prices("prices.json", 45, 1_000_000)
+    lane.price_book.load()
+    customer = lane.customers.add("Meena", "9000000001")
+    now = datetime(2025, 10, 1, 10)
+
+    lane.set_customer(customer["id"], on_credit=True)
+    lane.add_item("Rice", 1)
+    pinned = lane.prices.revision
+    lane.park("Meena", now=now)
+    assert lane.customer is None and lane.prices is None
+
+    # The price list is edited while the bill is parked; a new bill gets the new prices
+    write_prices("prices.json", 40, 2_000_000)
+    lane.price_book.checked = float("-inf")
+    lane.add_item("Rice", 1)
+    assert lane.bill_items[-1][2] == 40
+    lane.clear()
+
+    lane.resume("Meena", now=now)
+    assert (lane.customer, lane.on_credit, lane.prices.revision) == (customer["id"], True, pinned)
+    lane.add_item("Rice", 1)
+    assert [item[2] for item in lane.bill_items] == [45, 45]
+    assert lane.price_versions == {"Rice": "rice-45"}
+    record = lane.checkout(now)
+    assert (record["price_list"], record["customer"], record["credit"]) == (pinned, customer["id"], True)
+
+
+def test_lane_starts_on_base_prices_with_a_bad_price_list():
+    with open("prices.json", "w") as f:
+        f.write('{"lists": [{"version": "half-saved"')
+    lane = make_lane(price_lists="prices.json")
+    assert lane.price_book.error is not None
+    assert lane.add_item("Rice", 1) == ("Rice", 1, 50, 50)
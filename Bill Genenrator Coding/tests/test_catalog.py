@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+
+import catalog
+
+
+def test_merge_adds_new_products():
+    ours = {"Rice": {"price": 50, "stock": 10}}
+    names = catalog.merge_products({"Rice": {"price": 50, "stock": 10}}, ours,
+                                   {"Rice": {"price": 50, "stock": 10}, "Dal": {"price": 80, "stock": 5}})
+    assert names == ["Dal"]
+    assert ours == {"Rice": {"price": 50, "stock": 10}, "Dal": {"price": 80, "stock": 5}}
+
+
+def test_merge_deletes_only_untouched_products():
+    base = {"Rice": {"price": 50, "stock": 10}, "Dal": {"price": 80, "stock": 5}}
+    # Dal was sold here meanwhile, so it stays
+    ours = {"Rice": {"price": 50, "stock": 10}, "Dal": {"price": 80, "stock": 4}}
+    assert catalog.merge_products(base, ours, {}) == ["Rice"]
+    assert ours == {"Dal": {"price": 80, "stock": 4}}
+
+
+def test_merge_adds_up_stock_movements_on_both_sides():
+    ours = {"Rice": {"price": 50, "stock": 7}}
+    assert catalog.merge_products({"Rice": {"price": 50, "stock": 10}}, ours,
+                                  {"Rice": {"price": 50, "stock": 30}}) == ["Rice"]
+    assert ours["Rice"]["stock"] == 27
+
+
+def test_merge_conflicts_go_to_the_outside_edit():
+    base = {"Rice": {"price": 50, "stock": 10, "hsn": "1006"}}
+    ours = {"Rice": {"price": 55, "stock": 10, "hsn": "1006"}}
+    assert catalog.merge_products(base, ours, {"Rice": {"price": 60, "stock": 10}}) == ["Rice"]
+    assert ours == {"Rice": {"price": 60, "stock": 10}}
+    # A product added on both sides takes their price and both stocks
+    ours = {"Oil": {"price": 200, "stock": 1}}
+    assert catalog.merge_products({}, ours, {"Oil": {"price": 210, "stock": 3}}) == ["Oil"]
+    assert ours == {"Oil": {"price": 210, "stock": 4}}
+
+
+def test_save_merges_outside_edits_and_tells_listeners_after_unlocking():
+    shop_catalog = catalog.Catalog("stock.json", {"Rice": {"price": 50, "stock": 10}})
+    shop_catalog.load()
+    heard = []
+
+    def try_lock(free):
+        free.append(shop_catalog.lock.acquire(timeout=1))
+        if free[-1]:
+            shop_catalog.lock.release()
+
+    def listener(names):
+        # Another thread must be able to take the lock while listeners run
+        free = []
+        thread = threading.Thread(target=try_lock, args=(free,))
+        thread.start()
+        thread.join()
+        heard.append((names, free[0]))
+
+    shop_catalog.listeners.append(listener)
+    with open("stock.json", "w") as f:
+        json.dump({"Rice": {"price": 50, "stock": 25}}, f)
+    os.utime("stock.json", ns=(1, 1))
+    shop_catalog.take("Rice", 1)
+    shop_catalog.save()
+    assert heard == [(["Rice"], True), (["Rice"], True)]
+    with open("stock.json") as f:
+        assert json.load(f)["Rice"]["stock"] == 24
+
+
+def test_write_just_after_save_is_not_missed(monkeypatch):
+    shop_catalog = catalog.Catalog("stock.json", {"Rice": {"price": 50, "stock": 10}})
+    shop_catalog.load()
+    replace = os.replace
+
+    def replace_then_edit(src, dst):
+        replace(src, dst)
+        # Another program saves right after our replace
+        with open(dst, "w") as f:
+            f.write(json.dumps({"Rice": {"price": 50, "stock": 90}}, indent=4))
+        os.utime(dst, ns=(2_000_000_000_000_000_000, 2_000_000_000_000_000_000))
+
+    monkeypatch.setattr(os, "replace", replace_then_edit)
+    shop_catalog.save()
+    monkeypatch.setattr(os, "replace", replace)
+    assert shop_catalog.reload_external() == ["Rice"]
+    assert shop_catalog.products["Rice"]["stock"] == 90
@@ -0,0 +1,33 @@
+import tracemalloc
+
+import catalog
+import catalog_io
+
+
+def write_rows(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("name,price,stock\n")
+        for n in range(count):
+            f.write(f"Item {n},10,{n}\n")
+
+
+def test_dry_run_memory_does_not_grow_with_the_file():
+    shop_catalog = catalog.Catalog("stock.json", {"Item 0": {"price": 10, "stock": 0}})
+    peaks = []
+    for count in (5000, 50000):
+        write_rows("rows.csv", count)
+        tracemalloc.start()
+        result = catalog_io.import_catalog(shop_catalog, "rows.csv", dry_run=True, batch_size=1000)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        assert (result.added, result.unchanged) == (count - 1, 1)
+    assert list(shop_catalog.products) == ["Item 0"]
+    assert peaks[1] < peaks[0] * 2
+
+
+def test_import_applies_every_batch():
+    shop_catalog = catalog.Catalog("stock.json", {"Item 0": {"price": 10, "stock": 0}})
+    write_rows("rows.csv", 2500)
+    result = catalog_io.import_catalog(shop_catalog, "rows.csv", batch_size=1000)
+    assert (result.added, result.unchanged) == (2499, 1)
+    assert shop_catalog.products["Item 2499"] == {"price": 10, "stock": 2499}
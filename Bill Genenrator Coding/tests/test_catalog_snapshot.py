@@ -0,0 +1,101 @@
+import json
+import os
+
+import pytest
+
+import catalog
+import catalog_snapshot
+import stock_alerts
+import stock_audit
+
+
+@pytest.fixture(autouse=True)
+def fresh_catalogs(monkeypatch):
+    monkeypatch.setattr(catalog, "_catalogs", {})
+
+
+PRODUCTS = {
+    "Rice": {"price": 50, "stock": 10, "reorder_level": 20, "hsn": "1006", "gst_rate": 5},
+    "Dal": {"price": 80.5, "stock": 3},
+    "Ghee ₹": {"price": 600, "stock": 0, "hsn": "0405"},
+}
+
+
+def test_json_round_trip_keeps_every_field():
+    with open("stock.json", "w") as f:
+        json.dump(PRODUCTS, f)
+    assert catalog_snapshot.json_to_snapshot("stock.json", "stock.snap") == 3
+    products = catalog_snapshot.SnapshotProducts("stock.snap")
+    assert dict(products["Rice"]) == PRODUCTS["Rice"]
+    assert products["Dal"]["price"] == 80.5 and "Dal" in products and "Oil" not in products
+    assert products["Ghee ₹"].get("reorder_level") is None
+    products.snapshot.close()
+
+    assert catalog_snapshot.snapshot_to_json("stock.snap", "back.json") == 3
+    with open("back.json") as f:
+        assert json.load(f) == PRODUCTS
+
+
+def test_converting_a_catalog_keeps_levels_and_tax_codes():
+    shop_catalog = catalog.Catalog("stock.json", PRODUCTS)
+    shop_catalog.load()
+    shop_catalog.path = "stock.snap"
+    shop_catalog.save()
+    reopened = catalog.Catalog("stock.snap")
+    reopened.load()
+    assert reopened.products["Rice"]["hsn"] == "1006"
+    # Rice is below its own level of 20, though above the default of 5
+    index = stock_alerts.LowStockIndex(reopened, default_level=5)
+    assert [row[0] for row in index.all_low()] == ["Rice", "Ghee ₹", "Dal"]
+    reopened.products.snapshot.close()
+
+
+def test_views_survive_a_rebuild():
+    catalog_snapshot.write_snapshot("stock.snap", [("Rice", 50, 10), ("Dal", 80, 3)])
+    products = catalog_snapshot.SnapshotProducts("stock.snap")
+    rice = products["Rice"]
+    products["Oil"] = {"price": 200, "stock": 4}
+    rice["gst_rate"] = 5
+    products.save()
+    # The old view reads and writes the rebuilt file
+    rice["stock"] -= 1
+    assert dict(rice) == {"price": 50, "stock": 9, "gst_rate": 5}
+    products.save()
+    products.snapshot.close()
+
+    reopened = catalog_snapshot.SnapshotProducts("stock.snap")
+    assert list(reopened) == ["Rice", "Dal", "Oil"]
+    assert dict(reopened["Rice"]) == {"price": 50, "stock": 9, "gst_rate": 5}
+    assert reopened["Oil"]["stock"] == 4
+    reopened.snapshot.close()
+
+
+def test_version_one_files_still_open():
+    catalog_snapshot.write_snapshot("stock.snap", [("Rice", 50, 10)])
+    with open("stock.snap", "r+b") as f:
+        f.seek(4)
+        f.write((1).to_bytes(4, "little"))
+    products = catalog_snapshot.SnapshotProducts("stock.snap")
+    assert dict(products["Rice"]) == {"price": 50, "stock": 10}
+    products.snapshot.close()
+
+
+def test_snapshot_baseline_waits_for_the_first_adjustment():
+    with open("stock.json", "w") as f:
+        json.dump(PRODUCTS, f)
+    catalog_snapshot.json_to_snapshot("stock.json", "stock.snap")
+    shop_catalog = catalog.get_catalog("stock.snap")
+    # Opening reads no products, so no baseline is written yet
+    assert not os.path.exists(shop_catalog.journal_path())
+    shop_catalog.take("Rice", 4)
+    with shop_catalog.lock:
+        shop_catalog.products["Dal"]["stock"] += 7
+        shop_catalog.products["Oil"] = {"price": 150, "stock": 5}
+        shop_catalog.log_adjustments({"Dal": 7, "Oil": 5}, "stock update")
+    assert shop_catalog.products.stocks() == {"Rice": 6, "Dal": 10, "Ghee ₹": 0, "Oil": 5}
+
+    since, baseline, adjustments = stock_audit.read_journal(shop_catalog)
+    # The baseline is the stock from just before the adjustment, sales included
+    assert since and baseline == {"Rice": 6, "Dal": 3, "Ghee ₹": 0, "Oil": 0}
+    assert adjustments == {"Dal": 7, "Oil": 5}
+    shop_catalog.products.snapshot.close()
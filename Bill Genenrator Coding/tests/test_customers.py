@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pytest
+
+import customers
+
+
+def charge(book, customer_id, bill_id, total):
+    return book.charge(customer_id, {"bill_id": bill_id, "total": total, "date": "2025-10-01T10:00:00"})
+
+
+def test_balances_follow_on_from_other_processes_entries():
+    # Two books on the same store stand for the app and the command line
+    app = customers.CustomerBook("s")
+    customer_id = app.add("Meena", "9000000001")["id"]
+    cli = customers.CustomerBook("s")
+    charge(app, customer_id, "S1-20251001-00001", 100)
+    assert cli.pay(customer_id, 50)["balance"] == 50
+    assert charge(app, customer_id, "S1-20251001-00002", 10)["balance"] == 60
+    assert cli.balance(customer_id) == 60
+    app.close()
+    assert customers.CustomerBook("s").balance(customer_id) == 60
+    assert [entry["balance"] for entry in cli.statement(customer_id)] == [100, 50, 60]
+
+
+def test_new_customers_get_distinct_ids_across_processes():
+    app, cli = customers.CustomerBook("s"), customers.CustomerBook("s")
+    first = app.add("Meena", "9000000001", datetime(2025, 10, 1))
+    second = cli.add("Ravi", "9000000002", datetime(2025, 10, 1))
+    assert (first["id"], second["id"]) == ("C000001", "C000002")
+    # The other book's customers can be found, billed and not given away twice
+    with pytest.raises(ValueError, match="Ravi"):
+        app.add("Someone Else", "9000000002")
+    assert app.add("Lakshmi", "9000000003")["id"] == "C000003"
+    assert charge(app, "C000002", "S1-20251001-00001", 30)["balance"] == 30
+    assert [customer["id"] for customer in customers.CustomerBook("s").find("9000")] == \
+        ["C000001", "C000002", "C000003"]
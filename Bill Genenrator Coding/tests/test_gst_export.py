@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+import bill_records
+import catalog
+import customers
+import gst_export
+import returns
+import store_profiles
+
+
+@pytest.fixture(autouse=True)
+def fresh_registries(monkeypatch):
+    monkeypatch.setattr(bill_records, "_offsets", {})
+    monkeypatch.setattr(bill_records, "_ends", {})
+    monkeypatch.setattr(customers, "_books", {})
+    monkeypatch.setattr(catalog, "_catalogs", {})
+
+
+def profile(key, prefix):
+    # Both stores trade under the same name
+    return dict(store_profiles.defaults, key=key, name="Vazhga Stores", numbering={"prefix": prefix},
+                default_catalog={"Rice": {"price": 105, "stock": 100, "hsn": "1006", "gst_rate": 5}})
+
+
+def bill(bill_id, total, customer=None):
+    record = {"bill_id": bill_id, "store": "Vazhga Stores", "terminal": bill_id.rsplit("-", 2)[0],
+              "date": f"{bill_id[-14:-10]}-{bill_id[-10:-8]}-{bill_id[-8:-6]}T10:00:00",
+              "items": [["Rice", 1, total, total]], "total": total}
+    if customer:
+        record["customer"] = customer
+    bill_records.append_record(record)
+
+
+def note(number, bill_id, amount, date, customer=None):
+    entry = {"credit_note": f"CN-{bill_id.rsplit('-', 2)[0]}-{date.replace('-', '')}-{number:05d}",
+             "bill_id": bill_id, "store": "Vazhga Stores", "terminal": bill_id.rsplit("-", 2)[0],
+             "date": f"{date}T12:00:00", "items": [["Rice", 1, amount, amount]], "lines": [0], "total": amount}
+    if customer:
+        entry["customer"] = customer
+    returns._append(bill_records.day_of(bill_id), entry)
+
+
+def test_month_is_split_by_numbering_and_nets_credit_notes():
+    os.makedirs(customers.customers_dir)
+    with open(os.path.join(customers.customers_dir, "main_customers.jsonl"), "w") as f:
+        f.write(json.dumps({"id": "C1", "name": "Hotel", "phone": "900", "gstin": "33ABCDE1234F1Z5"}) + "\n")
+    bill("VV1-20250930-00001", 210)
+    bill("VV1-20251002-00001", 105)
+    bill("VV1-20251003-00001", 210, customer="C1")
+    bill("KK1-20251003-00001", 1050)
+    # A September bill returned in October, October bills returned in October and November
+    note(1, "VV1-20250930-00001", 105, "2025-10-01")
+    note(2, "VV1-20251003-00001", 105, "2025-10-05", customer="C1")
+    note(3, "VV1-20251002-00001", 105, "2025-11-01")
+    note(1, "KK1-20251003-00001", 1050, "2025-10-04")
+
+    count, paths = gst_export.export_month(profile("main", "VV"), "2025-10")
+    assert count == 2
+    with open(paths[0], encoding="utf-8") as f:
+        summary = json.load(f)
+    assert summary["credit_notes"] == 2
+    assert summary["b2b"][0]["rates"][0]["txval"] == 200
+    # 105 sold to walk-in customers less 105 returned
+    assert summary["b2cs"] == [dict(sply_ty="INTRA", typ="OE", rt=5, bills=1, notes=1, txval=0, camt=0, samt=0,
+                                    iamt=0, csamt=0)]
+    assert summary["cdnr"] == [{"ctin": "33ABCDE1234F1Z5", "rates": [
+        dict(ntty="C", rt=5, notes=1, val=105, txval=100, camt=2.5, samt=2.5, iamt=0, csamt=0)]}]
+    assert summary["hsn"]["data"][0]["txval"] == 100
+    assert summary["hsn"]["data"][0]["qty"] == 0
+    docs = summary["doc_issue"]["doc_det"]
+    assert [entry["doc_typ"] for entry in docs] == ["Invoices for outward supply", "Credit Note"]
+    assert docs[0]["docs"][0]["totnum"] == 2 and docs[1]["docs"][0]["totnum"] == 2
+    assert os.path.basename(paths[-2]) == "gstr1_main_202510_cdnr.csv"
+
+    count, paths = gst_export.export_month(profile("branch", "KK"), "2025-10")
+    with open(paths[0], encoding="utf-8") as f:
+        summary = json.load(f)
+    assert (count, summary["credit_notes"], summary["b2cs"][0]["txval"]) == (1, 1, 0)
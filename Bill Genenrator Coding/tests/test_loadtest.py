@@ -0,0 +1,29 @@
+import json
+import os
+
+import bill_records
+import catalog
+import loadtest
+import store_profiles
+
+
+def test_lanes_ring_up_every_bill_and_stock_adds_up(monkeypatch):
+    monkeypatch.setattr(catalog, "_catalogs", {})
+    profile = dict(store_profiles.defaults, key="load", name="Load Store", numbering={"prefix": "L"},
+                   catalog="stock.json", default_catalog={})
+    result = loadtest.run_load(profile, lanes=3, bills=5, basket="fixed:2", popularity="uniform",
+                               products=20, stock=100, workdir="run")
+
+    assert (result.lanes, result.bills, result.items, result.errors, result.out_of_stock) == (3, 15, 30, 0, 0)
+    assert len(result.checkout_latencies) == 15
+    monkeypatch.chdir("run")
+    records = list(bill_records.iter_records())
+    assert len(records) == 15
+    assert len({record["bill_id"] for record in records}) == 15
+    assert {record["terminal"] for record in records} == {"L1", "L2", "L3"}
+    sold = sum(qty for record in records for product, qty, price, item_total in record["items"])
+    with open("stock.json") as f:
+        stock = json.load(f)
+    assert sum(product["stock"] for product in stock.values()) == 20 * 100 - sold
+    # The real catalog was never touched
+    assert not os.path.exists(os.path.join("..", "stock.json"))
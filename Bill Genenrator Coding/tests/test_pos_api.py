@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import catalog
+import pos_api
+import store_profiles
+
+
+def make_api():
+    profile = dict(store_profiles.defaults, key="api", name="API Store", numbering={"prefix": "A"},
+                   default_catalog={"Rice": {"price": 50, "stock": 10}})
+    return pos_api.PosApi(profile, render_workers=1)
+
+
+def stock(api):
+    return api.catalog.products["Rice"]["stock"]
+
+
+def test_idle_carts_give_their_stock_back():
+    api = make_api()
+
+    async def scenario():
+        idle_id = (await api.open_cart({}, {}))[1]["cart_id"]
+        busy_id = (await api.open_cart({}, {}))[1]["cart_id"]
+        await api.add_item({}, {"product": "Rice", "qty": 3}, idle_id)
+        await api.add_item({}, {"product": "Rice", "qty": 2}, busy_id)
+        assert stock(api) == 5
+        api.carts[idle_id].touched -= pos_api.CART_IDLE_MINUTES * 60 + 1
+        assert await api.expire_carts() == [idle_id]
+        assert stock(api) == 8
+        assert list(api.carts) == [busy_id]
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        api.close()
+        catalog._catalogs.clear()
+
+
+def test_open_carts_are_released_before_saving_on_shutdown():
+    api = make_api()
+
+    async def scenario():
+        cart_id = (await api.open_cart({}, {}))[1]["cart_id"]
+        await api.add_item({}, {"product": "Rice", "qty": 4}, cart_id)
+
+    try:
+        asyncio.run(scenario())
+        assert stock(api) == 6
+        api.release_carts()
+        assert stock(api) == 10 and not api.carts
+    finally:
+        api.close()
+        catalog._catalogs.clear()
+
+
+def test_catalog_pages_by_name_and_sees_new_products():
+    api = make_api()
+    with api.catalog.lock:
+        for name in ("rava", "Ragi", "Dal", "Raisins", "Sugar"):
+            api.catalog.products[name] = {"price": 40, "stock": 5}
+    api.catalog.changed(["rava", "Ragi", "Dal", "Raisins", "Sugar"])
+
+    def names(query):
+        return [product["name"] for product in asyncio.run(api.list_products(query, {}))[1]["products"]]
+
+    try:
+        assert names({"q": "ra"}) == ["Ragi", "Raisins", "rava"]
+        assert names({"q": "RA", "offset": "1", "limit": "1"}) == ["Raisins"]
+        assert names({"q": "ra", "offset": "3"}) == []
+        assert names({"limit": "3"}) == ["Dal", "Ragi", "Raisins"]
+        # Stock changes reuse the index; a new product rebuilds it
+        api.catalog.take("Rice", 2)
+        assert api.names is not None
+        with api.catalog.lock:
+            api.catalog.products["Rajma"] = {"price": 90, "stock": 3}
+        api.catalog.changed(["Rajma"])
+        assert names({"q": "ra"}) == ["Ragi", "Raisins", "Rajma", "rava"]
+        assert asyncio.run(api.list_products({"q": "rice"}, {}))[1]["products"] == \
+            [{"name": "Rice", "price": 50, "stock": 8}]
+    finally:
+        api.close()
+        catalog._catalogs.clear()
@@ -0,0 +1,63 @@
+import json
+import os
+from datetime import datetime
+
+import price_lists
+
+DIWALI = {"version": "diwali", "from": "2025-10-18T00:00", "to": "2025-10-25T00:00", "prices": {"Oil": 220}}
+WEEKEND = {"version": "weekend", "from": "2025-10-19T00:00", "to": "2025-10-20T00:00", "prices": {"Oil": 210}}
+NEW_YEAR = {"version": "2026-rates", "from": "2026-01-01T00:00", "prices": {"Oil": 255}}
+
+
+def write(lists, mtime, text=None):
+    with open("prices.json", "w") as f:
+        f.write(text if text is not None else json.dumps({"lists": lists}))
+    os.utime("prices.json", (mtime, mtime))
+
+
+def prices_at(compiled, *times):
+    return [compiled.price("Oil", 240, datetime.fromisoformat(when)) for when in times]
+
+
+def test_the_list_that_started_last_wins():
+    same_start = dict(WEEKEND, version="weekend-2", prices={"Oil": 205})
+    compiled = price_lists.CompiledPrices({"lists": [DIWALI, WEEKEND, same_start, NEW_YEAR]}, "r1")
+    assert prices_at(compiled, "2025-10-17T23:59", "2025-10-18T00:00", "2025-10-19T12:00", "2025-10-20T00:00",
+                     "2025-10-25T00:00", "2026-06-01T00:00") == [
+        (240, price_lists.BASE), (220, "diwali"), (205, "weekend-2"), (220, "diwali"),
+        (240, price_lists.BASE), (255, "2026-rates")]
+    assert compiled.price("Rice", 50, datetime(2025, 10, 19)) == (50, price_lists.BASE)
+
+
+def test_bills_keep_the_revision_they_were_priced_from():
+    write([DIWALI], 1_000_000)
+    book = price_lists.PriceBook("prices.json")
+    pinned = book.current()
+    write([DIWALI, WEEKEND], 2_000_000)
+    book.checked = float("-inf")
+    edited = book.current()
+    assert edited.revision != pinned.revision
+    assert prices_at(edited, "2025-10-19T12:00") == [(210, "weekend")]
+    # The pinned revision is read back from the history, not from the edited file
+    again = price_lists.load_revision(pinned.revision)
+    assert prices_at(again, "2025-10-19T12:00") == [(220, "diwali")]
+    assert sorted(os.listdir(price_lists.history_dir)) == sorted(
+        f"{revision}.json" for revision in (pinned.revision, edited.revision))
+    assert price_lists.load_revision(price_lists.BASE).table == {}
+
+
+def test_bad_file_keeps_the_last_good_prices():
+    write(None, 1_000_000, text='{"lists": [')
+    book = price_lists.PriceBook("prices.json")
+    assert isinstance(book.error, ValueError) and book.compiled.revision == price_lists.BASE
+
+    write([DIWALI], 2_000_000)
+    book.checked = float("-inf")
+    good = book.current()
+    assert book.error is None and good.revision != price_lists.BASE
+
+    for mtime, bad in enumerate(([dict(DIWALI, prices={"Oil": "220"})], [dict(DIWALI, to="2025-10-01T00:00")],
+                                 [{"from": "2025-10-18T00:00"}]), 3):
+        write(bad, mtime * 1_000_000)
+        book.checked = float("-inf")
+        assert book.current() is good and book.error is not None
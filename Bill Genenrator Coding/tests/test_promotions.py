@@ -0,0 +1,50 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import promotions
+
+GOOD = {"id": "oil-3for2", "type": "buy_get", "product": "Oil", "buy": 2, "free": 1}
+
+
+def write(rules, mtime):
+    with open("promotions.json", "w") as f:
+        json.dump({"rules": rules}, f)
+    os.utime("promotions.json", (mtime, mtime))
+
+
+@pytest.mark.parametrize("rule", [
+    dict(GOOD, buy="2"),
+    dict(GOOD, free=True),
+    dict(GOOD, product=["Oil"]),
+    {"id": "c", "type": "combo", "products": ["Oil"], "price": 10},
+    {"id": "c", "type": "combo", "products": {"Oil": "1"}, "price": 10},
+    {"id": "p", "type": "bill_percent", "percent": "5"},
+    dict(GOOD, to="not a date"),
+    dict(GOOD, **{"from": 20251018}),
+    "oil-3for2",
+])
+def test_bad_rules_are_refused(rule):
+    with pytest.raises(ValueError):
+        promotions.check_rule(rule)
+
+
+def test_a_bad_file_keeps_the_last_good_rules(monkeypatch):
+    monkeypatch.setattr(promotions, "CHECK_INTERVAL", 0)
+    write([dict(GOOD, buy="2")], 1000)
+    book = promotions.Promotions("promotions.json")
+    assert book.error and book.rules == []
+
+    write([GOOD], 2000)
+    cart = [("Oil", 3, 100, 300)]
+    assert book.current().evaluate(cart) == [["oil-3for2", "Oil: buy 2 get 1 free", 100]]
+    assert book.error is None
+
+    write([dict(GOOD, to="not a date")], 3000)
+    assert book.current().evaluate(cart) == [["oil-3for2", "Oil: buy 2 get 1 free", 100]]
+    assert book.rules == [GOOD]
+    # Recompiling at another time uses the good rules too
+    assert book.current(datetime(2030, 1, 1)).evaluate(cart)[0][2] == 100
+    assert "not a date" in str(book.error)
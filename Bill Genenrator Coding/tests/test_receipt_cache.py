@@ -0,0 +1,26 @@
+import os
+
+import receipt_cache
+
+
+def test_layouts_keep_their_own_files():
+    a4 = receipt_cache.ReceiptCache("a4", disk_limit=1000)
+    slip = receipt_cache.ReceiptCache("slip", disk_limit=1000)
+    a4.put("X1-20250101-00001", b"a" * 600)
+    slip.put("X1-20250101-00001", b"s" * 600)
+    slip.put("X1-20250101-00002", b"s" * 300)
+    assert a4.cached("X1-20250101-00001") == b"a" * 600
+    assert os.listdir(a4.cache_dir) == ["bill_X1-20250101-00001.pdf"]
+    assert sorted(os.listdir(slip.cache_dir)) == ["bill_X1-20250101-00001.pdf", "bill_X1-20250101-00002.pdf"]
+    assert receipt_cache.ReceiptCache("slip").disk_size == 900
+
+
+def test_putting_a_bill_again_does_not_count_it_twice():
+    cache = receipt_cache.ReceiptCache("a4", memory_limit=1000, disk_limit=1000)
+    for _ in range(5):
+        cache.put("X1-20250101-00001", b"x" * 400)
+    cache._store("bill_X1-20250101-00001.pdf", b"x" * 400)
+    assert cache.memory_size == 400
+    assert cache.disk_size == 400
+    cache.put("X1-20250101-00002", b"y" * 400)
+    assert cache.cached("X1-20250101-00001") is not None
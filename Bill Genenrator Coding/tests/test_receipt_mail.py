@@ -0,0 +1,95 @@
+import time
+
+import bill_records
+import receipt_mail
+
+
+class Connection:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, email):
+        self.sent.append(email)
+
+
+def make_outbox():
+    profile = {"key": "test", "name": "Test Store", "layout": "slip",
+               "mail": {"host": "localhost", "sender": "bills@example.com"}}
+    return receipt_mail.Outbox(profile)
+
+
+def queue(outbox, number, **fields):
+    with outbox.cond:
+        outbox.log(dict({"id": f"M{number:06d}", "bill_id": f"T1-20251020-{number:04d}", "to": "a@example.com",
+                         "status": "queued", "attempts": 0, "due": 0}, **fields))
+
+
+def test_due_messages_come_off_the_heap_in_order():
+    outbox = make_outbox()
+    later = time.time() + 600
+    queue(outbox, 1, status="retry", due=later)
+    queue(outbox, 2)
+    queue(outbox, 3)
+    queue(outbox, 4, status="sent")
+    with outbox.cond:
+        assert [message["id"] for message in outbox.take_due(time.time(), 1)] == ["M000002"]
+        assert [message["id"] for message in outbox.take_due(time.time(), 10)] == ["M000003"]
+        assert outbox.next_due() == later
+
+    # A message settled meanwhile leaves only a stale entry behind
+    queue(outbox, 1, status="sent", due=0)
+    with outbox.cond:
+        assert outbox.next_due() is None
+
+    # Restarting picks up what was waiting or never settled from the outbox file
+    queue(outbox, 5, status="retry", due=later)
+    restarted = make_outbox()
+    assert [message["id"] for message in restarted.take_due(time.time(), 10)] == ["M000002", "M000003"]
+    assert [message["id"] for message in restarted.take_due(later, 10)] == ["M000005"]
+
+
+def test_a_message_that_cannot_be_built_fails_alone(monkeypatch):
+    outbox = make_outbox()
+    outbox.connection = connection = Connection()
+    outbox.last_used = time.monotonic()
+
+    def build(message):
+        if message["id"] == "M000001":
+            raise RuntimeError("receipt could not be rendered")
+        return message["id"]
+
+    monkeypatch.setattr(outbox, "build", build)
+    for number in (1, 2):
+        queue(outbox, number)
+    with outbox.cond:
+        batch = outbox.take_due(time.time(), 10)
+    outbox.send_batch(batch)
+    assert outbox.status("M000001")["status"] == "failed"
+    assert "could not be rendered" in outbox.status("M000001")["error"]
+    assert outbox.status("M000002")["status"] == "sent"
+    assert connection.sent == ["M000002"]
+
+
+def test_receipts_queued_by_another_process_get_their_own_ids(monkeypatch):
+    monkeypatch.setattr(bill_records, "_offsets", {})
+    monkeypatch.setattr(bill_records, "_ends", {})
+    for number in (1, 2):
+        bill_records.append_record({"bill_id": f"T1-20251020-{number:05d}", "store": "Test Store",
+                                    "date": "2025-10-20T10:00:00", "items": [["Rice", 1, 50, 50]], "total": 50})
+    # The app's outbox and one opened by the command line
+    app, cli = make_outbox(), make_outbox()
+    assert app.send_receipt("T1-20251020-00001", "a@example.com") == "M000001"
+    assert cli.send_receipt("T1-20251020-00002", "b@example.com") == "M000002"
+
+    # The app's sender picks up the receipt queued by the command line, which sees the outcome
+    app.connection = Connection()
+    app.last_used = time.monotonic()
+    monkeypatch.setattr(app, "build", lambda message: message["bill_id"])
+    with app.cond:
+        app.catch_up()
+        batch = app.take_due(time.time(), 10)
+    assert [message["id"] for message in batch] == ["M000001", "M000002"]
+    app.send_batch(batch)
+    assert app.connection.sent == ["T1-20251020-00001", "T1-20251020-00002"]
+    assert cli.status("M000002")["status"] == "sent"
+    assert make_outbox().counts() == {"sent": 2}
@@ -0,0 +1,57 @@
+import os
+import re
+
+import pytest
+
+import receipt
+import receipt_preview
+
+
+@pytest.fixture(autouse=True)
+def fonts(monkeypatch):
+    # The font files sit next to the code, not in the test's working directory
+    code_dir = os.path.dirname(os.path.abspath(receipt.__file__))
+    monkeypatch.setattr(receipt, "fonts", [(family, style, os.path.join(code_dir, fname))
+                                           for family, style, fname in receipt.fonts])
+    monkeypatch.setattr(receipt, "_font_cache", {})
+
+
+def bill(items):
+    return {"bill_id": "T1-20251020-0001", "store": "Test Store", "date": "2025-10-20T10:00:00",
+            "items": [[f"Item {n}", 1, 10, 10] for n in range(items)], "subtotal": 10 * items,
+            "discounts": [["d", "Offer", 1]], "total": 10 * items - 1}
+
+
+def pdf_pages(pdf):
+    """Returns the number of pages of a PDF and the sizes of its media boxes in mm."""
+    sizes = re.findall(rb"/MediaBox \[0 0 ([\d.]+) ([\d.]+)\]", pdf)
+    return (len(re.findall(rb"/Type /Page\b(?!s)", pdf)),
+            {(round(float(w) * 25.4 / 72), round(float(h) * 25.4 / 72)) for w, h in sizes})
+
+
+@pytest.mark.parametrize("layout, items, pages", [("slip", 5, 1), ("slip", 40, 3), ("a4", 5, 1), ("a4", 40, 2)])
+def test_preview_has_the_pages_of_the_pdf(layout, items, pages):
+    record = bill(items)
+    description = receipt.layouts[layout](record)
+    width, height = description["page"]
+    assert pdf_pages(receipt.render_receipt(record, layout)) == (pages, {(width, height)})
+
+    image = receipt_preview.draw_layout(description)
+    assert image.size == (receipt_preview.PREVIEW_WIDTH,
+                          round(height * pages * receipt_preview.PREVIEW_WIDTH / width))
+    # Every row stays above the bottom margin of its page
+    for page, x, y, line, cell in receipt.place(description):
+        assert y + cell[1] <= height - description["margins"][1]
+
+
+def test_failed_render_is_not_left_pending(monkeypatch):
+    def broken(record, layout):
+        raise OSError("no font")
+
+    monkeypatch.setattr(receipt_preview, "preview_image", broken)
+    cache = receipt_preview.PreviewCache("slip")
+    cache.pending["T1-20251020-0001"] = object()
+    with pytest.raises(OSError):
+        cache.make(bill(1))
+    assert cache.pending == {}
+    assert cache.get("T1-20251020-0001") is None
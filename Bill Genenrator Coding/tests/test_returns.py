@@ -0,0 +1,70 @@
+import pytest
+
+import catalog
+import returns
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(returns, "_index", {})
+
+
+def open_catalog():
+    shop_catalog = catalog.Catalog("stock.json", {"Rice": {"price": 50, "stock": 10}})
+    shop_catalog.load()
+    return shop_catalog
+
+
+def issue(shop_catalog, number=1):
+    note = {"credit_note": f"CN-T1-20251020-{number:05d}", "bill_id": "T1-20251020-00001", "store": "Test Store",
+            "terminal": "T1", "date": "2025-10-20T12:00:00", "items": [["Rice", 3, 50, 150]], "lines": [0],
+            "total": 150, "journal_end": returns.journal_size(shop_catalog)}
+    returns._append("20251020", note)
+    return note
+
+
+def test_crash_before_the_save_is_restocked_on_the_next_start(monkeypatch):
+    shop_catalog = open_catalog()
+    shop_catalog.log_baseline()
+    note = issue(shop_catalog)
+
+    def crash():
+        raise SystemExit("power cut")
+
+    monkeypatch.setattr(shop_catalog, "save", crash)
+    with pytest.raises(SystemExit):
+        returns.restock(shop_catalog, note)
+
+    # Restart: nothing of the return reached the catalog file or the journal
+    monkeypatch.setattr(returns, "_index", {})
+    restarted = open_catalog()
+    assert restarted.products["Rice"]["stock"] == 10
+    assert returns.finish_restocking(restarted, "Test Store") == [note["credit_note"]]
+    assert open_catalog().products["Rice"]["stock"] == 13
+    assert returns.finish_restocking(open_catalog(), "Test Store") == []
+
+
+def test_crash_after_the_journal_only_marks_the_note(monkeypatch):
+    shop_catalog = open_catalog()
+    issue(shop_catalog, 1)
+    note = issue(shop_catalog, 2)
+    assert returns.restock(shop_catalog, returns.credit_notes(note["bill_id"])[0])
+
+    append = returns._append
+
+    def crash_on_mark(day, entry):
+        if "restocked" in entry:
+            raise SystemExit("power cut")
+        append(day, entry)
+
+    monkeypatch.setattr(returns, "_append", crash_on_mark)
+    with pytest.raises(SystemExit):
+        returns.restock(shop_catalog, note)
+    monkeypatch.setattr(returns, "_append", append)
+
+    monkeypatch.setattr(returns, "_index", {})
+    restarted = open_catalog()
+    assert restarted.products["Rice"]["stock"] == 16
+    assert returns.finish_restocking(restarted, "Test Store") == []
+    assert open_catalog().products["Rice"]["stock"] == 16
+    assert returns.finish_restocking(open_catalog(), "Test Store") == []
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import bill_records
+import returns
+import sales_report
+import store_profiles
+
+
+@pytest.fixture(autouse=True)
+def fresh_registries(monkeypatch):
+    monkeypatch.setattr(bill_records, "_offsets", {})
+    monkeypatch.setattr(bill_records, "_ends", {})
+    monkeypatch.setattr(returns, "_index", {})
+
+
+def bill(bill_id, time, items):
+    terminal = bill_id.rsplit("-", 2)[0]
+    date = f"{bill_id[-14:-10]}-{bill_id[-10:-8]}-{bill_id[-8:-6]}"
+    bill_records.append_record({"bill_id": bill_id, "store": "Vazhga Stores", "terminal": terminal,
+                                "date": f"{date}T{time}", "items": items,
+                                "total": sum(item[3] for item in items)})
+
+
+def note(number, bill_id, terminal, when, items):
+    returns._append(bill_records.day_of(bill_id), {
+        "credit_note": f"CN-{terminal}-{when[:10].replace('-', '')}-{number:05d}", "bill_id": bill_id,
+        "store": "Vazhga Stores", "terminal": terminal, "date": when, "items": items,
+        "lines": list(range(len(items))), "total": sum(item[3] for item in items)})
+
+
+def test_report_keeps_the_stores_bills_and_nets_credit_notes():
+    bill("VV1-20251001-00001", "09:15:00", [["Rice", 2, 50, 100], ["Dal", 1, 80, 80]])
+    bill("VV2-20251001-00001", "18:40:00", [["Rice", 1, 50, 50]])
+    bill("VV1-20251002-00001", "10:05:00", [["Dal", 3, 80, 240]])
+    # Another store sharing the folder, and the same name
+    bill("KK1-20251001-00001", "11:00:00", [["Rice", 10, 50, 500]])
+    note(1, "KK1-20251001-00001", "KK1", "2025-10-02T12:00:00", [["Rice", 1, 50, 50]])
+    # A bill of the 1st returned on the 2nd, at the other till
+    note(1, "VV1-20251001-00001", "VV2", "2025-10-02T17:30:00", [["Rice", 1, 50, 50]])
+
+    profile = dict(store_profiles.defaults, numbering={"prefix": "VV"})
+    report = sales_report.sales_report(profile, "daily")
+    products = list(report.sales.products)
+    terminals = list(report.sales.terminals)
+
+    assert [str(day) for day in report.periods] == ["2025-10-01", "2025-10-02"]
+    assert terminals == ["VV1", "VV2"]
+    assert report.bills.tolist() == [2, 1]
+    assert report.takings.tolist() == [230, 190]
+    assert report.refunds.tolist() == [0, 50]
+    assert report.average_basket.tolist() == [115, 240]
+    assert report.product_qty[:, products.index("Rice")].tolist() == [3, -1]
+    assert report.product_amount[:, products.index("Dal")].tolist() == [80, 240]
+    assert report.hour_amount[1, 17] == -50 and report.hour_amount[0, 9] == 180
+    assert report.terminal_amount.tolist() == [[180, 50], [240, -50]]
+    assert report.terminal_bills.tolist() == [[1, 1], [1, 0]]
+    assert "Refunds: ₹50.00" in report.text()
+
+    # Read again from the cached columns
+    again = sales_report.sales_report(profile, "monthly", datetime(2025, 10, 1), datetime(2025, 10, 31))
+    assert again.bills.tolist() == [3] and again.takings.tolist() == [420]
+    assert np.array_equal(again.product_qty.sum(axis=0), report.product_qty.sum(axis=0))
@@ -0,0 +1,61 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import shift
+
+
+def sale(bill_id, total, terminal="T1", items=(("Rice", 2, 100),)):
+    return {"bill_id": bill_id, "terminal": terminal, "total": total,
+            "items": [[product, qty, item_total / qty, item_total] for product, qty, item_total in items]}
+
+
+def test_two_processes_share_the_totals():
+    # Two Shift objects on the same store stand for the app and the API process
+    app, api = shift.Shift("s"), shift.Shift("s")
+    app.record_sale(sale("T1-20250101-00001", 100))
+    api.record_sale(sale("T2-20250101-00001", 50, "T2", (("Dal", 1, 50),)))
+    app.record_refund({"credit_note": "CN-T1-20250101-00001", "terminal": "T1", "total": 20})
+    for totals in (app.totals(), api.totals(), shift.Shift("s").totals()):
+        assert (totals["bills"], totals["takings"], totals["refunds"], totals["items"]) == (2, 130, 20, 3)
+        assert totals["products"] == {"Rice": [2, 100], "Dal": [1, 50]}
+        assert totals["terminals"] == {"T1": [1, 80], "T2": [1, 50]}
+
+
+def test_close_moves_every_process_to_the_next_shift():
+    app, api = shift.Shift("s"), shift.Shift("s")
+    app.record_sale(sale("T1-20250101-00001", 100))
+    path, report = api.close(datetime(2025, 1, 1, 22))
+    assert "Z-Report #1" in report and "Takings: ₹100.00" in report
+    assert os.path.exists(path)
+    app.record_sale(sale("T1-20250102-00001", 40))
+    assert app.totals()["number"] == 2
+    assert api.totals()["takings"] == 40
+    assert shift.Shift("s").totals()["bills"] == 1
+
+
+def test_state_file_says_which_shift_is_open():
+    os.makedirs(shift.shifts_dir)
+    with open(os.path.join(shift.shifts_dir, "shift_s.json"), "w") as f:
+        json.dump({"number": 7, "opened": "2025-01-01T08:00:00"}, f)
+    current = shift.Shift("s")
+    current.record_sale(sale("T1-20250101-00001", 100))
+    totals = current.totals()
+    assert (totals["number"], totals["opened"], totals["bills"]) == (7, "2025-01-01T08:00:00", 1)
+
+
+def test_second_till_closing_the_same_shift_does_not_close_the_next():
+    till1, till2 = shift.Shift("s"), shift.Shift("s")
+    till1.record_sale(sale("T1-20250101-00001", 100))
+    # Both tills show shift #1 when their cashiers press Close Shift
+    number = till2.totals()["number"]
+    till1.close(datetime(2025, 1, 1, 22), number=till1.totals()["number"])
+    till1.record_sale(sale("T1-20250102-00001", 40))
+    with pytest.raises(ValueError):
+        till2.close(datetime(2025, 1, 1, 22, 1), number=number)
+    for till in (till1, till2, shift.Shift("s")):
+        totals = till.totals()
+        assert (totals["number"], totals["bills"], totals["takings"]) == (2, 1, 40)
+    assert len(os.listdir(shift.reports_dir)) == 1
@@ -0,0 +1,44 @@
+import catalog
+import catalog_snapshot
+import stock_alerts
+
+
+def test_index_is_filled_on_first_use_from_the_stock_column():
+    catalog_snapshot.write_snapshot("stock.snap", ((f"Item {n}", 10, n % 50) for n in range(10000)))
+    shop_catalog = catalog.Catalog("stock.snap")
+    shop_catalog.load()
+    index = stock_alerts.LowStockIndex(shop_catalog, default_level=2)
+    assert not index.built
+
+    shop_catalog.take("Item 10", 5)
+    shop_catalog.products["New"] = {"price": 1, "stock": 0}
+    assert index.count() == 600 + 1
+    assert index.most_urgent(1)[0] == ("Item 0", 0, 2)
+    assert ("Item 10", 5, 2) not in index.all_low()
+
+    shop_catalog.take("Item 10", 4)
+    assert ("Item 10", 1, 2) in index.all_low()
+    shop_catalog.give("Item 0", 3)
+    assert index.count() == 601
+    shop_catalog.products.snapshot.close()
+
+
+def test_json_catalog_levels():
+    shop_catalog = catalog.Catalog("stock.json", {"Rice": {"price": 50, "stock": 3, "reorder_level": 5},
+                                                  "Dal": {"price": 80, "stock": 3}})
+    index = stock_alerts.LowStockIndex(shop_catalog, default_level=2)
+    assert index.all_low() == [("Rice", 3, 5)]
+    shop_catalog.take("Dal", 1)
+    assert index.all_low() == [("Rice", 3, 5), ("Dal", 2, 2)]
+
+
+def test_heap_stays_small_while_a_low_product_keeps_selling():
+    shop_catalog = catalog.Catalog("stock.json", {"Rice": {"price": 50, "stock": 100000, "reorder_level": 100000},
+                                                  "Dal": {"price": 80, "stock": 3}})
+    index = stock_alerts.LowStockIndex(shop_catalog, default_level=5)
+    index.count()
+    for _ in range(1000):
+        shop_catalog.take("Rice", 1)
+    assert len(index.heap) <= 2 * index.count() + 16
+    assert index.most_urgent(1) == [("Rice", 99000, 100000)]
+    assert index.all_low() == [("Rice", 99000, 100000), ("Dal", 3, 5)]
@@ -0,0 +1,56 @@
+import catalog
+import stock_sync
+
+
+def test_ops_since_reads_only_the_missing_end_of_the_log(monkeypatch):
+    branch = stock_sync.StockSync(catalog.Catalog("branch.json", {"Rice": {"price": 50, "stock": 100}}), "branch")
+    office = stock_sync.StockSync(catalog.Catalog("office.json", {"Rice": {"price": 50, "stock": 100}}), "office")
+    for _ in range(50):
+        branch.catalog.take("Rice", 1)
+        branch.commit()
+    office.catalog.give("Rice", 7)
+    assert branch.apply(office.ops_since({})) == 1
+    branch.catalog.take("Rice", 2)
+
+    offsets = []
+    read_ops = stock_sync.read_ops
+    monkeypatch.setattr(stock_sync, "read_ops", lambda path, offset=0: (offsets.append(offset), read_ops(path, offset))[1])
+    ops = branch.ops_since({"branch": 49, "office": 1})
+    assert [(op["node"], op["seq"], op["delta"]) for op in ops] == [("branch", 50, -1), ("branch", 51, -2)]
+    assert offsets[0] > 0
+
+    ops = branch.ops_since({"branch": 50})
+    assert [(op["node"], op["seq"]) for op in ops] == [("office", 1), ("branch", 51)]
+    assert branch.ops_since(branch.version_vector()) == []
+    assert len(read_ops(branch.log_path)[0]) == 52
+
+
+def test_conflicting_edits_converge_over_tcp():
+    start = {"Rice": {"price": 50, "stock": 100}, "Dal": {"price": 80, "stock": 20}}
+    office = stock_sync.StockSync(catalog.Catalog("office.json", start), "office")
+    branch = stock_sync.StockSync(catalog.Catalog("branch.json", start), "branch")
+    depot = stock_sync.StockSync(catalog.Catalog("depot.json", start), "depot")
+    server = office.serve(port=0)
+    try:
+        port = server.server_address[1]
+        # The same products changed on every node before any of them syncs
+        branch.catalog.take("Rice", 30)
+        branch.catalog.give("Dal", 5)
+        office.catalog.give("Rice", 50)
+        office.catalog.take("Dal", 12)
+        depot.catalog.take("Rice", 4)
+
+        assert branch.sync_with("127.0.0.1", port) == (2, 2)
+        # The depot gets the branch's deltas through the office
+        assert depot.sync_with("127.0.0.1", port) == (1, 4)
+        assert branch.sync_with("127.0.0.1", port) == (0, 1)
+        # Nothing is sent twice once the version vectors agree
+        assert branch.sync_with("127.0.0.1", port) == (0, 0)
+        assert depot.sync_with("127.0.0.1", port) == (0, 0)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for node in (office, branch, depot):
+        assert node.version_vector() == {"office": 2, "branch": 2, "depot": 1}
+        assert {name: node.catalog.products[name]["stock"] for name in ("Rice", "Dal")} == {"Rice": 116, "Dal": 13}